@@ -0,0 +1,179 @@
+"""
+Command line entry point, `pysongman import <seed_path>` and `pysongman verify <seed_path>`
+"""
+
+import logging
+import pathlib
+import sys
+
+import tap
+from sqlalchemy import select
+
+from PySongMan.lib.estimate import DEFAULT_SAMPLE, duration
+from PySongMan.lib.importer import (
+    STAGES,
+    estimate_import,
+    parse_executor,
+    run_import,
+)
+from PySongMan.lib.integrity import DEFAULT_THREADS, verify_library
+from PySongMan.lib.models import Library, db_with
+from PySongMan.lib.readahead import READAHEAD_FILES
+from PySongMan.lib.writer import DEFAULT_BATCH
+
+
+class ImportArguments(tap.Tap):
+    """
+    Import a music library
+    """
+
+    seed_path: str  # Library root directory
+    db_path: str = "sqlite:///pysongman.sqlite3"
+    incremental: bool = False  # Only probe new/changed files and drop vanished ones
+    resume: bool = False  # Skip directories committed by the last interrupted import
+    batch_size: int = DEFAULT_BATCH  # Songs per writer transaction
+    probe_cache: str = "pysongman.probe_cache.sqlite3"  # Empty to disable
+    # Stage executors as kind:workers, kind is thread, process or asyncio
+    sniff: str = "thread:2"
+    probe: str = "process:auto"
+    normalize: str = "thread:1"
+    # Write to per worker shards merged at the end, eg process:8, empty for the single writer
+    write: str = ""
+    shard_dir: str = ""  # Where shards are written, the system temp directory if empty
+    readahead: int = (
+        READAHEAD_FILES  # Files prefetched ahead of the sniffer, 0 to disable
+    )
+    estimate: bool = False  # Only project the import's duration and database size
+    sample: int = DEFAULT_SAMPLE  # Directories probed by --estimate
+    verbose: bool = False
+
+    def configure(self):
+        self.add_argument("seed_path")
+
+
+class VerifyArguments(tap.Tap):
+    """
+    Drop songs whose files vanished and flag changed files for re-probing
+    """
+
+    seed_path: str  # Library root directory
+    db_path: str = "sqlite:///pysongman.sqlite3"
+    threads: int = DEFAULT_THREADS  # Concurrent stats
+    reprobe: bool = (
+        False  # Re-probe changed files right away with an incremental rescan
+    )
+    verbose: bool = False
+
+    def configure(self):
+        self.add_argument("seed_path")
+
+
+class Arguments(tap.Tap):
+    """
+    PySongMan command line tools
+    """
+
+    def configure(self):
+        self.add_subparsers(dest="command", required=True)
+        self.add_subparser("import", ImportArguments, help="Import a music library")
+        self.add_subparser(
+            "verify", VerifyArguments, help="Check a library against the disk"
+        )
+
+
+def estimate_command(args: ImportArguments, executors: dict):
+    estimate = estimate_import(args.seed_path, executors, args.sample, args.batch_size)
+    counted = estimate.count
+
+    print(
+        f"{counted.files} files in {counted.directories} directories,"
+        f" {counted.bytes / 1e9:.1f} GB, counted in {duration(counted.seconds)}"
+    )
+    print(
+        f"Sampled {estimate.sampled} files from {estimate.sampled_directories} directories:"
+        f" {estimate.seconds_per_file * 1000:.1f} ms/file,"
+        f" {estimate.dropped:.1%} not importable"
+    )
+    print(
+        f"Projected {estimate.songs} songs in {duration(estimate.seconds)}"
+        f" (probing {duration(estimate.probe_seconds)} on {estimate.probe_workers} workers,"
+        f" writing {duration(estimate.write_seconds)})"
+    )
+    print(f"Database ~{estimate.db_bytes / 1e6:.0f} MB, ~{estimate.tags} tags")
+
+
+def import_command(args: ImportArguments):
+    executors = {stage: parse_executor(getattr(args, stage)) for stage in STAGES}
+    if args.write:
+        executors["write"] = parse_executor(args.write)
+
+    if args.estimate:
+        estimate_command(args, executors)
+        return
+
+    stats = run_import(
+        args.seed_path,
+        args.db_path,
+        incremental=args.incremental,
+        resume=args.resume,
+        batch_size=args.batch_size,
+        cache_path=args.probe_cache or None,
+        executors=executors,
+        shard_dir=args.shard_dir or None,
+        readahead=args.readahead,
+    )
+
+    print(f"Library {stats.library_id}: {stats.rows} rows in {stats.elapsed:.1f}s")
+    print(f"{stats.rate:.1f} rows/sec")
+    print(f"{stats.skipped} files skipped as not audio, {stats.unknown} unrecognized")
+    print(f"{stats.tag_hit_rate:.1%} of tag lookups served from the tag cache")
+    for stage in stats.stages:
+        print(
+            f"  {stage.name:<10} {stage.executor}:{stage.workers:<3}"
+            f" {stage.processed} units, {stage.dropped} held or dropped,"
+            f" {stage.failed} failed"
+        )
+
+
+def verify_command(args: VerifyArguments):
+    seed = str(pathlib.Path(args.seed_path).resolve())
+    with db_with(args.db_path) as session:
+        library = session.execute(
+            select(Library).where(Library.path == seed)
+        ).scalar_one_or_none()
+        if library is None:
+            print(f"No library at {seed}")
+            sys.exit(1)
+
+        stats = verify_library(session, library.id, seed, threads=args.threads)
+
+    print(f"Library {stats.library_id}: {stats.checked} songs in {stats.elapsed:.1f}s")
+    print(f"{stats.rate:.1f} songs/sec")
+    print(
+        f"{stats.vanished} vanished and deleted, {stats.changed} changed,"
+        f" {stats.unreachable} unreachable"
+    )
+
+    if args.reprobe and stats.changed:
+        rescan = run_import(seed, args.db_path, incremental=True)
+        print(f"Re-probed {rescan.rows} files in {rescan.elapsed:.1f}s")
+
+
+def main():
+    args = Arguments().parse_args()
+
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.INFO,
+        format="%(levelname)s - %(name)s - %(message)s",
+    )
+
+    if args.command == "import":
+        import_command(args)
+    elif args.command == "verify":
+        verify_command(args)
+
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,7 +5,7 @@ The bridge API between the python application and the TS/react frontend
 import contextlib
 import logging
 
-from .app_types import SongType, GetPlaylistPage, PlaylistPage
+from .app_types import SongType, PlaylistPage, SearchPage
 from .application import App
 from . import models
 
@@ -59,21 +59,54 @@ class Songs:
         self.__app = app
 
     def list(
-        self, page: int, limit: int = 100, filters: dict[str, str] | None = None
+        self,
+        cursor: str | None = None,
+        limit: int = 100,
+        filters: dict[str, str] | None = None,
+        sort: str = "id",
+        descending: bool = False,
+        exact: bool = False,
     ) -> PlaylistPage:
-        with self.__app.get_db() as session:
-            response = models.Song.GetPage(session, page, limit, filters)
+        """
+        A page of songs, pass the returned cursor back for the next one
+
+        :param cursor: None for the first page
+        :param limit:
+        :param filters: song column to value
+        :param sort: id, artist or size
+        :param descending:
+        :param exact: count the songs instead of reading the maintained counts
+        :return:
+        """
+        with self.__app.get_read_db() as session:
+            response = models.Song.GetPage(
+                session, cursor, limit, filters, sort, descending, exact
+            )
             return dict(
-                data=[song.to_dict() for song in response["data"]],
-                offset=max(1, page) * limit,
-                limit=limit,
-                page=page,
+                data=response["data"],
                 count=response["count"],
+                limit=limit,
+                cursor=response["cursor"],
             )
 
+    def search(
+        self, query: str, cursor: str | None = None, limit: int = 100
+    ) -> SearchPage:
+        """
+        Songs matching what was typed so far, best match first
+
+        :param query: words of a title, artist or tag, the last one can be unfinished
+        :param cursor: None for the first page
+        :param limit:
+        :return:
+        """
+        with self.__app.get_read_db() as session:
+            response = models.Song.Search(session, query, cursor, limit)
+            return dict(data=response["data"], limit=limit, cursor=response["cursor"])
+
     def get(self, song_id: int) -> SongType:
-        with self.__app.get_db() as session:
-            return models.Song.GetById(session, song_id).to_dict()
+        with self.__app.get_read_db() as session:
+            return models.Song.GetDict(session, song_id)
 
     def play(self, song_id: int) -> SongType:
         pass
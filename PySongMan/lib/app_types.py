@@ -1,5 +1,5 @@
 """
-    Application Types
+Application Types
 """
 
 import typing
@@ -30,6 +30,13 @@ class SongType(typing.TypedDict):
 class PlaylistPage(typing.TypedDict):
     data: list[SongType]
     count: int
-    offset: int
     limit: int
-    page: int
+    # Pass back to get the next page, None after the last one
+    cursor: str | None
+
+
+class SearchPage(typing.TypedDict):
+    data: list[SongType]
+    limit: int
+    # Pass back with the same query to get the next page, None after the last one
+    cursor: str | None
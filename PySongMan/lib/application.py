@@ -6,7 +6,9 @@ import contextlib
 
 import webview
 
+from . import integrity
 from . import models
+from . import watcher
 
 
 class App:
@@ -18,9 +20,13 @@ class App:
     port: str
     __main_window: webview.Window | None
     db_path: str | None
+    __watcher: watcher.Watcher | None
+    __verifier: integrity.Verifier | None
 
     def __init__(self, port="8080", db_path=None):
         self.__main_window = None
+        self.__watcher = None
+        self.__verifier = None
         self.port = port
         self.db_path = db_path
 
@@ -37,3 +43,60 @@ class App:
         engine, session = models.connect(db_path=self.db_path)
         yield session
         session.close()
+
+    @contextlib.contextmanager
+    def get_read_db(self):
+        """
+        A session from the read-only pool, it never waits on a running import or the watcher
+
+        """
+        engine, session = models.connect(db_path=self.db_path, profile=models.READ_ONLY)
+        yield session
+        session.close()
+
+    def start_watcher(self) -> watcher.Watcher:
+        """
+        Start following every library on disk so new/moved/removed files show up live
+
+        :return:
+        """
+        if self.__watcher is None or not self.__watcher.is_alive():
+            with self.get_db() as session:
+                libraries = {
+                    library.path: library.id
+                    for library in models.Library.GetAll(session)
+                }
+
+            self.__watcher = watcher.Watcher(self.get_db, libraries)
+            self.__watcher.start()
+
+        return self.__watcher
+
+    def stop_watcher(self):
+        if self.__watcher is not None:
+            self.__watcher.stop()
+            self.__watcher = None
+
+    def start_verifier(self) -> integrity.Verifier:
+        """
+        Check every library against the disk in the background, dropping the songs of vanished
+        files and flagging changed ones for the next rescan
+
+        :return:
+        """
+        if self.__verifier is None or not self.__verifier.is_alive():
+            with self.get_db() as session:
+                libraries = {
+                    library.path: library.id
+                    for library in models.Library.GetAll(session)
+                }
+
+            self.__verifier = integrity.Verifier(self.get_db, libraries)
+            self.__verifier.start()
+
+        return self.__verifier
+
+    def stop_verifier(self):
+        if self.__verifier is not None:
+            self.__verifier.stop()
+            self.__verifier = None
@@ -0,0 +1,226 @@
+"""
+Adaptive probe concurrency.
+
+The right number of probes in flight depends entirely on the storage behind the library: a
+local SSD keeps getting faster well past the core count while a streaming cloud mount chokes
+on a handful. `AIMDController` finds the limit at run time the same way TCP finds a window,
+growing it by a constant while probes stay fast and error free and cutting it by a factor
+as soon as latency climbs past the best seen so far or errors show up.
+"""
+
+import asyncio
+import contextlib
+import logging
+import threading
+import time
+import typing as T
+
+LOG = logging.getLogger(__name__)
+
+DEFAULT_INITIAL = 4
+DEFAULT_MINIMUM = 1
+DEFAULT_MAXIMUM = 64
+
+# A window is at least this many probes, otherwise one per probe in flight
+MIN_WINDOW = 8
+
+# Latency this many times over the baseline counts as congestion
+LATENCY_TOLERANCE = 2.0
+
+# Share of failed probes in a window that counts as congestion
+MAX_ERROR_RATE = 0.05
+
+# How quickly the baseline latency forgets a fast stretch, so it can follow slower storage
+BASELINE_DRIFT = 0.05
+
+
+class ConcurrencyStats(T.NamedTuple):
+    limit: int
+    in_flight: int
+    # Files per second and mean seconds per file over the last window
+    throughput: float
+    latency: float
+    error_rate: float
+
+
+class AIMDController:
+    """
+    Additive increase, multiplicative decrease limit on probes in flight.
+
+    Gate work through `slot` from threads or `aslot` from a single event loop, not both.
+    """
+
+    limit: int
+    minimum: int
+    maximum: int
+    increase: int
+    decrease: float
+
+    def __init__(
+        self,
+        initial: int = DEFAULT_INITIAL,
+        minimum: int = DEFAULT_MINIMUM,
+        maximum: int = DEFAULT_MAXIMUM,
+        increase: int = 1,
+        decrease: float = 0.5,
+        latency_tolerance: float = LATENCY_TOLERANCE,
+        max_error_rate: float = MAX_ERROR_RATE,
+        clock: T.Callable[[], float] = time.monotonic,
+    ):
+        """
+
+        :param initial: starting limit
+        :param minimum: the limit never drops below this
+        :param maximum: the limit never grows past this
+        :param increase: added to the limit after a healthy window
+        :param decrease: factor applied to the limit after a congested window
+        :param latency_tolerance: latency over baseline treated as congestion
+        :param max_error_rate: failed share of a window treated as congestion
+        :param clock:
+        """
+        self.minimum = minimum
+        self.maximum = maximum
+        self.limit = min(max(initial, minimum), maximum)
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_tolerance = latency_tolerance
+        self.max_error_rate = max_error_rate
+        self.__clock = clock
+
+        self.__in_flight = 0
+        self.__cond = threading.Condition()
+        self.__acond: asyncio.Condition | None = None
+
+        self.__baseline: float | None = None
+        self.__latencies: list[float] = []
+        self.__errors = 0
+        self.__window_started = clock()
+        self.__last = ConcurrencyStats(self.limit, 0, 0.0, 0.0, 0.0)
+
+    @property
+    def in_flight(self) -> int:
+        return self.__in_flight
+
+    @property
+    def throughput(self) -> float:
+        return self.__last.throughput
+
+    def stats(self) -> ConcurrencyStats:
+        return self.__last._replace(limit=self.limit, in_flight=self.__in_flight)
+
+    def record(self, latency: float, ok: bool = True):
+        """
+        Feed back the outcome of one probe
+
+        :param latency: seconds the probe took, time spent waiting on a slot excluded
+        :param ok: False if the probe failed
+        :return:
+        """
+        self.__latencies.append(latency)
+        if not ok:
+            self.__errors += 1
+
+        if len(self.__latencies) >= max(self.limit, MIN_WINDOW):
+            self.__adjust()
+
+    def __adjust(self):
+        now = self.__clock()
+        samples = len(self.__latencies)
+        latency = sum(self.__latencies) / samples
+        error_rate = self.__errors / samples
+        elapsed = now - self.__window_started
+        throughput = samples / elapsed if elapsed > 0 else 0.0
+
+        if self.__baseline is None or latency < self.__baseline:
+            self.__baseline = latency
+        else:
+            self.__baseline += (latency - self.__baseline) * BASELINE_DRIFT
+
+        congested = (
+            error_rate > self.max_error_rate
+            or latency > self.__baseline * self.latency_tolerance
+        )
+
+        previous = self.limit
+        if congested:
+            self.limit = max(self.minimum, int(self.limit * self.decrease))
+        else:
+            self.limit = min(self.maximum, self.limit + self.increase)
+
+        if self.limit != previous:
+            LOG.debug(
+                "Concurrency %d -> %d: %.3fs latency (baseline %.3fs), %.1f%% errors",
+                previous,
+                self.limit,
+                latency,
+                self.__baseline,
+                error_rate * 100,
+            )
+
+        self.__last = ConcurrencyStats(
+            self.limit, self.__in_flight, throughput, latency, error_rate
+        )
+        self.__latencies = []
+        self.__errors = 0
+        self.__window_started = now
+
+        # A raised limit may let waiters through
+        self.__notify()
+
+    def __notify(self):
+        with self.__cond:
+            self.__cond.notify_all()
+        if self.__acond is not None:
+            try:
+                asyncio.get_running_loop().create_task(self.__anotify())
+            except RuntimeError:
+                # Fed from outside the loop, waiters pick the new limit up on their next wake
+                pass
+
+    async def __anotify(self):
+        async with self.__acond:
+            self.__acond.notify_all()
+
+    @contextlib.contextmanager
+    def slot(self):
+        """
+        Hold one of `limit` slots for the duration of a probe, and time it
+        """
+        with self.__cond:
+            self.__cond.wait_for(lambda: self.__in_flight < self.limit)
+            self.__in_flight += 1
+
+        started = self.__clock()
+        ok = False
+        try:
+            yield
+            ok = True
+        finally:
+            # The condition's lock is reentrant, `record` may notify waiters itself
+            with self.__cond:
+                self.__in_flight -= 1
+                self.record(self.__clock() - started, ok)
+                self.__cond.notify()
+
+    @contextlib.asynccontextmanager
+    async def aslot(self):
+        """
+        Asyncio flavor of `slot`
+        """
+        if self.__acond is None:
+            self.__acond = asyncio.Condition()
+
+        async with self.__acond:
+            await self.__acond.wait_for(lambda: self.__in_flight < self.limit)
+            self.__in_flight += 1
+
+        started = self.__clock()
+        ok = False
+        try:
+            yield
+            ok = True
+        finally:
+            async with self.__acond:
+                self.__in_flight -= 1
+                self.__acond.notify()
+            self.record(self.__clock() - started, ok)
@@ -0,0 +1,294 @@
+"""
+Failed probe handling.
+
+Probes that fail with something that might be transient (a timeout, ffprobe dying, a network
+drive dropping out) are first retried in process by a `RetryScheduler` with exponential backoff.
+Files that still fail are written to the `DeadLetter` table instead of being dropped, later
+imports skip them until their backoff expires and give up on them entirely after
+`PERMANENT_AFTER` failed imports, unless the file itself changes.
+"""
+
+import asyncio
+import datetime as DT
+import heapq
+import itertools
+import logging
+import subprocess
+import threading
+import time
+import typing as T
+
+from sqlalchemy import select, delete, or_
+from sqlalchemy.orm import Session
+
+from . import tag_reader
+from .models import DeadLetter, LOOKUP_CHUNK
+from .walker import FileState
+
+LOG = logging.getLogger(__name__)
+
+# Errors worth retrying, anything else is a bad file
+RETRYABLE = (
+    OSError,
+    TimeoutError,
+    asyncio.TimeoutError,
+    subprocess.TimeoutExpired,
+    subprocess.CalledProcessError,
+)
+
+# Errors that mean the file was read but makes no sense
+BAD_FILE = (KeyError, IndexError, tag_reader.TagReaderError)
+
+# In process retries
+RETRY_ATTEMPTS = 3
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 30.0
+RETRY_CONCURRENCY = 2
+
+# Between imports
+IMPORT_BASE_DELAY = DT.timedelta(hours=1)
+IMPORT_MAX_DELAY = DT.timedelta(days=7)
+PERMANENT_AFTER = 6
+
+
+def backoff(attempt: int, base: float, cap: float) -> float:
+    """
+    Exponential delay before retry number `attempt`, 1 based
+
+    :param attempt:
+    :param base: delay before the first retry
+    :param cap: longest delay
+    :return:
+    """
+    return min(base * 2 ** (attempt - 1), cap)
+
+
+class ProbeFailed(T.NamedTuple):
+    """
+    Queue marker for the writer: a file gave up on its in process retries
+    """
+
+    library_id: int
+    path: str
+    size: int
+    mtime_ns: int
+    error: str
+    permanent: bool = False
+
+    @classmethod
+    def From(
+        cls, library_id: int, state: FileState, error: BaseException, permanent=False
+    ) -> T.Self:
+        return cls(
+            library_id,
+            state.path,
+            state.size,
+            state.mtime_ns,
+            f"{type(error).__name__}: {error}",
+            permanent,
+        )
+
+
+class RetryScheduler:
+    """
+    Retries failed probes with exponential backoff, capping how many are retried at once.
+
+    The scheduler never sleeps or probes itself, callers poll `take` between fresh work so
+    a struggling file never stalls the files behind it. The cap is enforced through `slots`,
+    pass a `multiprocessing.BoundedSemaphore` to share it between worker processes.
+    """
+
+    max_attempts: int
+    base_delay: float
+    max_delay: float
+
+    def __init__(
+        self,
+        max_attempts: int = RETRY_ATTEMPTS,
+        base_delay: float = RETRY_BASE_DELAY,
+        max_delay: float = RETRY_MAX_DELAY,
+        max_concurrent: int = RETRY_CONCURRENCY,
+        slots=None,
+        clock: T.Callable[[], float] = time.monotonic,
+    ):
+        """
+
+        :param max_attempts: probes per file, the first one included
+        :param base_delay: seconds before the first retry
+        :param max_delay: longest wait between retries
+        :param max_concurrent: retries in flight at once, ignored when `slots` is given
+        :param slots: semaphore like object shared with other schedulers
+        :param clock:
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.__slots = (
+            threading.BoundedSemaphore(max_concurrent) if slots is None else slots
+        )
+        self.__clock = clock
+        self.__heap: list[tuple[float, int, FileState]] = []
+        self.__order = itertools.count()
+        self.__attempts: dict[str, int] = {}
+        self.__in_flight: set[str] = set()
+
+    def __len__(self):
+        """
+        Files scheduled or being retried
+        """
+        return len(self.__heap) + len(self.__in_flight)
+
+    def failed(self, state: FileState, error: BaseException) -> bool:
+        """
+        Schedule a retry of a failed probe.
+
+        :param state:
+        :param error:
+        :return: False once the file is out of attempts, it is then up to the caller to
+            dead letter it
+        """
+        self.__release(state)
+        attempts = self.__attempts.get(state.path, 0) + 1
+        if attempts >= self.max_attempts:
+            self.__attempts.pop(state.path, None)
+            LOG.debug(
+                "Giving up on %s after %d attempts: %s", state.path, attempts, error
+            )
+            return False
+
+        self.__attempts[state.path] = attempts
+        due = self.__clock() + backoff(attempts, self.base_delay, self.max_delay)
+        heapq.heappush(self.__heap, (due, next(self.__order), state))
+        return True
+
+    def done(self, state: FileState):
+        """
+        A retry succeeded
+        """
+        self.__release(state)
+        self.__attempts.pop(state.path, None)
+
+    def take(self) -> FileState | None:
+        """
+        Claim a retry that is due, `done` or `failed` must follow.
+
+        :return: None when nothing is due or every slot is busy
+        """
+        if not self.__heap or self.__heap[0][0] > self.__clock():
+            return None
+
+        if not self.__slots.acquire(False):
+            return None
+
+        _, _, state = heapq.heappop(self.__heap)
+        self.__in_flight.add(state.path)
+        return state
+
+    def next_due(self) -> float | None:
+        """
+        Seconds until the next retry is due, None if none are scheduled
+        """
+        if not self.__heap:
+            return None
+        return max(self.__heap[0][0] - self.__clock(), 0.0)
+
+    def __release(self, state: FileState):
+        if state.path in self.__in_flight:
+            self.__in_flight.discard(state.path)
+            self.__slots.release()
+
+
+def record_failures(
+    session: Session, failures: T.Sequence[ProbeFailed], now: DT.datetime = None
+):
+    """
+    Dead letter files, pushing back their next attempt on every failed import.
+
+    A file that changed since it was dead lettered starts over.
+
+    :param session:
+    :param failures:
+    :param now:
+    :return:
+    """
+    now = DT.datetime.now() if now is None else now
+
+    for start in range(0, len(failures), LOOKUP_CHUNK):
+        chunk = failures[start : start + LOOKUP_CHUNK]
+        known = {
+            letter.path: letter
+            for letter in session.scalars(
+                select(DeadLetter).where(
+                    DeadLetter.path.in_([failure.path for failure in chunk])
+                )
+            )
+        }
+
+        for failure in chunk:
+            letter = known.get(failure.path)
+            if letter is None:
+                letter = known[failure.path] = DeadLetter(
+                    library_id=failure.library_id, path=failure.path, attempts=0
+                )
+                session.add(letter)
+            elif (letter.size, letter.mtime_ns) != (failure.size, failure.mtime_ns):
+                letter.attempts = 0
+                letter.permanent = False
+
+            letter.size = failure.size
+            letter.mtime_ns = failure.mtime_ns
+            letter.error = failure.error
+            letter.attempts += 1
+            letter.permanent = (
+                letter.permanent
+                or failure.permanent
+                or letter.attempts >= PERMANENT_AFTER
+            )
+            delay = min(
+                IMPORT_BASE_DELAY * 2 ** (letter.attempts - 1), IMPORT_MAX_DELAY
+            )
+            letter.next_attempt = now + delay
+
+    session.flush()
+
+
+def clear(session: Session, paths: T.Sequence[str]) -> int:
+    """
+    Forget dead letters of files that have since been probed.
+
+    :param session:
+    :param paths:
+    :return: letters removed
+    """
+    removed = 0
+    for start in range(0, len(paths), LOOKUP_CHUNK):
+        result = session.execute(
+            delete(DeadLetter).where(
+                DeadLetter.path.in_(paths[start : start + LOOKUP_CHUNK])
+            )
+        )
+        removed += result.rowcount
+    return removed
+
+
+def skipped(
+    session: Session, library_id: int, now: DT.datetime = None
+) -> dict[str, tuple[int, int]]:
+    """
+    Files an import should leave alone, either given up on or still backing off.
+
+    :param session:
+    :param library_id:
+    :param now:
+    :return: path to the (size, mtime_ns) it failed with, a changed file is not skipped
+    """
+    now = DT.datetime.now() if now is None else now
+    stmt = select(DeadLetter.path, DeadLetter.size, DeadLetter.mtime_ns).where(
+        DeadLetter.library_id == library_id,
+        or_(DeadLetter.permanent.is_(True), DeadLetter.next_attempt > now),
+    )
+    return {path: (size, mtime_ns) for path, size, mtime_ns in session.execute(stmt)}
+
+
+def is_skipped(letters: dict[str, tuple[int, int]], state: FileState) -> bool:
+    return letters.get(state.path) == (state.size, state.mtime_ns)
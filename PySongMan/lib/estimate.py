@@ -0,0 +1,231 @@
+"""
+Import time estimates.
+
+`count_library` walks a library without reading any file, counting files, bytes and units of
+work and keeping a uniform random sample of its directories on the way. Whole directories are
+sampled rather than files as an album's files share most of their tags, a sample of scattered
+files would see every album tag once and take it for a tag every song has its own of. `importer.estimate_import`
+pushes that sample through the real stages and a scratch database and turns what it measured
+into an `Estimate`: projected duration, database size and tag count.
+
+`Progress` is the same model running live, it counts units as the writer finishes them against
+a total counted in the background and projects the time left from the rate so far.
+"""
+
+import logging
+import math
+import pathlib
+import random
+import threading
+import time
+import typing as T
+
+from .walker import DEFAULT_THREADS, FileState, walk_directories
+
+LOG = logging.getLogger(__name__)
+
+# Directories sampled, each contributes at most a unit's worth of files
+DEFAULT_SAMPLE = 20
+
+# Walker threads of the background count during an import, it competes with the real walk
+COUNT_THREADS = 2
+
+
+class LibraryCount(T.NamedTuple):
+    # Directories holding files
+    directories: int
+    files: int
+    bytes: int
+    # Units the importer will cut the files into, see `importer.directory_units`
+    units: int
+    seconds: float
+
+
+def count_library(
+    seed: pathlib.Path | str,
+    suffixes: T.Container[str] | None,
+    unit_size: int,
+    exclude: T.Callable[[str], bool] | None = None,
+    sample_size: int = 0,
+    rng: random.Random | None = None,
+    threads: int = DEFAULT_THREADS,
+) -> tuple[LibraryCount, list[FileState]]:
+    """
+    Count a library without reading its files, optionally sampling them.
+
+    :param seed: library root
+    :param suffixes: see `walker.walk_directories`
+    :param unit_size: files per unit
+    :param exclude: directories to leave out of the count, eg already journaled ones
+    :param sample_size: directories to sample uniformly at random
+    :param rng:
+    :param threads: directories listed concurrently
+    :return: the count and the files of the sampled directories, up to `unit_size` of each
+    """
+    rng = rng or random.Random()
+    start = time.monotonic()
+    directories = files = size = units = 0
+    sample: list[list[FileState]] = []
+
+    for directory, states in walk_directories(seed, suffixes, threads):
+        if not states or (exclude is not None and exclude(directory)):
+            continue
+
+        directories += 1
+        files += len(states)
+        size += sum(state.size for state in states)
+        units += math.ceil(len(states) / unit_size)
+        # Reservoir sampling keeps memory flat however large the library
+        if len(sample) < sample_size:
+            sample.append(states[:unit_size])
+        elif (slot := rng.randrange(directories)) < sample_size:
+            sample[slot] = states[:unit_size]
+
+    return (
+        LibraryCount(directories, files, size, units, time.monotonic() - start),
+        [state for states in sample for state in states],
+    )
+
+
+class Estimate(T.NamedTuple):
+    count: LibraryCount
+    sampled_directories: int
+    sampled: int
+    # Share of sampled files turned away or failing, they never become songs
+    dropped: float
+    # Sniff, probe and normalize time of one file on one worker, and the CPU time of it
+    seconds_per_file: float
+    cpu_per_file: float
+    probe_workers: int
+    cores: int
+    # Rows per second the scratch database took the sample at
+    write_rate: float
+    db_bytes_per_song: float
+    # Sampled tags found in a single directory, these grow with the number of directories
+    local_tags: int
+    # Sampled tags found across directories, genres and the like, these mostly stop growing
+    shared_tags: int
+
+    @property
+    def songs(self) -> int:
+        return round(self.count.files * (1 - self.dropped))
+
+    @property
+    def probe_seconds(self) -> float:
+        return self.count.files * self.seconds_per_file / max(self.probe_workers, 1)
+
+    @property
+    def write_seconds(self) -> float:
+        return self.songs / self.write_rate if self.write_rate else 0.0
+
+    @property
+    def seconds(self) -> float:
+        """
+        Projected import time: the walk, probing and writing overlap so the slowest one wins,
+        unless there are too few cores to run them side by side
+        """
+        cpu = self.count.files * self.cpu_per_file + self.write_seconds
+        return max(
+            self.count.seconds,
+            self.probe_seconds,
+            self.write_seconds,
+            cpu / max(self.cores, 1),
+        )
+
+    @property
+    def db_bytes(self) -> int:
+        return round(self.songs * self.db_bytes_per_song)
+
+    @property
+    def tags(self) -> int:
+        if not self.sampled_directories:
+            return 0
+        per_directory = self.local_tags / self.sampled_directories
+        return self.shared_tags + round(per_directory * self.count.directories)
+
+
+def duration(seconds: float | None) -> str:
+    """
+    Seconds as H:MM:SS, "?" when unknown
+    """
+    if seconds is None:
+        return "?"
+    minutes, secs = divmod(round(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{secs:02d}"
+
+
+class Progress:
+    """
+    Live units done against units counted, with the time left projected from the rate so far
+    """
+
+    total: int | None
+    done: int
+    # Fallback before any unit is done, eg from an `Estimate`
+    seconds_per_unit: float | None
+
+    def __init__(self, total: int | None = None, seconds_per_unit: float | None = None):
+        self.total = total
+        self.done = 0
+        self.seconds_per_unit = seconds_per_unit
+        self.__started = time.monotonic()
+
+    def count_in_background(
+        self,
+        seed: pathlib.Path | str,
+        suffixes: T.Container[str] | None,
+        unit_size: int,
+        exclude: T.Callable[[str], bool] | None = None,
+    ):
+        """
+        Fill in `total` from a count only walk on a thread of its own
+
+        :param seed:
+        :param suffixes:
+        :param unit_size:
+        :param exclude: see `count_library`
+        """
+
+        def count():
+            counted, _ = count_library(
+                seed, suffixes, unit_size, exclude, threads=COUNT_THREADS
+            )
+            self.total = counted.units
+            LOG.info(
+                "Counted %d files in %d units, %.1f GB",
+                counted.files,
+                counted.units,
+                counted.bytes / 1e9,
+            )
+
+        threading.Thread(target=count, name="progress-count", daemon=True).start()
+
+    def advance(self, units: int = 1):
+        self.done += units
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.__started
+
+    @property
+    def eta(self) -> float | None:
+        """
+        Seconds left, None until there is a total and a rate
+        """
+        if self.total is None:
+            return None
+
+        remaining = max(self.total - self.done, 0)
+        if self.done:
+            return remaining * self.elapsed / self.done
+        if self.seconds_per_unit is not None:
+            return remaining * self.seconds_per_unit
+        return None
+
+    def report(self) -> str:
+        if self.total is None:
+            return f"{self.done} units done, counting the rest"
+
+        share = self.done / self.total if self.total else 1.0
+        return f"{self.done}/{self.total} units ({share:.1%}), ETA {duration(self.eta)}"
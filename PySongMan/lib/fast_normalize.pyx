@@ -0,0 +1,117 @@
+# cython: language_level=3
+"""
+Compiled `normalize.py_normalize_batch`, build it in place with
+
+    cythonize -i PySongMan/lib/fast_normalize.pyx
+
+`normalize.normalize_batch` picks it up when present. Rows must stay identical to the pure
+Python version, `test_normalize` checks both against `to_record`.
+"""
+
+import os
+
+cdef tuple TITLE_KEYS = ("TITLE", "title", "NAME", "name")
+cdef tuple ARTIST_KEYS = ("ARTIST", "artist", "album_artist")
+cdef tuple MALFORMED = (KeyError, IndexError)
+
+cdef str SEP = os.sep
+cdef object ALTSEP = os.altsep
+
+# Past this a float no longer fits a long long
+cdef double INT_LIMIT = 9.2e18
+
+
+cdef long long as_int(object value):
+    cdef double number
+    if type(value) is int:
+        return value
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return 0
+    # Also false for NaN
+    if -INT_LIMIT < number < INT_LIMIT:
+        return <long long>number
+    return 0
+
+
+cdef tuple split_path(str path):
+    cdef Py_ssize_t end, cut
+    if ALTSEP is not None:
+        path = path.replace(ALTSEP, SEP)
+
+    cut = path.rfind(SEP)
+    name = path[cut + 1 :]
+    if cut < 0:
+        return name, "", ""
+
+    end = cut
+    cut = path.rfind(SEP, 0, end)
+    parent = path[cut + 1 : end]
+    if cut < 0:
+        return name, parent, ""
+
+    end = cut
+    cut = path.rfind(SEP, 0, end)
+    return name, parent, path[cut + 1 : end]
+
+
+def normalize_batch(object items, object library_id):
+    """
+    Normalize a batch of probe results, see `normalize.py_normalize_batch`
+
+    :param items: (walker entry, probe result) pairs
+    :param library_id:
+    :return: a record per item, or the error that made its result unusable
+    """
+    cdef list rows = []
+    cdef list pairs
+    cdef dict stream, file_format, tags
+    cdef str path, name, parent, grandparent
+
+    for state, result in items:
+        try:
+            stream = result["streams"][0]
+            file_format = result["format"]
+        except MALFORMED as exc:
+            rows.append(exc)
+            continue
+
+        tags = stream.get("tags", {})
+        path = state.path
+        name, parent, grandparent = split_path(path)
+
+        for key in TITLE_KEYS:
+            if key in tags:
+                title = tags[key]
+                break
+        else:
+            title = name
+
+        for key in ARTIST_KEYS:
+            if key in tags:
+                artist = tags[key]
+                break
+        else:
+            artist = grandparent if parent.lower() != "unsorted" else name
+
+        pairs = [(key.lower(), value) for key, value in tags.items()]
+
+        rows.append(
+            {
+                "name": title,
+                "artist": artist,
+                "size": as_int(file_format.get("size", 0)),
+                "length_seconds": as_int(file_format.get("duration", 0)),
+                "file_name": name,
+                "path": path,
+                "codec": stream.get("codec_name", ""),
+                "format": file_format.get("format_name", ""),
+                "mtime_ns": state.mtime_ns,
+                "inode": state.inode,
+                "library_id": library_id,
+                "tags": pairs,
+            }
+        )
+
+    return rows
@@ -0,0 +1,763 @@
+"""
+The library importer.
+
+Imports run as a `Pipeline`: walk → sniff → probe → normalize → write. Work moves through it in
+`Unit`s, a slice of one directory's files, so the journal checkpoint for a directory reaches the
+writer right behind that directory's songs whatever executor each stage runs on. Walking is
+the pipeline's source and writing its sink, the single writer owning the only connection.
+Sharded imports add a write stage instead whose workers each write a shard of their own, the
+shards are merged into the database once the pipeline is done.
+"""
+
+import asyncio
+import collections
+import contextlib
+import itertools
+import logging
+import math
+import multiprocessing as mp
+import os
+import pathlib
+import random
+import tempfile
+import time
+import typing as T
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from . import dead_letter, tag_reader
+from .concurrency import DEFAULT_MAXIMUM, AIMDController
+from .dead_letter import (
+    BAD_FILE,
+    RETRYABLE,
+    RETRY_CONCURRENCY,
+    ProbeFailed,
+    RetryScheduler,
+)
+from .estimate import DEFAULT_SAMPLE, Estimate, Progress, count_library
+from .journal import DirectoryDone, Journal
+from .manifest import Manifest, delete_songs, scan
+from .models import BULK_IMPORT, db_with, Base, Library
+from .normalize import SUFFIXES, normalize_batch
+from .pipeline import Executor, Pipeline, Stage, StageStats
+from .probe import PROBE_TIMEOUT, probe, aprobe
+from .probe_cache import ProbeCache
+from .readahead import READAHEAD_FILES, willneed
+from .shards import ShardWriter, merge
+from .tag_cache import TagCache
+from .walker import FileState, by_locality, walk_directories
+from .writer import DEFAULT_BATCH, BatchWriter
+
+LOG = logging.getLogger(__name__)
+
+# Files per unit of work
+UNIT_SIZE = 100
+
+STAGES = ("sniff", "probe", "normalize")
+
+
+class Unit(T.NamedTuple):
+    """
+    Up to `UNIT_SIZE` files of one directory, `directory` is None for units that are not journaled.
+
+    `items` changes shape as the unit moves along: `FileState` after walking, (FileState,
+    container) after sniffing, (FileState, probe result) after probing and `SongRecord` after
+    normalizing, with `Skipped` and `ProbeFailed` for files that dropped out along the way.
+    """
+
+    directory: str | None
+    parts: int
+    items: list
+
+
+class Skipped(T.NamedTuple):
+    """
+    A file the sniff stage turned away, `container` is None when nothing recognized it
+    """
+
+    path: str
+    container: str | None
+
+
+class ImportStats(T.NamedTuple):
+    library_id: int
+    rows: int
+    elapsed: float
+    stages: list[StageStats]
+    # Seconds the writer spent in transactions
+    writing: float = 0.0
+    # Files that were not audio, and files nothing recognized
+    skipped: int = 0
+    unknown: int = 0
+    # Share of tag lookups answered by the writer's `TagCache`
+    tag_hit_rate: float = 0.0
+
+    @property
+    def rate(self) -> float:
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def write_rate(self) -> float:
+        """
+        Rows per second of database time, what the writer could sustain if never starved
+        """
+        return self.rows / self.writing if self.writing else 0.0
+
+
+def parse_executor(spec: str) -> tuple[Executor, int]:
+    """
+    Parse "kind:workers" as used on the command line, "auto" workers means all but two cores
+
+    :param spec: eg "process:auto", "asyncio:32", "thread"
+    :return:
+    """
+    kind, _, workers = spec.partition(":")
+    if workers in ("", "auto"):
+        count = max(mp.cpu_count() - 2, 1)
+    else:
+        count = int(workers)
+    return Executor(kind), count
+
+
+DEFAULT_EXECUTORS = {
+    "sniff": parse_executor("thread:2"),
+    "probe": parse_executor("process:auto"),
+    "normalize": parse_executor("thread:1"),
+}
+
+# Write stage executor of sharded imports without one given
+SHARD_EXECUTOR = parse_executor("process:4")
+
+
+def directory_units(
+    seed: pathlib.Path | str,
+    journal: Journal,
+    letters: dict[str, tuple[int, int]],
+    size: int = UNIT_SIZE,
+) -> T.Iterator[Unit]:
+    """
+    Walk `seed` into units, leaving out directories the journal already has.
+
+    :param seed:
+    :param journal:
+    :param letters: dead lettered files to leave alone, see `dead_letter.skipped`
+    :param size: files per unit
+    :return:
+    """
+    skipped = 0
+    for directory, files in walk_directories(seed, SUFFIXES):
+        if journal.is_complete(directory):
+            skipped += len(files)
+            continue
+
+        files = [state for state in files if not dead_letter.is_skipped(letters, state)]
+        if not files:
+            continue
+
+        parts = (len(files) + size - 1) // size
+        for idx in range(0, len(files), size):
+            yield Unit(directory, parts, files[idx : idx + size])
+
+    if skipped:
+        LOG.info("Resume skipped %d files already imported", skipped)
+
+
+def file_units(
+    states: T.Sequence[FileState], size: int = UNIT_SIZE
+) -> T.Iterator[Unit]:
+    """
+    Units for loose files, ie the output of an incremental rescan, regrouped by directory
+    """
+    states = sorted(states, key=by_locality)
+    for idx in range(0, len(states), size):
+        yield Unit(None, 1, list(states[idx : idx + size]))
+
+
+def sniffer(readahead: int = READAHEAD_FILES):
+    """
+    Sniff stage: identify every file from its first few KB, turning away anything that is not
+    audio before it costs a parse or an ffprobe subprocess
+
+    :param readahead: files to prefetch ahead of the one being sniffed, 0 to not prefetch
+    """
+
+    def sniff(unit: Unit) -> Unit:
+        states = unit.items
+        if readahead:
+            willneed(states[:readahead])
+
+        items = []
+        for idx, state in enumerate(states):
+            if readahead:
+                willneed(states[idx + readahead : idx + readahead + 1])
+            try:
+                container = tag_reader.sniff(state.path)
+            except OSError as exc:
+                # Let the probe stage retry or dead letter it
+                LOG.debug("Unable to sniff %s: %s", state.path, exc)
+                items.append((state, None))
+                continue
+
+            if container in tag_reader.AUDIO:
+                items.append((state, container))
+            else:
+                LOG.debug("Skipping %s, sniffed as %s", state.path, container)
+                items.append(Skipped(state.path, container))
+
+        return unit._replace(items=items)
+
+    return sniff
+
+
+# Marks a file handed to the retry scheduler
+RETRYING = object()
+
+
+class Prober:
+    """
+    Probe stage: read every file's metadata, reading through the probe cache.
+
+    Files failing with a retryable error are retried with backoff while fresh units keep
+    flowing, their unit is held back until all of its files are settled.
+
+    Under the asyncio executor the files of a unit are probed concurrently, every file through
+    a slot of `controller`. Units run from one file to a whole album, the controller has to
+    see per file latencies or a large unit reads as congestion.
+    """
+
+    controller: AIMDController
+
+    def __init__(
+        self,
+        library_id: int,
+        cache_path: str | None = None,
+        retry_slots=None,
+        concurrency: int = DEFAULT_MAXIMUM,
+    ):
+        """
+
+        :param library_id:
+        :param cache_path: probe cache sidecar, None to always probe
+        :param retry_slots: semaphore capping retries across workers
+        :param concurrency: most asyncio probes in flight, the controller tunes up to it
+        """
+        self.library_id = library_id
+        self.cache = ProbeCache(cache_path) if cache_path else None
+        self.retries = RetryScheduler(slots=retry_slots)
+        self.controller = AIMDController(maximum=concurrency)
+        self.__held: dict[int, tuple[Unit, list]] = {}
+        self.__waiting: dict[int, int] = {}
+        self.__where: dict[str, tuple[int, int, str | None]] = {}
+        self.__ids = itertools.count()
+
+    @property
+    def pending(self) -> int:
+        return len(self.__held)
+
+    def __settle(self, state: FileState, result=None, error: Exception = None):
+        if error is None:
+            self.retries.done(state)
+            return state, result
+
+        if isinstance(error, RETRYABLE):
+            if self.retries.failed(state, error):
+                return RETRYING
+            LOG.warning("Giving up on %s: %s", state.path, error)
+            return ProbeFailed.From(self.library_id, state, error)
+
+        if isinstance(error, BAD_FILE):
+            LOG.warning("Unable to read %s: %s", state.path, error)
+        self.retries.done(state)
+        return ProbeFailed.From(self.library_id, state, error, permanent=True)
+
+    def probe(self, state: FileState, container: str | None = None):
+        try:
+            result = (
+                probe(state.path, container)
+                if self.cache is None
+                else self.cache.probe(state, container)
+            )
+        except RETRYABLE + BAD_FILE as exc:
+            return self.__settle(state, error=exc)
+        except Exception as exc:
+            # A bug or surprising probe output costs this file, not the rest of its unit
+            LOG.exception("Unexpected error probing %s", state.path)
+            return self.__settle(state, error=exc)
+        return self.__settle(state, result)
+
+    async def aprobe(self, state: FileState, container: str | None = None):
+        try:
+            async with self.controller.aslot():
+                try:
+                    result = await asyncio.wait_for(
+                        (
+                            aprobe(state.path, container)
+                            if self.cache is None
+                            else self.cache.aprobe(state, container)
+                        ),
+                        timeout=PROBE_TIMEOUT,
+                    )
+                except BAD_FILE as exc:
+                    # Read just fine, not a sign of congestion
+                    return self.__settle(state, error=exc)
+        except RETRYABLE as exc:
+            return self.__settle(state, error=exc)
+        except Exception as exc:
+            LOG.exception("Unexpected error probing %s", state.path)
+            return self.__settle(state, error=exc)
+        return self.__settle(state, result)
+
+    def __hold(self, unit: Unit, items: list) -> Unit | None:
+        waiting = [idx for idx, item in enumerate(items) if item is RETRYING]
+        if not waiting:
+            return unit._replace(items=items)
+
+        held_id = next(self.__ids)
+        self.__held[held_id] = (unit, items)
+        self.__waiting[held_id] = len(waiting)
+        for idx in waiting:
+            state, container = unit.items[idx]
+            self.__where[state.path] = (held_id, idx, container)
+        return None
+
+    def __call__(self, unit: Unit) -> Unit | None:
+        return self.__hold(
+            unit,
+            [
+                item if isinstance(item, Skipped) else self.probe(*item)
+                for item in unit.items
+            ],
+        )
+
+    async def acall(self, unit: Unit) -> Unit | None:
+        async def settle(item):
+            return item if isinstance(item, Skipped) else await self.aprobe(*item)
+
+        return self.__hold(
+            unit, list(await asyncio.gather(*(settle(item) for item in unit.items)))
+        )
+
+    def poll(self) -> list[Unit]:
+        """
+        Run the retries that are due
+        """
+        ready = []
+        while (state := self.retries.take()) is not None:
+            held_id, idx, container = self.__where[state.path]
+            outcome = self.probe(state, container)
+            if outcome is RETRYING:
+                continue
+
+            del self.__where[state.path]
+            unit, items = self.__held[held_id]
+            items[idx] = outcome
+            self.__waiting[held_id] -= 1
+            if not self.__waiting[held_id]:
+                del self.__held[held_id], self.__waiting[held_id]
+                ready.append(unit._replace(items=items))
+
+        return ready
+
+    def close(self):
+        stats = self.controller.stats()
+        if stats.throughput:
+            LOG.info(
+                "Probe concurrency settled at %d, %.1f files/sec",
+                stats.limit,
+                stats.throughput,
+            )
+        if self.cache is not None:
+            stats = self.cache.stats()
+            self.cache.close()
+            LOG.info(
+                "Probe cache: %d hits, %d misses (%.1f%%)",
+                stats.hits,
+                stats.misses,
+                stats.hit_rate * 100,
+            )
+
+
+def normalizer(library_id: int):
+    """
+    Normalize stage: turn probe results into song records
+    """
+
+    def normalize(unit: Unit) -> Unit:
+        records = []
+        probed = []
+        for item in unit.items:
+            if isinstance(item, (ProbeFailed, Skipped)):
+                records.append(item)
+            else:
+                probed.append(item)
+
+        for (state, _), row in zip(probed, normalize_batch(probed, library_id)):
+            if isinstance(row, Exception):
+                LOG.warning("Meta failure: %s for %s", row, state.path)
+                row = ProbeFailed.From(library_id, state, row, permanent=True)
+            records.append(row)
+
+        return unit._replace(items=records)
+
+    return normalize
+
+
+def write_unit(
+    writer: BatchWriter, unit: Unit, skipped: collections.Counter | None = None
+):
+    """
+    Sink: hand a unit's records and checkpoint to the writer
+
+    :param writer:
+    :param unit:
+    :param skipped: counts skipped files by container, None for unrecognized ones
+    """
+    for item in unit.items:
+        if isinstance(item, Skipped):
+            if skipped is not None:
+                skipped[item.container] += 1
+        elif isinstance(item, ProbeFailed):
+            writer.fail(item)
+        else:
+            writer.add(item)
+
+    if unit.directory is not None:
+        writer.mark(DirectoryDone(unit.directory, unit.parts))
+
+
+def import_stages(
+    library_id: int,
+    executors: dict[str, tuple[Executor, int]],
+    cache_path: str | None = None,
+    shard_dir: pathlib.Path | str | None = None,
+    batch_size: int = DEFAULT_BATCH,
+    readahead: int = READAHEAD_FILES,
+) -> list[Stage]:
+    """
+    Build the sniff, probe and normalize stages, plus a sharded write stage given `shard_dir`
+
+    :param library_id:
+    :param executors: stage name to (executor, workers), missing stages use the defaults
+    :param cache_path:
+    :param shard_dir: where the write stage's workers put their shards, see `shards`
+    :param batch_size: songs per shard transaction
+    :param readahead: see `sniffer`
+    :return:
+    """
+    executors = DEFAULT_EXECUTORS | executors
+    # Caps retries across every probe worker so a flaky mount isn't hammered
+    retry_slots = (
+        mp.BoundedSemaphore(RETRY_CONCURRENCY)
+        if executors["probe"][0] is Executor.PROCESS
+        else None
+    )
+
+    stages = [
+        Stage("sniff", sniffer, (readahead,), *executors["sniff"]),
+        Stage(
+            "probe",
+            Prober,
+            (library_id, cache_path, retry_slots, executors["probe"][1]),
+            *executors["probe"],
+        ),
+        Stage("normalize", normalizer, (library_id,), *executors["normalize"]),
+    ]
+    if shard_dir is not None:
+        stages.append(
+            Stage(
+                "write",
+                ShardWriter,
+                (shard_dir, batch_size),
+                *executors.get("write", SHARD_EXECUTOR),
+            )
+        )
+    return stages
+
+
+def import_units(
+    session: Session,
+    library_id: int,
+    units: T.Iterable[Unit],
+    stages: T.Sequence[Stage],
+    batch_size: int = DEFAULT_BATCH,
+    run_id: int | None = None,
+    report_every: float = 10.0,
+    shard_dir: pathlib.Path | str | None = None,
+    progress: Progress | None = None,
+) -> ImportStats:
+    """
+    Push units through the stages into the database.
+
+    Memory stays flat however many units there are: `units` is consumed lazily, every queue
+    between stages is bounded, stages hold back a bounded number of units and the writer
+    commits and forgets every batch.
+
+    :param session: the writer's session
+    :param library_id:
+    :param units: walked units, see `directory_units` and `file_units`
+    :param stages: see `import_stages`
+    :param batch_size: songs per writer transaction
+    :param run_id: `ImportRun` to checkpoint into
+    :param report_every: seconds between progress log lines
+    :param shard_dir: shards the stages write to, merged once they are done
+    :param progress: counts finished units for the progress log lines
+    :return:
+    """
+    start = time.monotonic()
+    progress = progress or Progress()
+    pipeline = Pipeline(stages)
+    if shard_dir is None:
+        writer = BatchWriter(session, batch_size, run_id)
+    else:
+        # Songs only reach this database with the merge, checkpoints would run ahead of them
+        writer = BatchWriter(session, batch_size, tag_cache=TagCache())
+    skipped = collections.Counter()
+    last_report = time.monotonic()
+
+    def sink(unit: Unit):
+        nonlocal last_report
+        write_unit(writer, unit, skipped)
+        progress.advance()
+        if time.monotonic() - last_report >= report_every:
+            if shard_dir is None:
+                LOG.info(
+                    "%d rows written, %.1f rows/sec, %s",
+                    writer.rows,
+                    writer.rate,
+                    progress.report(),
+                )
+            else:
+                LOG.info("Writing shards, %s", progress.report())
+            last_report = time.monotonic()
+
+    pipeline.run(units, sink)
+    writer.flush()
+
+    rows = writer.rows
+    writing = writer.busy
+    if shard_dir is not None:
+        merge_start = time.monotonic()
+        rows += merge(session, shard_dir)
+        if run_id is not None:
+            Journal.Checkpoint(session, run_id, (), rows)
+            session.commit()
+        writing += time.monotonic() - merge_start
+        LOG.info("Merged %d rows in %.1fs", rows, time.monotonic() - merge_start)
+
+    tags = writer.tags.stats()
+    LOG.info(
+        "Tag cache: %d hits, %d misses (%.1f%%), %d cached",
+        tags.hits,
+        tags.misses,
+        tags.hit_rate * 100,
+        tags.entries,
+    )
+
+    unknown = skipped.pop(None, 0)
+    if skipped or unknown:
+        LOG.info(
+            "Skipped %d files that are not audio (%s) and %d unrecognized files",
+            sum(skipped.values()),
+            ", ".join(f"{count} {kind}" for kind, count in skipped.most_common()),
+            unknown,
+        )
+
+    return ImportStats(
+        library_id,
+        rows,
+        time.monotonic() - start,
+        pipeline.stats(),
+        writing,
+        sum(skipped.values()),
+        unknown,
+        tags.hit_rate,
+    )
+
+
+def run_import(
+    seed: pathlib.Path | str,
+    db_path: str,
+    incremental=False,
+    resume=False,
+    batch_size: int = DEFAULT_BATCH,
+    cache_path: str | None = None,
+    executors: dict[str, tuple[Executor, int]] = None,
+    report_every: float = 10.0,
+    shard_dir: str | None = None,
+    readahead: int = READAHEAD_FILES,
+) -> ImportStats:
+    """
+    Import or rescan the library rooted at `seed`.
+
+    Given a "write" executor the songs are written to per worker shards and merged at the end
+    instead of going through the single writer, see `shards`.
+
+    :param seed: library root
+    :param db_path: SQLAlchemy database url
+    :param incremental: only probe new and changed files, dropping vanished ones
+    :param resume: skip the directories committed by the last interrupted import
+    :param batch_size: songs per writer transaction
+    :param cache_path: probe cache sidecar, None to always probe
+    :param executors: stage name to (executor, workers)
+    :param report_every: seconds between progress log lines
+    :param shard_dir: parent of the temporary shard directory, the system default if None
+    :param readahead: files prefetched ahead of the sniffer, 0 to not prefetch
+    :return:
+    """
+    # Stored paths are resolved against whatever directory reads them later
+    seed = pathlib.Path(seed).resolve()
+    start = time.monotonic()
+    executors = executors or {}
+    shards = (
+        tempfile.TemporaryDirectory(prefix="pysongman-shards-", dir=shard_dir)
+        if "write" in executors
+        else contextlib.nullcontext()
+    )
+
+    with db_with(db_path, create=True, profile=BULK_IMPORT) as session:
+        library = Library.GetOrCreate(session, path=str(seed))
+        session.add(library)
+        session.commit()
+        library_id = library.id
+
+        letters = dead_letter.skipped(session, library_id)
+        if letters:
+            LOG.info("Leaving %d dead lettered files alone", len(letters))
+
+        run_id = None
+        if incremental:
+            plan = scan(Manifest.Load(session, library_id), seed, SUFFIXES)
+            removed = delete_songs(session, plan.stale_ids)
+            session.commit()
+            to_probe = [
+                state
+                for state in plan.to_probe
+                if not dead_letter.is_skipped(letters, state)
+            ]
+            LOG.info(
+                "Rescan: %d to probe, %d removed, %d unchanged",
+                len(to_probe),
+                removed,
+                plan.unchanged,
+            )
+            # An interrupted rescan resumes by itself, committed rows are unchanged next time
+            units = file_units(to_probe)
+            progress = Progress(math.ceil(len(to_probe) / UNIT_SIZE))
+        else:
+            journal = Journal.Start(session, library_id, resume=resume)
+            run_id = journal.run_id
+            units = directory_units(seed, journal, letters)
+            progress = Progress()
+            progress.count_in_background(
+                seed, SUFFIXES, UNIT_SIZE, exclude=journal.is_complete
+            )
+
+        with shards as shard_path:
+            stats = import_units(
+                session,
+                library_id,
+                units,
+                import_stages(
+                    library_id,
+                    executors,
+                    cache_path,
+                    shard_path,
+                    batch_size,
+                    readahead,
+                ),
+                batch_size,
+                run_id,
+                report_every,
+                shard_path,
+                progress,
+            )
+
+        if run_id is not None:
+            Journal.Finish(session, run_id)
+
+    return stats._replace(elapsed=time.monotonic() - start)
+
+
+def estimate_import(
+    seed: pathlib.Path | str,
+    executors: dict[str, tuple[Executor, int]] = None,
+    sample_size: int = DEFAULT_SAMPLE,
+    batch_size: int = DEFAULT_BATCH,
+    rng: random.Random | None = None,
+) -> Estimate:
+    """
+    Project an import of `seed` from a count only walk and a random sample of its directories.
+
+    The sample goes through the real sniff, probe and normalize handlers one file at a time
+    and is written to a scratch database, nothing touches the library's own database.
+
+    :param seed: library root
+    :param executors: stage name to (executor, workers), the probe workers divide probe time
+    :param sample_size: directories to sample
+    :param batch_size:
+    :param rng:
+    :return:
+    """
+    counted, sample = count_library(
+        seed, SUFFIXES, UNIT_SIZE, sample_size=sample_size, rng=rng
+    )
+    LOG.info("Counted %d files in %.1fs", counted.files, counted.seconds)
+
+    sniff, prober, normalize = sniffer(readahead=0), Prober(0), normalizer(0)
+    records = []
+    start, cpu_start = time.monotonic(), time.process_time()
+    for state in sample:
+        # Files still waiting on a retry are counted as dropped
+        probed = prober(sniff(Unit(None, 1, [state])))
+        if probed is not None:
+            records.extend(
+                item for item in normalize(probed).items if isinstance(item, dict)
+            )
+    probing = time.monotonic() - start
+    # ffprobe runs in a child process and is not counted, the native readers are
+    cpu = time.process_time() - cpu_start
+    prober.close()
+
+    with tempfile.TemporaryDirectory(prefix="pysongman-estimate-") as scratch:
+        path = pathlib.Path(scratch) / "estimate.sqlite3"
+        engine = create_engine(f"sqlite:///{path}")
+        Base.metadata.create_all(engine)
+        with Session(engine) as session:
+            library = Library(path=str(seed))
+            session.add(library)
+            session.commit()
+            empty = path.stat().st_size
+
+            writer = BatchWriter(session, batch_size)
+            for record in records:
+                writer.add(record | {"library_id": library.id})
+            writer.flush()
+
+        engine.dispose()
+        db_bytes = path.stat().st_size - empty
+
+    # Directories each tag turned up in
+    spread = collections.defaultdict(set)
+    for record in records:
+        directory = os.path.dirname(record["path"])
+        for pair in record["tags"]:
+            spread[pair].add(directory)
+    local = sum(1 for directories in spread.values() if len(directories) == 1)
+
+    rows = len(records)
+    probe_workers = (DEFAULT_EXECUTORS | (executors or {}))["probe"][1]
+    return Estimate(
+        counted,
+        len({os.path.dirname(state.path) for state in sample}),
+        len(sample),
+        1 - rows / len(sample) if sample else 0.0,
+        probing / len(sample) if sample else 0.0,
+        cpu / len(sample) if sample else 0.0,
+        probe_workers,
+        os.cpu_count() or 1,
+        rows / writer.busy if writer.busy else 0.0,
+        db_bytes / rows if rows else 0.0,
+        local,
+        len(spread) - local,
+    )
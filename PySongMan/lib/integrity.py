@@ -0,0 +1,215 @@
+"""
+Library integrity checks.
+
+`verify_library` streams a library's `Song` rows in keyset ordered chunks, stats every path on a
+thread pool and applies each chunk's verdicts in one transaction:
+
+- vanished files have their songs deleted
+- changed files (size, mtime or inode differ) are flagged for re-probing by zeroing their
+  `mtime_ns`, which the next incremental rescan treats as changed, see `manifest.Manifest.check`
+- files that cannot be stat'ed for any other reason are left alone
+
+Only one chunk is held at a time so memory stays flat however large the library. A library
+whose root is missing, say an unmounted drive, is skipped instead of emptied.
+"""
+
+import concurrent.futures as cf
+import enum
+import logging
+import os
+import threading
+import time
+import typing as T
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from .manifest import delete_songs
+from .models import Song
+
+LOG = logging.getLogger(__name__)
+
+# Songs per keyset chunk and per transaction
+CHUNK = 2000
+
+# Concurrent stats, network mounts answer slowly but happily in parallel
+DEFAULT_THREADS = 16
+
+
+class Status(enum.Enum):
+    OK = "ok"
+    VANISHED = "vanished"
+    CHANGED = "changed"
+    UNREACHABLE = "unreachable"
+
+
+class VerifyStats(T.NamedTuple):
+    library_id: int
+    checked: int
+    vanished: int
+    changed: int
+    unreachable: int
+    elapsed: float
+
+    @property
+    def rate(self) -> float:
+        return self.checked / self.elapsed if self.elapsed else 0.0
+
+
+def check(path: str, size: int, mtime_ns: int, inode: int) -> Status:
+    """
+    Compare a stored file identity against the file on disk
+
+    :param path:
+    :param size:
+    :param mtime_ns:
+    :param inode:
+    :return:
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return Status.VANISHED
+    except NotADirectoryError:
+        # A parent directory was replaced by a file
+        return Status.VANISHED
+    except OSError as exc:
+        LOG.debug("Unable to stat %s: %s", path, exc)
+        return Status.UNREACHABLE
+
+    if (stat.st_size, stat.st_mtime_ns, stat.st_ino) == (size, mtime_ns, inode):
+        return Status.OK
+    return Status.CHANGED
+
+
+def verify_library(
+    session: Session,
+    library_id: int,
+    root: str | None = None,
+    chunk: int = CHUNK,
+    threads: int = DEFAULT_THREADS,
+    stop: threading.Event | None = None,
+) -> VerifyStats:
+    """
+    Check every song of a library against its file, deleting or flagging the ones that differ.
+
+    :param session:
+    :param library_id:
+    :param root: library root, nothing is touched if it is missing
+    :param chunk: songs per keyset chunk and transaction
+    :param threads: concurrent stats
+    :param stop: set to stop after the current chunk
+    :return:
+    """
+    start = time.monotonic()
+    checked = vanished = changed = unreachable = 0
+
+    if root is not None and not os.path.isdir(root):
+        LOG.warning("Library root %s is missing, not verifying it", root)
+        return VerifyStats(library_id, 0, 0, 0, 0, 0.0)
+
+    last_id = 0
+    with cf.ThreadPoolExecutor(
+        max_workers=threads, thread_name_prefix="verify"
+    ) as pool:
+        while stop is None or not stop.is_set():
+            rows = session.execute(
+                select(Song.id, Song.path, Song.size, Song.mtime_ns, Song.inode)
+                .where(Song.library_id == library_id, Song.id > last_id)
+                .order_by(Song.id)
+                .limit(chunk)
+            ).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+
+            gone, stale = [], []
+            statuses = pool.map(lambda row: check(*row[1:]), rows)
+            for row, status in zip(rows, statuses):
+                if status is Status.VANISHED:
+                    gone.append(row.id)
+                elif status is Status.CHANGED:
+                    stale.append(row.id)
+                elif status is Status.UNREACHABLE:
+                    unreachable += 1
+
+            if gone:
+                delete_songs(session, gone)
+            if stale:
+                session.execute(
+                    update(Song).where(Song.id.in_(stale)).values(mtime_ns=0)
+                )
+            session.commit()
+
+            checked += len(rows)
+            vanished += len(gone)
+            changed += len(stale)
+
+    stats = VerifyStats(
+        library_id,
+        checked,
+        vanished,
+        changed,
+        unreachable,
+        time.monotonic() - start,
+    )
+    LOG.info(
+        "Verified %d songs of library %d in %.1fs: %d vanished, %d changed, %d unreachable",
+        stats.checked,
+        library_id,
+        stats.elapsed,
+        stats.vanished,
+        stats.changed,
+        stats.unreachable,
+    )
+    return stats
+
+
+class Verifier(threading.Thread):
+    """
+    Background thread verifying every library once
+    """
+
+    results: list[VerifyStats]
+
+    def __init__(
+        self,
+        get_db: T.Callable[[], T.ContextManager],
+        libraries: dict[str, int],
+        threads: int = DEFAULT_THREADS,
+    ):
+        """
+
+        :param get_db: context manager factory yielding a session, ie `App.get_db`
+        :param libraries: library root path to library id
+        :param threads: concurrent stats
+        """
+        super().__init__(name="library-verifier", daemon=True)
+        self.get_db = get_db
+        self.libraries = libraries
+        self.threads = threads
+        self.results = []
+        self.__stop = threading.Event()
+
+    def stop(self, timeout: float | None = 5.0):
+        self.__stop.set()
+        if self.is_alive():
+            self.join(timeout)
+
+    def run(self):
+        for root, library_id in self.libraries.items():
+            if self.__stop.is_set():
+                break
+            try:
+                with self.get_db() as session:
+                    self.results.append(
+                        verify_library(
+                            session,
+                            library_id,
+                            root,
+                            threads=self.threads,
+                            stop=self.__stop,
+                        )
+                    )
+            except Exception:
+                LOG.exception("Failed to verify library %d", library_id)
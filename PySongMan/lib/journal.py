@@ -0,0 +1,137 @@
+"""
+Import checkpoint journal.
+
+Probe workers follow the records of every directory they finish with a `DirectoryDone`
+marker. The writer commits those markers as `ImportCheckpoint` rows in the same transaction
+as the songs that precede them, so the journal can never claim a directory whose songs were
+lost with a killed writer. `--resume` skips the directories of the last unfinished run.
+"""
+
+import logging
+import typing as T
+
+from sqlalchemy import select, update, delete
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from .models import ImportRun, ImportCheckpoint
+
+LOG = logging.getLogger(__name__)
+
+RUNNING = "running"
+COMPLETE = "complete"
+ABANDONED = "abandoned"
+
+
+class DirectoryDone(T.NamedTuple):
+    """
+    Queue marker: every song of one part of `directory` has been sent ahead of this.
+
+    Large directories are probed in several parts, possibly by different workers, the
+    directory only counts as done once all `parts` markers arrived.
+    """
+
+    directory: str
+    parts: int = 1
+
+
+class Journal:
+    """
+    The checkpoint state of one import run
+    """
+
+    run_id: int
+
+    def __init__(self, run_id: int, completed: T.Iterable[str] = ()):
+        self.run_id = run_id
+        self.__completed = set(completed)
+
+    def __len__(self):
+        return len(self.__completed)
+
+    def is_complete(self, directory: str) -> bool:
+        return directory in self.__completed
+
+    @classmethod
+    def Start(cls, session: Session, library_id: int, resume=False) -> T.Self:
+        """
+        Open a journal for an import, picking up the last unfinished run when resuming.
+
+        Starting fresh abandons any unfinished runs of the library.
+
+        :param session:
+        :param library_id:
+        :param resume:
+        :return:
+        """
+        running = (
+            session.execute(
+                select(ImportRun)
+                .where(ImportRun.library_id == library_id, ImportRun.status == RUNNING)
+                .order_by(ImportRun.id.desc())
+            )
+            .scalars()
+            .all()
+        )
+
+        if resume and running:
+            run = running[0]
+            completed = session.execute(
+                select(ImportCheckpoint.directory).where(
+                    ImportCheckpoint.run_id == run.id
+                )
+            ).scalars()
+            journal = cls(run.id, completed)
+            LOG.info(
+                "Resuming import run %d: %d directories, %d rows already committed",
+                run.id,
+                len(journal),
+                run.rows,
+            )
+            return journal
+
+        for run in running:
+            run.status = ABANDONED
+
+        run = ImportRun(library_id=library_id, status=RUNNING)
+        session.add(run)
+        session.commit()
+        return cls(run.id)
+
+    @staticmethod
+    def Checkpoint(
+        session: Session, run_id: int, directories: T.Collection[str], rows: int
+    ):
+        """
+        Record a committed batch, the caller commits it together with the batch itself.
+
+        :param session:
+        :param run_id:
+        :param directories: directories fully contained in this or earlier batches
+        :param rows: songs in this batch
+        :return:
+        """
+        if directories:
+            session.execute(
+                sqlite_insert(ImportCheckpoint).on_conflict_do_nothing(),
+                [dict(run_id=run_id, directory=directory) for directory in directories],
+            )
+
+        session.execute(
+            update(ImportRun)
+            .where(ImportRun.id == run_id)
+            .values(batches=ImportRun.batches + 1, rows=ImportRun.rows + rows)
+        )
+
+    @staticmethod
+    def Finish(session: Session, run_id: int):
+        """
+        Mark a run complete and drop its checkpoints, they only matter while resuming.
+        """
+        session.execute(
+            delete(ImportCheckpoint).where(ImportCheckpoint.run_id == run_id)
+        )
+        session.execute(
+            update(ImportRun).where(ImportRun.id == run_id).values(status=COMPLETE)
+        )
+        session.commit()
@@ -0,0 +1,191 @@
+"""
+Incremental rescan support.
+
+A `Manifest` is a snapshot of (path, size, mtime, inode) for every song already stored for a
+library. Comparing a fresh walk against it tells us which files need probing and which rows
+belong to files that have vanished.
+"""
+
+import enum
+import logging
+import os
+import pathlib
+import typing as T
+
+from sqlalchemy import select, delete
+from sqlalchemy.orm import Session
+
+from .models import Song, Song_Tag
+from .walker import FileState, walk
+
+LOG = logging.getLogger(__name__)
+
+DELETE_CHUNK = 500
+
+
+class Change(enum.Enum):
+    NEW = "new"
+    CHANGED = "changed"
+    UNCHANGED = "unchanged"
+
+
+class RescanPlan(T.NamedTuple):
+    """
+    The outcome of comparing a walk against the manifest
+    """
+
+    to_probe: list[FileState]
+    stale_ids: list[int]
+    unchanged: int
+
+
+class Manifest:
+    """
+    Known file states for one library keyed by path
+    """
+
+    def __init__(self, rows: T.Iterable[tuple[int, str, int, int, int]]):
+        self.__known: dict[str, tuple[int, int, int, int]] = {
+            path: (song_id, size, mtime_ns, inode)
+            for song_id, path, size, mtime_ns, inode in rows
+        }
+        self.__seen: set[str] = set()
+
+    def __len__(self):
+        return len(self.__known)
+
+    @classmethod
+    def Load(cls, session: Session, library_id: int) -> T.Self:
+        """
+        Stream the stored file identities of a library into a manifest.
+
+        :param session:
+        :param library_id:
+        :return:
+        """
+        stmt = (
+            select(Song.id, Song.path, Song.size, Song.mtime_ns, Song.inode)
+            .where(Song.library_id == library_id)
+            .execution_options(yield_per=5000)
+        )
+        return cls(session.execute(stmt))
+
+    def check(self, state: FileState) -> Change:
+        """
+        Compare a file against the manifest and mark it as seen.
+
+        Rows without a recorded mtime predate the manifest and are treated as changed.
+
+        :param state:
+        :return:
+        """
+        known = self.__known.get(state.path)
+        if known is None:
+            return Change.NEW
+
+        self.__seen.add(state.path)
+        _, size, mtime_ns, inode = known
+        if mtime_ns == 0:
+            return Change.CHANGED
+
+        if (size, mtime_ns, inode) == (state.size, state.mtime_ns, state.inode):
+            return Change.UNCHANGED
+
+        return Change.CHANGED
+
+    def keep(self, directories: T.Iterable[str]):
+        """
+        Mark every known path under `directories` as seen, whatever their files' state.
+
+        :param directories:
+        """
+        prefixes = tuple(directory.rstrip(os.sep) + os.sep for directory in directories)
+        if prefixes:
+            self.__seen.update(
+                path for path in self.__known if path.startswith(prefixes)
+            )
+
+    def song_id(self, path: str) -> int:
+        return self.__known[path][0]
+
+    def vanished(self) -> list[int]:
+        """
+        Song ids whose paths were never passed to `check`
+        """
+        return [
+            song_id
+            for path, (song_id, *_) in self.__known.items()
+            if path not in self.__seen
+        ]
+
+
+def delete_songs(
+    session: Session, song_ids: T.Sequence[int], chunk=DELETE_CHUNK
+) -> int:
+    """
+    Delete songs and their tag associations in chunks to stay under SQLite's variable limit.
+
+    :param session:
+    :param song_ids:
+    :param chunk:
+    :return: Number of song rows deleted
+    """
+    deleted = 0
+    for start in range(0, len(song_ids), chunk):
+        batch = song_ids[start : start + chunk]
+        session.execute(delete(Song_Tag).where(Song_Tag.c.song_id.in_(batch)))
+        result = session.execute(delete(Song).where(Song.id.in_(batch)))
+        deleted += result.rowcount
+
+    return deleted
+
+
+def scan(
+    manifest: Manifest, seed: pathlib.Path, suffixes: T.Container[str]
+) -> RescanPlan:
+    """
+    Walk `seed` and sort every audio file into probe-needed or unchanged.
+
+    Changed files have their existing rows listed as stale so they can be replaced,
+    along with the rows of every file that no longer exists. Files under a directory that
+    could not be listed are kept, and a missing `seed`, say an unmounted drive, plans nothing
+    at all instead of dropping the whole library.
+
+    :param manifest:
+    :param seed:
+    :param suffixes: lower case file suffixes to consider
+    :return:
+    """
+    to_probe = []
+    stale_ids = []
+    unchanged = 0
+    unlisted: set[str] = set()
+
+    if not os.path.isdir(seed):
+        LOG.warning("Library root %s is missing, not rescanning it", seed)
+        return RescanPlan(to_probe, stale_ids, unchanged)
+
+    for batch in walk(seed, suffixes, unlisted=unlisted):
+        for state in batch:
+            change = manifest.check(state)
+            if change is Change.UNCHANGED:
+                unchanged += 1
+                continue
+
+            if change is Change.CHANGED:
+                stale_ids.append(manifest.song_id(state.path))
+            to_probe.append(state)
+
+    if unlisted:
+        LOG.warning("Keeping the songs under %d unlisted directories", len(unlisted))
+        manifest.keep(unlisted)
+    stale_ids.extend(manifest.vanished())
+    LOG.debug(
+        "Rescan %s: %d to probe, %d stale, %d unchanged",
+        seed,
+        len(to_probe),
+        len(stale_ids),
+        unchanged,
+    )
+
+    return RescanPlan(to_probe, stale_ids, unchanged)
@@ -1,9 +1,12 @@
 import asyncio
+import base64
 import contextlib
 import datetime as DT
 import enum
+import json
 import logging
 import pathlib
+import re
 import typing as T
 
 import sqlalchemy
@@ -13,11 +16,22 @@ from sqlalchemy import (
     create_engine,
     func,
     delete,
+    event,
+    cast,
+    insert,
+    literal,
     ForeignKey,
+    Float,
+    Integer,
+    MetaData,
+    String,
+    text,
     UniqueConstraint,
     Table,
     Column,
+    tuple_,
 )
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.asyncio import async_scoped_session
 
@@ -32,10 +46,13 @@ from sqlalchemy.orm import (
     relationship,
 )
 
-from .app_types import Identifier, SongType, TagType, GetPlaylistPage
+from .app_types import Identifier, SongType, TagType
 
 log = logging.getLogger(__name__)
 
+# Keeps bound parameters of IN (...) lookups well under SQLite's variable limit
+LOOKUP_CHUNK = 450
+
 
 @contextlib.asynccontextmanager
 async def async_db(db_url="sqlite:///pysongman.sqlite3", echo=False, create=False):
@@ -59,56 +76,200 @@ async def async_db(db_url="sqlite:///pysongman.sqlite3", echo=False, create=Fals
 
 
 @contextlib.contextmanager
-def db_with(db_url="sqlite:///pysongman.sqlite3", echo=False, create=False):
+def db_with(
+    db_url="sqlite:///pysongman.sqlite3", echo=False, create=False, profile=None
+):
     """
     Context wrapper around connect
 
     :param db_url:
     :param echo:
     :param create:
+    :param profile: see `connect`, defaults to `INTERACTIVE`
     :return:
     """
 
-    engine, session = connect(db_url, echo=echo, create=create)
+    engine, session = connect(
+        db_url, echo=echo, create=create, profile=profile or INTERACTIVE
+    )
     yield session
 
     session.close_all()
     engine.dispose()
 
 
-SA_ENGINE = None
+class Profile(T.NamedTuple):
+    """
+    How a pool's connections are opened, see `connect`
+    """
 
+    name: str
+    # PRAGMA name to value, run in order on every new connection
+    pragmas: dict[str, str | int]
+    pool_size: int
+    max_overflow: int
+
+
+# The app's own writes: watcher, verifier, library edits. WAL lets readers carry on while a
+# write is open, NORMAL only syncs on checkpoints which is durable enough with WAL.
+INTERACTIVE = Profile(
+    "interactive",
+    {
+        "busy_timeout": 15_000,
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -64 * 1024,  # KiB
+        "mmap_size": 256 * 1024 * 1024,
+        "temp_store": "MEMORY",
+    },
+    pool_size=5,
+    max_overflow=10,
+)
+
+# Imports: fewer, larger checkpoints. They have to run in bounded memory however large the
+# library is, so the page cache stays small and nothing is mapped, mapped pages count towards
+# the process' RSS as soon as they are read. A larger cache did not make imports any faster.
+BULK_IMPORT = Profile(
+    "bulk-import",
+    {
+        "busy_timeout": 30_000,
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -2 * 1024,
+        "mmap_size": 0,
+        "temp_store": "MEMORY",
+        "wal_autocheckpoint": 10_000,  # pages
+    },
+    pool_size=2,
+    max_overflow=4,
+)
 
-def connect(db_path: pathlib.Path | str, echo=False, create=True):
+# The UI's reads, a pool of its own so a busy writer never holds up a page of songs.
+# journal_mode is still set, whoever opens a new database first switches it to WAL.
+READ_ONLY = Profile(
+    "read-only",
+    {
+        "busy_timeout": 15_000,
+        "journal_mode": "WAL",
+        "cache_size": -16 * 1024,
+        "mmap_size": 256 * 1024 * 1024,
+        "temp_store": "MEMORY",
+        "query_only": "ON",
+    },
+    pool_size=10,
+    max_overflow=20,
+)
+
+PROFILES = {profile.name: profile for profile in (INTERACTIVE, BULK_IMPORT, READ_ONLY)}
+
+# (database url, profile name) to engine, every profile gets a pool of its own
+SA_ENGINES: dict[tuple[str, str], sqlalchemy.Engine] = {}
+
+
+def apply_profile(engine: sqlalchemy.Engine, profile: Profile):
+    """
+    Run the profile's pragmas on every connection the engine opens
+
+    :param engine:
+    :param profile:
+    :return:
+    """
+
+    def profile_pragmas(dbapi_connection, _connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma, value in profile.pragmas.items():
+            cursor.execute(f"PRAGMA {pragma}={value}")
+        cursor.close()
+
+    event.listen(engine, "connect", profile_pragmas)
+
+
+def connect(
+    db_path: pathlib.Path | str,
+    echo=False,
+    create=True,
+    profile: Profile = INTERACTIVE,
+):
     """
 
     :param db_path:
     :param echo: Echo session data to console
     :param create: Try to create schema if it doesn't exist
+    :param profile: connection settings, engines are cached per database and profile
     :return:
     """
-    global SA_ENGINE
+    key = (str(db_path), profile.name)
 
-    if SA_ENGINE is None:
+    engine = SA_ENGINES.get(key)
+    if engine is None:
         engine = create_engine(
             db_path,
             echo=echo,
-            pool_size=10,
-            max_overflow=20,
-            connect_args={"timeout": 15},
+            pool_size=profile.pool_size,
+            max_overflow=profile.max_overflow,
         )
-        if create:
-            Base.metadata.create_all(engine, checkfirst=True)
+        apply_profile(engine, profile)
+        if profile is not READ_ONLY:
+            with engine.begin() as connection:
+                upgrade(connection)
+            if create:
+                Base.metadata.create_all(engine, checkfirst=True)
 
-        SA_ENGINE = engine
-    else:
-        engine = SA_ENGINE
+        SA_ENGINES[key] = engine
 
     session_factory = sessionmaker(bind=engine)
 
     return engine, scoped_session(session_factory)
 
 
+# Columns added to tables that older databases already have, `create_all` skips existing tables.
+# Defaults mark every old song as changed so the next incremental rescan probes it again.
+UPGRADE_COLUMNS = {
+    "Song": [
+        "mtime_ns INTEGER NOT NULL DEFAULT 0",
+        "inode INTEGER NOT NULL DEFAULT 0",
+    ],
+}
+
+
+def upgrade(connection: sqlalchemy.Connection):
+    """
+    Bring a database created by an older version up to the current schema, a no-op on a new or
+    current one. The caller owns the transaction.
+
+    :param connection:
+    :return:
+    """
+    for table, columns in UPGRADE_COLUMNS.items():
+        existing = {
+            row.name
+            for row in connection.exec_driver_sql(f"PRAGMA table_info({table})")
+        }
+        if not existing:
+            continue
+        for column in columns:
+            name = column.split()[0]
+            if name not in existing:
+                log.info("Upgrade: adding %s.%s", table, name)
+                connection.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN {column}")
+
+    # Tag's unique constraint used to be ON CONFLICT REPLACE, which hands a re-inserted tag a
+    # new id. SQLite can't alter a constraint so the table is rebuilt, ids stay the same.
+    tag_sql = connection.exec_driver_sql(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'Tag'"
+    ).scalar()
+    if tag_sql and "ON CONFLICT REPLACE" in tag_sql.upper():
+        log.info("Upgrade: rebuilding Tag without ON CONFLICT REPLACE")
+        columns = ", ".join(column.name for column in Tag.__table__.columns)
+        connection.exec_driver_sql("CREATE TEMP TABLE Tag_upgrade AS SELECT * FROM Tag")
+        connection.exec_driver_sql("DROP TABLE Tag")
+        Tag.__table__.create(connection)
+        connection.exec_driver_sql(
+            f"INSERT INTO Tag ({columns}) SELECT {columns} FROM Tag_upgrade"
+        )
+        connection.exec_driver_sql("DROP TABLE Tag_upgrade")
+
+
 def get_scoped_session(db_path: pathlib.Path | str, echo=False, create=False):
 
     engine, scoped = connect(db_path, echo=echo, create=create)
@@ -232,11 +393,59 @@ class Tag(Base):
         UniqueConstraint(
             "name",
             "value",
-            sqlite_on_conflict="REPLACE",
             name="unique_name_value",
         ),
     )
 
+    @classmethod
+    def BulkIds(
+        cls, session: Session, pairs: T.Iterable[tuple[str, str]], cache=None
+    ) -> dict[tuple[str, str], int]:
+        """
+        Resolve (name, value) pairs to tag ids, inserting whichever are missing.
+
+        New tags are inserted with `ON CONFLICT DO NOTHING` so existing ids never change,
+        the ids of pre-existing tags are then looked up in chunks.
+
+        :param session:
+        :param pairs:
+        :param cache: optional `tag_cache.TagCache`, only pairs it misses reach SQLite
+        :return: mapping of (name, value) to tag id
+        """
+        wanted = set(pairs)
+        if not wanted:
+            return {}
+
+        if cache is not None:
+            cached, wanted = cache.lookup(wanted)
+            if not wanted:
+                return cached
+            found = cls.BulkIds(session, wanted)
+            cache.update(found)
+            return cached | found
+
+        table = cls.__table__
+        stmt = (
+            sqlite_insert(table)
+            .on_conflict_do_nothing(index_elements=["name", "value"])
+            .returning(table.c.id, table.c.name, table.c.value)
+        )
+        rows = [dict(name=name, value=value) for name, value in wanted]
+        found = {
+            (name, value): tag_id for tag_id, name, value in session.execute(stmt, rows)
+        }
+
+        missing = [pair for pair in wanted if pair not in found]
+        for start in range(0, len(missing), LOOKUP_CHUNK):
+            chunk = missing[start : start + LOOKUP_CHUNK]
+            lookup = select(table.c.id, table.c.name, table.c.value).where(
+                tuple_(table.c.name, table.c.value).in_(chunk)
+            )
+            for tag_id, name, value in session.execute(lookup):
+                found[(name, value)] = tag_id
+
+        return found
+
 
 Song_Tag = Table(
     "Song_Tag",
@@ -262,6 +471,10 @@ class Song(Base):
     codec: Mapped[str]
     format: Mapped[str]
 
+    # File identity at probe time, used to skip unchanged files on rescan
+    mtime_ns: Mapped[int] = mapped_column(default=0)
+    inode: Mapped[int] = mapped_column(default=0)
+
     tags: Mapped[list[Tag]] = relationship(secondary=Song_Tag, back_populates="songs")
 
     library_id: Mapped[str] = mapped_column(ForeignKey("Library.id"), index=True)
@@ -280,23 +493,592 @@ class Song(Base):
         )
 
     @classmethod
-    def GetPage(cls, session: Session, page: int, limit: int = 100, filters=None):
+    def ToDicts(cls, session: Session, rows: T.Sequence) -> list[SongType]:
+        """
+        Build `SongType`s from rows of `SONG_COLUMNS`, fetching all of their tags in one query
+        instead of lazy loading them song by song.
+
+        :param session:
+        :param rows:
+        :return: in the same order as `rows`
+        """
+        tags: dict[int, list[TagType]] = {row.id: [] for row in rows}
+        song_ids = list(tags)
+        for start in range(0, len(song_ids), LOOKUP_CHUNK):
+            lookup = (
+                select(Song_Tag.c.song_id, Tag.id, Tag.name, Tag.value)
+                .join(Tag, Tag.id == Song_Tag.c.tag_id)
+                .where(Song_Tag.c.song_id.in_(song_ids[start : start + LOOKUP_CHUNK]))
+            )
+            for song_id, tag_id, name, value in session.execute(lookup):
+                tags[song_id].append(TagType(id=tag_id, name=name, value=value))
+
+        return [
+            SongType(
+                id=row.id,
+                name=row.name,
+                artist=row.artist,
+                size=row.size,
+                length_seconds=row.length_seconds,
+                tags=tags[row.id],
+            )
+            for row in rows
+        ]
 
-        stmt = select(cls).limit(limit).offset(max(page, 1) * limit)
-        if filters is not None:
-            stmt.filter_by(**filters)
+    @classmethod
+    def GetDict(cls, session: Session, song_id: Identifier) -> SongType:
+        """
+        A song as a `SongType` without loading it
 
+        :param session:
+        :param song_id:
+        :return:
+        """
+        row = session.execute(select(*SONG_COLUMNS).where(cls.id == song_id)).one()
+        return cls.ToDicts(session, [row])[0]
+
+    @classmethod
+    def BulkInsert(
+        cls, session: Session, records: T.Sequence[dict], tag_cache=None
+    ) -> list[int]:
+        """
+        Write a batch of plain song dictionaries with Core executemany statements.
+
+        Each record holds the Song column values plus a `tags` list of (name, value) pairs.
+        Songs are upserted on `path` so a re-import refreshes rows in place, their tag
+        associations are replaced and written with a single Song_Tag statement.
+
+        :param session:
+        :param records:
+        :param tag_cache: optional `tag_cache.TagCache` passed on to `Tag.BulkIds`
+        :return: song ids in the same order as `records`
+        """
+        if not records:
+            return []
+
+        table = cls.__table__
+        rows = [
+            {key: value for key, value in record.items() if key != "tags"}
+            for record in records
+        ]
+        stmt = sqlite_insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["path"],
+            set_={
+                column: stmt.excluded[column] for column in rows[0] if column != "path"
+            }
+            | {"updated_on": func.now()},
+        )
+        session.execute(stmt, rows)
+
+        # SQLite can't promise RETURNING order for a multi row insert, go by path instead
+        paths = [row["path"] for row in rows]
+        path_ids = {}
+        for start in range(0, len(paths), LOOKUP_CHUNK):
+            lookup = select(table.c.path, table.c.id).where(
+                table.c.path.in_(paths[start : start + LOOKUP_CHUNK])
+            )
+            path_ids.update(session.execute(lookup).all())
+        song_ids = [path_ids[path] for path in paths]
+
+        for start in range(0, len(song_ids), LOOKUP_CHUNK):
+            chunk = song_ids[start : start + LOOKUP_CHUNK]
+            session.execute(delete(Song_Tag).where(Song_Tag.c.song_id.in_(chunk)))
+
+        tag_ids = Tag.BulkIds(
+            session, (pair for record in records for pair in record["tags"]), tag_cache
+        )
+        links = {
+            (song_id, tag_ids[pair])
+            for song_id, record in zip(song_ids, records)
+            for pair in record["tags"]
+        }
+        if links:
+            session.execute(
+                sqlite_insert(Song_Tag).on_conflict_do_nothing(),
+                [dict(song_id=song_id, tag_id=tag_id) for song_id, tag_id in links],
+            )
+
+        refresh_search(session)
+
+        return song_ids
+
+    @classmethod
+    def GetPage(
+        cls,
+        session: Session,
+        cursor: str | None = None,
+        limit: int = 100,
+        filters: dict[str, T.Any] | None = None,
+        sort: str = "id",
+        descending: bool = False,
+        exact: bool = False,
+    ):
+        """
+        A page of songs walked with a keyset on an indexed column, a deep page costs the same as
+        the first one. Songs come back as `SongType`s, see `ToDicts`.
+
+        :param session:
+        :param cursor: the previous page's `cursor`, None for the first page
+        :param limit:
+        :param filters: column name to value, applies to the page and to the count
+        :param sort: one of `PAGE_SORTS`, ties are broken on id
+        :param descending:
+        :param exact: count with COUNT(*) instead of reading `SongCount`
+        :return: the songs, the count of songs matching `filters` and the next page's cursor,
+            None after the last page
+        """
+        if sort not in PAGE_SORTS:
+            raise ValueError(f"Unable to page songs by {sort!r}")
+
+        keys = (cls.id,) if sort == "id" else (getattr(cls, sort), cls.id)
+
+        stmt = select(*SONG_COLUMNS)
         countq = select(func.count(cls.id))
-        if filters is not None:
+        if filters:
+            stmt = stmt.filter_by(**filters)
             countq = countq.filter_by(**filters)
 
-        count = session.execute(countq).scalars().one_or_none()
-        data = session.execute(stmt).scalars().all()
+        if cursor is not None:
+            after = Cursor.Decode(cursor)
+            if (after.sort, after.descending) != (sort, descending):
+                raise ValueError(f"Cursor is for a walk by {after.sort!r}")
+            bound = (after.id,) if sort == "id" else (after.value, after.id)
+            if descending:
+                stmt = stmt.where(tuple_(*keys) < tuple_(*bound))
+            else:
+                stmt = stmt.where(tuple_(*keys) > tuple_(*bound))
+
+        order = [key.desc() for key in keys] if descending else keys
+        # One extra row tells whether there is a next page
+        rows = session.execute(stmt.order_by(*order).limit(limit + 1)).all()
+
+        following = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            following = Cursor(sort, descending, getattr(last, sort), last.id).encode()
+
+        data = cls.ToDicts(session, rows)
+
+        count = None if exact else SongCount.Lookup(session, filters)
+        if count is None:
+            count = session.execute(countq).scalar_one()
+
+        return dict(count=count, data=data, cursor=following)
+
+    @classmethod
+    def Search(
+        cls,
+        session: Session,
+        query: str,
+        cursor: str | None = None,
+        limit: int = 100,
+    ):
+        """
+        Songs matching every word of `query` by title, artist or any tag value, best match
+        first. The last word matches as a prefix so results show up while typing.
+
+        Ranking needs every match scored, a query matching more than `SEARCH_RANKED` songs
+        lists the newest first instead and is ranked once it has been narrowed down.
+
+        :param session:
+        :param query: what the user typed
+        :param cursor: the previous page's `cursor`, None for the first page
+        :param limit:
+        :return: the songs and the next page's cursor, None after the last page
+        """
+        match = search_query(query)
+        if match is None:
+            return dict(data=[], cursor=None)
+        matches = text("SongSearch MATCH :match").bindparams(match=match)
+
+        after = Cursor.Decode(cursor) if cursor is not None else None
+        if after is not None and after.sort not in ("rank", "newest"):
+            raise ValueError(f"Cursor is for a walk by {after.sort!r}")
+
+        if after is None:
+            # bm25 has to score every match before the best can be picked, a prefix like "lo"
+            # can match half the library. Count up to the bound first, that only walks rowids.
+            newest = session.execute(
+                select(SongSearch.c.rowid)
+                .where(matches)
+                .order_by(SongSearch.c.rowid.desc())
+                .limit(SEARCH_RANKED + 1)
+            ).all()
+            ranked = len(newest) <= SEARCH_RANKED
+        else:
+            # The first page picked how the query is walked, a later page can't switch
+            ranked = after.sort == "rank"
+
+        stmt = (
+            select(*SONG_COLUMNS)
+            .join_from(SongSearch, cls, cls.id == SongSearch.c.rowid)
+            .where(matches)
+        )
+        if ranked:
+            stmt = stmt.add_columns(SongSearch.c.rank).order_by(
+                SongSearch.c.rank, cls.id
+            )
+            if after is not None:
+                stmt = stmt.where(
+                    tuple_(SongSearch.c.rank, cls.id) > tuple_(after.value, after.id)
+                )
+        elif after is None:
+            # Too broad to rank, newest first until the query is narrowed down. The first page
+            # is already in hand from the count.
+            page = [song_id for (song_id,) in newest[: limit + 1]]
+            stmt = select(*SONG_COLUMNS).where(cls.id.in_(page)).order_by(cls.id.desc())
+        else:
+            # By the index's own rowid so FTS5 streams the matches instead of sorting them all
+            stmt = stmt.where(SongSearch.c.rowid < after.id).order_by(
+                SongSearch.c.rowid.desc()
+            )
+
+        rows = session.execute(stmt.limit(limit + 1)).all()
+
+        following = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            if ranked:
+                following = Cursor("rank", False, last.rank, last.id).encode()
+            else:
+                following = Cursor("newest", True, last.id, last.id).encode()
 
-        return dict(count=count, data=data)
+        return dict(data=cls.ToDicts(session, rows), cursor=following)
+
+
+# What a `SongType` is built from, see `Song.ToDicts`
+SONG_COLUMNS = (Song.id, Song.name, Song.artist, Song.size, Song.length_seconds)
+
+# Columns `Song.GetPage` can order by, each is indexed and one of `SONG_COLUMNS`
+PAGE_SORTS = ("id", "artist", "size")
+
+
+class Cursor(T.NamedTuple):
+    """
+    Where a `Song.GetPage` page ended, handed to the UI as an opaque token
+    """
+
+    sort: str
+    descending: bool
+    # The last song's sort column value and id
+    value: T.Any
+    id: int
+
+    def encode(self) -> str:
+        return base64.urlsafe_b64encode(json.dumps(list(self)).encode()).decode()
+
+    @classmethod
+    def Decode(cls, token: str) -> "Cursor":
+        try:
+            return cls(*json.loads(base64.urlsafe_b64decode(token)))
+        except (ValueError, TypeError) as exc:
+            raise ValueError(f"Invalid cursor {token!r}") from exc
+
+
+# Song columns with a maintained count per value, the ones the UI filters on
+COUNTED_COLUMNS = ("library_id", "artist")
+
+
+class SongCount(Base):
+    """
+    Songs per value of each of `COUNTED_COLUMNS` plus the total, the row with an empty name.
+
+    Triggers on `Song` keep it current whichever way songs are written: bulk upserts, deletes,
+    shard merges or the ORM. `Rebuild` recounts from scratch.
+    """
+
+    name: Mapped[str]
+    # Stored as text whatever the column's type, filters come from the UI as strings
+    value: Mapped[str]
+    songs: Mapped[int] = mapped_column(default=0)
+
+    __table_args__ = (UniqueConstraint("name", "value", name="unique_song_count"),)
+
+    @classmethod
+    def Lookup(cls, session: Session, filters: dict[str, T.Any] | None = None):
+        """
+        Maintained count of songs matching `filters`
+
+        :param session:
+        :param filters: column name to value
+        :return: the count, None if no maintained count covers the filters
+        """
+        if not filters:
+            name, value = "", ""
+        elif len(filters) == 1 and next(iter(filters)) in COUNTED_COLUMNS:
+            name, value = next(iter(filters.items()))
+            value = str(value)
+        else:
+            return None
+
+        songs = session.execute(
+            select(cls.songs).where(cls.name == name, cls.value == value)
+        ).scalar_one_or_none()
+        if songs is None and name:
+            # Rows go away with their last song
+            return 0
+        return songs
+
+    @classmethod
+    def Rebuild(cls, session: Session | sqlalchemy.Connection):
+        """
+        Recount every maintained count from the `Song` table
+
+        :param session: a session or connection, the caller commits
+        :return:
+        """
+        table = cls.__table__
+        columns = [table.c.name, table.c.value, table.c.songs]
+
+        session.execute(delete(table))
+        session.execute(
+            insert(table).from_select(
+                columns, select(literal(""), literal(""), func.count(Song.id))
+            )
+        )
+        for name in COUNTED_COLUMNS:
+            column = getattr(Song, name)
+            session.execute(
+                insert(table).from_select(
+                    columns,
+                    select(
+                        literal(name), cast(column, String), func.count(Song.id)
+                    ).group_by(column),
+                )
+            )
+
+
+def count_triggers() -> list[str]:
+    """
+    DDL of the triggers maintaining `SongCount`
+    """
+
+    def change(name: str, row: str, delta: int) -> str:
+        value = "''" if not name else f"CAST({row}.{name} AS TEXT)"
+        if delta > 0:
+            return (
+                f"INSERT INTO SongCount (name, value, songs) VALUES ('{name}', {value}, 1)"
+                f" ON CONFLICT (name, value) DO UPDATE SET songs = songs + 1;"
+            )
+        statement = (
+            f"UPDATE SongCount SET songs = songs - 1"
+            f" WHERE name = '{name}' AND value = {value};"
+        )
+        if name:
+            # The total stays, even at zero, `Lookup` tells a missing total from no songs
+            statement += (
+                f" DELETE FROM SongCount"
+                f" WHERE name = '{name}' AND value = {value} AND songs <= 0;"
+            )
+        return statement
+
+    names = ("",) + COUNTED_COLUMNS
+    triggers = [
+        "CREATE TRIGGER IF NOT EXISTS song_count_insert AFTER INSERT ON Song BEGIN "
+        + " ".join(change(name, "NEW", 1) for name in names)
+        + " END",
+        "CREATE TRIGGER IF NOT EXISTS song_count_delete AFTER DELETE ON Song BEGIN "
+        + " ".join(change(name, "OLD", -1) for name in names)
+        + " END",
+    ]
+    for name in COUNTED_COLUMNS:
+        triggers.append(
+            f"CREATE TRIGGER IF NOT EXISTS song_count_update_{name}"
+            f" AFTER UPDATE OF {name} ON Song WHEN OLD.{name} IS NOT NEW.{name} BEGIN "
+            + change(name, "OLD", -1)
+            + " "
+            + change(name, "NEW", 1)
+            + " END"
+        )
+    return triggers
+
+
+@event.listens_for(Base.metadata, "after_create")
+def create_count_triggers(target, connection, **kw):
+    """
+    Add the `SongCount` triggers to a new or existing database, counting its songs the first time
+    """
+    for trigger in count_triggers():
+        connection.exec_driver_sql(trigger)
+
+    total = select(SongCount.id).where(SongCount.name == "")
+    if connection.execute(total).first() is None:
+        SongCount.Rebuild(connection)
+
+
+# Songs whose search document is out of date, triggers queue them and `refresh_search` drains them
+SearchPending = Table(
+    "SearchPending",
+    Base.metadata,
+    Column("song_id", Integer, primary_key=True),
+)
+
+# The FTS5 index, one document per song keyed by its id. Not part of `Base.metadata`, SQLAlchemy
+# can't create virtual tables, see `create_search_index`.
+SongSearch = Table(
+    "SongSearch",
+    MetaData(),
+    Column("rowid", Integer, primary_key=True),
+    Column("name", String),
+    Column("artist", String),
+    # Every tag value of the song, space separated
+    Column("tags", String),
+    # bm25, lower is better
+    Column("rank", Float),
+)
+
+# Shortest word matched as a prefix, the first of the index's `prefix` lengths
+SEARCH_PREFIX = 2
+
+# Queries matching more songs than this aren't ranked, see `Song.Search`
+SEARCH_RANKED = 1000
+
+# bm25 weights of name, artist and tags: a title hit beats an artist hit beats a tag hit
+SEARCH_WEIGHTS = (10.0, 5.0, 1.0)
+
+SEARCH_DDL = [
+    # Prefix indexes make the short prefixes of search-as-you-type as cheap as whole words
+    "CREATE VIRTUAL TABLE IF NOT EXISTS SongSearch USING fts5("
+    "name, artist, tags, tokenize='unicode61 remove_diacritics 2', prefix='2 3 4')",
+    "CREATE TRIGGER IF NOT EXISTS song_search_insert AFTER INSERT ON Song BEGIN"
+    " INSERT OR IGNORE INTO SearchPending (song_id) VALUES (NEW.id); END",
+    "CREATE TRIGGER IF NOT EXISTS song_search_update AFTER UPDATE OF name, artist ON Song"
+    " WHEN OLD.name IS NOT NEW.name OR OLD.artist IS NOT NEW.artist BEGIN"
+    " INSERT OR IGNORE INTO SearchPending (song_id) VALUES (NEW.id); END",
+    "CREATE TRIGGER IF NOT EXISTS song_search_delete AFTER DELETE ON Song BEGIN"
+    " DELETE FROM SongSearch WHERE rowid = OLD.id;"
+    " DELETE FROM SearchPending WHERE song_id = OLD.id; END",
+    "CREATE TRIGGER IF NOT EXISTS song_search_link AFTER INSERT ON Song_Tag BEGIN"
+    " INSERT OR IGNORE INTO SearchPending (song_id) VALUES (NEW.song_id); END",
+    "CREATE TRIGGER IF NOT EXISTS song_search_unlink AFTER DELETE ON Song_Tag BEGIN"
+    " INSERT OR IGNORE INTO SearchPending (song_id) VALUES (OLD.song_id); END",
+]
+
+
+def search_query(query: str) -> str | None:
+    """
+    Turn what the user typed into an FTS5 query, every word quoted so FTS5 syntax characters
+    in the input are taken literally.
+
+    Only the word still being typed matches as a prefix, and only once it is as long as the
+    shortest prefix index. A prefix without an index merges the lists of every word starting
+    with it, slow for a single letter or a whole common word. Repeated words are dropped, bm25
+    reads the full list of every word in the query once per search.
+
+    :param query:
+    :return: None if there is nothing to search for
+    """
+    words = [word.lower() for word in re.findall(r"\w+", query)]
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    if re.search(r"\w$", query) and len(words[-1]) >= SEARCH_PREFIX:
+        terms[-1] += "*"
+    return " ".join(dict.fromkeys(terms))
+
+
+def refresh_search(session: Session | sqlalchemy.Connection):
+    """
+    Rewrite the search documents of every pending song in one pass.
+
+    Triggers only queue songs, a song gets a link per tag and rewriting its document after each
+    of them would index it over and over. Writers call this once per batch, `Song.BulkInsert`
+    and `shards.merge` do.
+
+    :param session: a session or connection, the caller commits
+    :return:
+    """
+    pending = select(SearchPending.c.song_id)
+    tags = (
+        select(func.group_concat(Tag.value, " "))
+        .join_from(Song_Tag, Tag, Tag.id == Song_Tag.c.tag_id)
+        .where(Song_Tag.c.song_id == Song.id)
+        .scalar_subquery()
+    )
+
+    session.execute(delete(SongSearch).where(SongSearch.c.rowid.in_(pending)))
+    session.execute(
+        insert(SongSearch).from_select(
+            ["rowid", "name", "artist", "tags"],
+            select(Song.id, Song.name, Song.artist, tags).where(Song.id.in_(pending)),
+        )
+    )
+    session.execute(delete(SearchPending))
+
+
+@event.listens_for(Base.metadata, "after_create")
+def create_search_index(target, connection, **kw):
+    """
+    Add the search index and its triggers to a new or existing database, indexing every song
+    the first time and whatever is still pending after that
+    """
+    exists = connection.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE name = 'SongSearch'"
+    ).first()
+    for statement in SEARCH_DDL:
+        connection.exec_driver_sql(statement)
+
+    if not exists:
+        weights = ", ".join(str(weight) for weight in SEARCH_WEIGHTS)
+        connection.exec_driver_sql(
+            f"INSERT INTO SongSearch (SongSearch, rank) VALUES ('rank', 'bm25({weights})')"
+        )
+        connection.execute(
+            insert(SearchPending).from_select(["song_id"], select(Song.id))
+        )
+    refresh_search(connection)
 
 
 class Library(Base):
     path: Mapped[str] = mapped_column(index=True, unique=True)
 
     songs: Mapped[list[Song]] = relationship("Song", back_populates="library")
+
+
+class ImportRun(Base):
+    """
+    One import of a library, checkpoints hang off of it so a killed import can resume
+    """
+
+    library_id: Mapped[int] = mapped_column(ForeignKey("Library.id"), index=True)
+    status: Mapped[str] = mapped_column(default="running", index=True)
+    batches: Mapped[int] = mapped_column(default=0)
+    rows: Mapped[int] = mapped_column(default=0)
+
+    checkpoints: Mapped[list["ImportCheckpoint"]] = relationship(
+        back_populates="run", cascade="all, delete-orphan"
+    )
+
+
+class ImportCheckpoint(Base):
+    """
+    A directory whose songs are all committed for an `ImportRun`
+    """
+
+    run_id: Mapped[int] = mapped_column(ForeignKey("ImportRun.id"), index=True)
+    directory: Mapped[str]
+
+    run: Mapped[ImportRun] = relationship(back_populates="checkpoints")
+
+    __table_args__ = (
+        UniqueConstraint("run_id", "directory", name="unique_run_directory"),
+    )
+
+
+class DeadLetter(Base):
+    """
+    A file that could not be probed, kept so it can be retried later instead of lost
+    """
+
+    library_id: Mapped[int] = mapped_column(ForeignKey("Library.id"), index=True)
+    path: Mapped[str] = mapped_column(index=True, unique=True)
+    size: Mapped[int]
+    mtime_ns: Mapped[int]
+    error: Mapped[str]
+    attempts: Mapped[int] = mapped_column(default=1)
+    next_attempt: Mapped[DT.datetime] = mapped_column(index=True)
+    # Given up on until the file itself changes
+    permanent: Mapped[bool] = mapped_column(default=False)
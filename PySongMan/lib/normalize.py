@@ -0,0 +1,222 @@
+"""
+Turn raw probe results into song records.
+
+Largely my library is <lib path>/<artist name>/<album name>/#_title, when tags are missing the
+path is used to fill in the blanks.
+
+`to_record` normalizes one result at a time through the `key_try` helpers. Importers hand over
+whole batches to `normalize_batch` instead, the compiled `fast_normalize` extension when it has
+been built with `cythonize -i PySongMan/lib/fast_normalize.pyx`, otherwise the equivalent pure
+Python `py_normalize_batch`.
+"""
+
+import os
+import pathlib
+import typing as T
+
+from .walker import FileState
+from .writer import SongRecord
+
+# Files the importers will sniff, what is actually in them is up to `tag_reader.sniff`
+SUFFIXES = (
+    ".mp3",
+    ".mp4",
+    ".m4a",
+    ".m4b",
+    ".ogg",
+    ".oga",
+    ".opus",
+    ".flac",
+    ".wav",
+    ".aif",
+    ".aiff",
+    ".wma",
+    ".aac",
+)
+
+
+def key_try(src, *keys, default=None):
+    for key in keys:
+        if key in src:
+            return src[key]
+
+    return default
+
+
+class Missing:
+    """
+    Sentinel meant for checking if a return value is missing.
+    This allows setting a variable to None if desired while still being able to
+    track if there was no match.
+    """
+
+    pass
+
+
+def try_title(tag_dict, element: pathlib.Path):
+    """
+    Custom title finder.
+
+    Largely my library is <lib path>/<artist name>/<album name>/#_title
+
+    :param tag_dict:
+    :param element:
+    :return:
+    """
+    title = key_try(
+        tag_dict,
+        "TITLE",
+        "title",
+        "NAME",
+        "name",
+        default=Missing(),
+    )
+
+    if isinstance(title, Missing):
+        title = element.name
+
+    return title
+
+
+def try_artist(tag_dict, element: pathlib.Path):
+    """
+    Largely my library is <lib path>/<artist name>/<album name>/#_title
+
+    :param tag_dict:
+    :param element:
+    :return:
+    """
+    artist = key_try(
+        tag_dict,
+        "ARTIST",
+        "artist",
+        "album_artist",
+        default=Missing(),
+    )
+
+    if isinstance(artist, Missing):
+        if element.parent.name.lower() != "unsorted":
+            artist = element.parent.parent.name
+        else:
+            artist = element.name
+
+    return artist
+
+
+def as_int(value) -> int:
+    """
+    Probe results carry numbers as strings, and sometimes as "N/A"
+    """
+    try:
+        return int(float(value))
+    except (TypeError, ValueError, OverflowError):
+        return 0
+
+
+def to_record(result: dict, library_id: int, state: FileState) -> SongRecord:
+    """
+    Normalize a ffprobe shaped result into a record for the writer
+
+    :param result: `probe`/`ffprobe` output
+    :param library_id:
+    :param state: walker entry, its stat results are reused as is
+    :return:
+    :raises KeyError: if the result has no streams or format
+    """
+    element = pathlib.Path(state.path)
+    tag_dict = result["streams"][0].get("tags", {})
+
+    return SongRecord(
+        name=try_title(tag_dict, element),
+        artist=try_artist(tag_dict, element),
+        size=as_int(result["format"].get("size", 0)),
+        length_seconds=as_int(key_try(result["format"], "duration", default=0)),
+        file_name=element.name,
+        path=str(element),
+        codec=key_try(result["streams"][0], "codec_name", default=""),
+        format=key_try(result["format"], "format_name", default=""),
+        mtime_ns=state.mtime_ns,
+        inode=state.inode,
+        library_id=library_id,
+        tags=[(mname.lower(), mvalue) for mname, mvalue in tag_dict.items()],
+    )
+
+
+TITLE_KEYS = ("TITLE", "title", "NAME", "name")
+ARTIST_KEYS = ("ARTIST", "artist", "album_artist")
+
+# Errors that make a probe result unusable
+MALFORMED = (KeyError, IndexError)
+
+
+def split_path(path: str) -> tuple[str, str, str]:
+    """
+    The file, parent and grandparent names of `path`, what `pathlib` gives without its cost
+    """
+    if os.altsep:
+        path = path.replace(os.altsep, os.sep)
+    head, _, name = path.rpartition(os.sep)
+    head, _, parent = head.rpartition(os.sep)
+    return name, parent, head.rpartition(os.sep)[2]
+
+
+def py_normalize_batch(
+    items: T.Sequence[tuple[FileState, dict]], library_id: int
+) -> list[SongRecord | Exception]:
+    """
+    Normalize a batch of probe results, the same rows `to_record` gives one at a time.
+
+    :param items: (walker entry, probe result) pairs
+    :param library_id:
+    :return: a record per item, or the error that made its result unusable
+    """
+    rows = []
+    for state, result in items:
+        try:
+            stream = result["streams"][0]
+            file_format = result["format"]
+        except MALFORMED as exc:
+            rows.append(exc)
+            continue
+
+        tags = stream.get("tags", {})
+        name, parent, grandparent = split_path(state.path)
+
+        for key in TITLE_KEYS:
+            if key in tags:
+                title = tags[key]
+                break
+        else:
+            title = name
+
+        for key in ARTIST_KEYS:
+            if key in tags:
+                artist = tags[key]
+                break
+        else:
+            artist = grandparent if parent.lower() != "unsorted" else name
+
+        rows.append(
+            SongRecord(
+                name=title,
+                artist=artist,
+                size=as_int(file_format.get("size", 0)),
+                length_seconds=as_int(file_format.get("duration", 0)),
+                file_name=name,
+                path=state.path,
+                codec=stream.get("codec_name", ""),
+                format=file_format.get("format_name", ""),
+                mtime_ns=state.mtime_ns,
+                inode=state.inode,
+                library_id=library_id,
+                tags=[(key.lower(), value) for key, value in tags.items()],
+            )
+        )
+
+    return rows
+
+
+try:
+    from .fast_normalize import normalize_batch
+except ImportError:
+    normalize_batch = py_normalize_batch
@@ -0,0 +1,349 @@
+"""
+Staged pipeline engine.
+
+A pipeline is a source iterator, a chain of `Stage`s and a sink. Stages are joined by bounded
+queues so a slow stage holds back the ones before it instead of letting work pile up in
+memory. Every stage picks its own executor:
+
+- thread: `workers` threads in this process
+- process: `workers` processes, for CPU bound handlers
+- asyncio: one event loop thread running up to `workers` handlers at once, handlers gate
+  their own work inside an item, eg `importer.Prober` per file through an `AIMDController`
+
+Stage handlers are built per worker by calling `Stage.factory(*Stage.args)` inside that worker,
+so process workers never need to pickle connections or caches. A handler is any callable
+taking one item and returning the item for the next stage, or None to drop it. Optionally:
+
+- `acall(item)` coroutine, used by the asyncio executor instead of running `__call__` in a thread
+- `poll()` returning items finished late (eg retried) and a `pending` count of items still held,
+  the worker keeps polling until `pending` drops to zero and takes no new items while it is at
+  `MAX_HELD`, so held items are bounded like queued ones
+- `close()` called once the worker is done
+"""
+
+import asyncio
+import enum
+import logging
+import multiprocessing as mp
+import queue
+import threading
+import time
+import typing as T
+
+LOG = logging.getLogger(__name__)
+
+STOP = None
+
+DEFAULT_QUEUE_SIZE = 64
+
+# How often workers holding items check on them
+POLL_INTERVAL = 0.05
+
+# Items a worker's handler may hold before the worker stops taking more
+MAX_HELD = 16
+
+
+class Executor(enum.Enum):
+    THREAD = "thread"
+    PROCESS = "process"
+    ASYNCIO = "asyncio"
+
+
+class Stage(T.NamedTuple):
+    name: str
+    factory: T.Callable[..., T.Callable]
+    args: tuple = ()
+    executor: Executor = Executor.THREAD
+    workers: int = 1
+
+
+class StageStats(T.NamedTuple):
+    name: str
+    executor: str
+    workers: int
+    processed: int
+    dropped: int
+    failed: int
+
+
+class Counters:
+    """
+    Shared per stage counters, safe across threads and processes
+    """
+
+    def __init__(self):
+        self.processed = mp.Value("q", 0)
+        self.dropped = mp.Value("q", 0)
+        self.failed = mp.Value("q", 0)
+
+    @staticmethod
+    def bump(value: mp.Value, amount=1):
+        with value.get_lock():
+            value.value += amount
+
+
+def apply(handler, item, counters: Counters):
+    try:
+        result = handler(item)
+    except Exception:
+        LOG.exception("Stage handler failed")
+        Counters.bump(counters.failed)
+        return None
+
+    Counters.bump(counters.processed)
+    if result is None:
+        Counters.bump(counters.dropped)
+    return result
+
+
+def emit(outq, items: T.Iterable):
+    for item in items:
+        if item is not None:
+            outq.put(item)
+
+
+def close(handler):
+    closer = getattr(handler, "close", None)
+    if closer is not None:
+        closer()
+
+
+def sync_worker(stage: Stage, inq, outq, counters: Counters):
+    """
+    Thread and process worker loop
+    """
+    handler = stage.factory(*stage.args)
+    poll = getattr(handler, "poll", None)
+
+    try:
+        while True:
+            held = poll is not None and handler.pending
+            if held >= MAX_HELD:
+                time.sleep(POLL_INTERVAL)
+                emit(outq, poll())
+                continue
+
+            try:
+                item = inq.get(timeout=POLL_INTERVAL) if held else inq.get()
+            except queue.Empty:
+                emit(outq, poll())
+                continue
+
+            if item is STOP:
+                break
+
+            emit(outq, [apply(handler, item, counters)])
+            if poll is not None:
+                emit(outq, poll())
+
+        while poll is not None and handler.pending:
+            time.sleep(POLL_INTERVAL)
+            emit(outq, poll())
+    finally:
+        close(handler)
+
+
+async def async_worker(stage: Stage, inq, outq, counters: Counters):
+    """
+    Event loop hosting up to `stage.workers` concurrent calls of one shared handler
+    """
+    handler = stage.factory(*stage.args)
+    poll = getattr(handler, "poll", None)
+
+    if hasattr(handler, "acall"):
+        call = handler.acall
+    else:
+
+        async def call(item):
+            return await asyncio.to_thread(handler, item)
+
+    local = asyncio.Queue(maxsize=stage.workers)
+
+    async def put(items):
+        for item in items:
+            if item is None:
+                continue
+            try:
+                outq.put_nowait(item)
+            except queue.Full:
+                await asyncio.to_thread(outq.put, item)
+
+    async def reader():
+        while True:
+            while poll is not None and handler.pending >= MAX_HELD:
+                await asyncio.sleep(POLL_INTERVAL)
+                await put(poll())
+
+            if (item := await asyncio.to_thread(inq.get)) is STOP:
+                break
+            await local.put(item)
+        for _ in range(stage.workers):
+            await local.put(STOP)
+
+    async def task():
+        while (item := await local.get()) is not STOP:
+            try:
+                result = await call(item)
+            except Exception:
+                LOG.exception("Stage %s handler failed", stage.name)
+                Counters.bump(counters.failed)
+                continue
+
+            Counters.bump(counters.processed)
+            if result is None:
+                Counters.bump(counters.dropped)
+            await put([result])
+            if poll is not None:
+                await put(poll())
+
+    try:
+        await asyncio.gather(reader(), *(task() for _ in range(stage.workers)))
+        while poll is not None and handler.pending:
+            await asyncio.sleep(POLL_INTERVAL)
+            await put(poll())
+    finally:
+        close(handler)
+
+
+def run_async_worker(stage: Stage, inq, outq, counters: Counters):
+    asyncio.run(async_worker(stage, inq, outq, counters))
+
+
+class Pipeline:
+    """
+    A chain of stages fed from a source and drained into a sink
+    """
+
+    stages: list[Stage]
+    queue_size: int
+
+    def __init__(self, stages: T.Sequence[Stage], queue_size=DEFAULT_QUEUE_SIZE):
+        """
+
+        :param stages:
+        :param queue_size: items buffered between two stages
+        """
+        self.stages = list(stages)
+        self.queue_size = queue_size
+        self.__counters = [Counters() for _ in self.stages]
+
+    def stats(self) -> list[StageStats]:
+        return [
+            StageStats(
+                stage.name,
+                stage.executor.value,
+                stage.workers,
+                counters.processed.value,
+                counters.dropped.value,
+                counters.failed.value,
+            )
+            for stage, counters in zip(self.stages, self.__counters)
+        ]
+
+    def __make_queues(self) -> list:
+        """
+        One queue ahead of every stage plus the sink's, process backed if either side needs it
+        """
+        queues = []
+        for idx in range(len(self.stages) + 1):
+            neighbors = self.stages[max(idx - 1, 0) : idx + 1]
+            if any(stage.executor is Executor.PROCESS for stage in neighbors):
+                queues.append(mp.Queue(maxsize=self.queue_size))
+            else:
+                queues.append(queue.Queue(maxsize=self.queue_size))
+        return queues
+
+    def __start(self, stage: Stage, inq, outq, counters: Counters) -> list:
+        args = (stage, inq, outq, counters)
+        if stage.executor is Executor.PROCESS:
+            workers = [
+                mp.Process(
+                    target=sync_worker,
+                    args=args,
+                    name=f"{stage.name}-{idx}",
+                    daemon=True,
+                )
+                for idx in range(stage.workers)
+            ]
+        elif stage.executor is Executor.THREAD:
+            workers = [
+                threading.Thread(
+                    target=sync_worker,
+                    args=args,
+                    name=f"{stage.name}-{idx}",
+                    daemon=True,
+                )
+                for idx in range(stage.workers)
+            ]
+        else:
+            workers = [
+                threading.Thread(
+                    target=run_async_worker,
+                    args=args,
+                    name=f"{stage.name}-loop",
+                    daemon=True,
+                )
+            ]
+
+        for worker in workers:
+            worker.start()
+        return workers
+
+    @staticmethod
+    def __consumers(stage: Stage) -> int:
+        """
+        STOPs needed to shut a stage down
+        """
+        return 1 if stage.executor is Executor.ASYNCIO else stage.workers
+
+    def run(self, source: T.Iterable, sink: T.Callable[[T.Any], None]):
+        """
+        Push every item of `source` through the stages into `sink`.
+
+        The sink runs in the calling thread, so it can own a database session.
+
+        :param source:
+        :param sink:
+        :return:
+        """
+        queues = self.__make_queues()
+        workers = [
+            self.__start(stage, queues[idx], queues[idx + 1], counters)
+            for idx, (stage, counters) in enumerate(zip(self.stages, self.__counters))
+        ]
+
+        failures = []
+
+        def coordinate():
+            # Feed the source, then shut each stage down once the one before it is done
+            try:
+                for item in source:
+                    queues[0].put(item)
+            except Exception as exc:
+                failures.append(exc)
+            finally:
+                for idx, stage in enumerate(self.stages):
+                    for _ in range(self.__consumers(stage)):
+                        queues[idx].put(STOP)
+                    for worker in workers[idx]:
+                        worker.join()
+                queues[-1].put(STOP)
+
+        coordinator = threading.Thread(
+            target=coordinate, name="pipeline-coordinator", daemon=True
+        )
+        coordinator.start()
+
+        try:
+            while (item := queues[-1].get()) is not STOP:
+                sink(item)
+        except BaseException:
+            for stage_workers in workers:
+                for worker in stage_workers:
+                    if isinstance(worker, mp.Process):
+                        worker.terminate()
+            raise
+
+        coordinator.join()
+        if failures:
+            raise failures[0]
@@ -0,0 +1,120 @@
+"""
+Audio file probing.
+
+`probe`/`aprobe` read metadata in process through `tag_reader` and only pay for an
+ffprobe subprocess when the native reader cannot make sense of a file.
+"""
+
+import asyncio
+import logging
+import pathlib
+import subprocess
+
+import orjson
+
+from . import tag_reader
+
+LOG = logging.getLogger(__name__)
+
+# Seconds before a probe counts as hung, ie on a stalled network mount
+PROBE_TIMEOUT = 30
+
+
+def ffprobe(path: pathlib.Path | str) -> dict:
+    """
+    Run ffprobe against `path` and return its decoded JSON report.
+
+    :param path:
+    :return:
+    :raises subprocess.CalledProcessError: if ffprobe fails
+    :raises subprocess.TimeoutExpired: if ffprobe runs past `PROBE_TIMEOUT`, it is killed
+    """
+    cleaned = str(path).replace("\\", "/")
+    res = subprocess.run(
+        [
+            "ffprobe",
+            "-hide_banner",
+            "-print_format",
+            "json",
+            "-show_format",
+            "-show_streams",
+            cleaned,
+        ],
+        check=True,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        timeout=PROBE_TIMEOUT,
+    )
+    return orjson.loads(res.stdout)
+
+
+async def affprobe(path: pathlib.Path | str) -> dict:
+    """
+    Asyncio flavor of `ffprobe`, cancelling it kills ffprobe
+
+    :param path:
+    :return:
+    :raises subprocess.CalledProcessError: if ffprobe fails
+    """
+    cleaned = str(path).replace("\\", "/")
+    proc = await asyncio.create_subprocess_exec(
+        "ffprobe",
+        "-hide_banner",
+        "-print_format",
+        "json",
+        "-show_format",
+        "-show_streams",
+        cleaned,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.DEVNULL,
+    )
+
+    try:
+        stdout, _ = await proc.communicate()
+    except asyncio.CancelledError:
+        # Timed out by the caller, ie `Prober.aprobe`, a hung ffprobe would outlive it
+        if proc.returncode is None:
+            proc.kill()
+            await proc.wait()
+        raise
+
+    if proc.returncode:
+        raise subprocess.CalledProcessError(proc.returncode, "ffprobe", stdout)
+
+    return orjson.loads(stdout)
+
+
+def probe(path: pathlib.Path | str, container: str | None = None) -> dict:
+    """
+    Read a file's metadata, falling back to ffprobe if the native reader fails.
+
+    :param path:
+    :param container: sniffed container, see `tag_reader.sniff`, containers the native
+        reader cannot parse go straight to ffprobe
+    :return: ffprobe shaped dictionary
+    """
+    if container not in tag_reader.FFPROBE_ONLY:
+        try:
+            return tag_reader.read(path, container)
+        except tag_reader.TagReaderError as exc:
+            LOG.debug("Native read failed, using ffprobe: %s", exc)
+
+    return ffprobe(path)
+
+
+async def aprobe(path: pathlib.Path | str, container: str | None = None) -> dict:
+    """
+    Asyncio flavor of `probe`, the native read is pushed to a thread as mapped IO can
+    block on network mounts.
+
+    :param path:
+    :param container:
+    :return:
+    """
+    if container not in tag_reader.FFPROBE_ONLY:
+        try:
+            return await asyncio.to_thread(tag_reader.read, path, container)
+        except tag_reader.TagReaderError as exc:
+            LOG.debug("Native read failed, using ffprobe: %s", exc)
+
+    return await affprobe(path)
@@ -0,0 +1,258 @@
+"""
+Persistent probe result cache.
+
+Rebuilding the database should not mean probing every unchanged file again. Probe results are
+kept in a sidecar SQLite file keyed on (path, size, mtime_ns) so any edit to a file misses
+the cache, and the file is bounded in size by evicting the least recently used entries.
+
+Each process opens its own `ProbeCache`, the sidecar runs in WAL mode so several importer
+processes can read and write it at once.
+"""
+
+import logging
+import pathlib
+import sqlite3
+import time
+import typing as T
+import zlib
+
+import orjson
+
+from .probe import probe, aprobe
+from .walker import FileState
+
+LOG = logging.getLogger(__name__)
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# Writes (new entries and recency updates) buffered before a commit
+COMMIT_EVERY = 500
+
+# Eviction trims the cache down to this fraction of max_bytes so it doesn't run every put
+EVICT_TO = 0.9
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS probe (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    result BLOB NOT NULL,
+    used INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS probe_used ON probe(used);
+"""
+
+# The parts of a probe result that `normalize.to_record` and the UI care about
+STREAM_KEYS = ("index", "codec_name", "codec_type", "tags", "sample_rate", "channels")
+FORMAT_KEYS = ("size", "duration", "format_name", "tags", "bit_rate")
+
+
+class CacheStats(T.NamedTuple):
+    hits: int
+    misses: int
+    entries: int
+    bytes: int
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+def compact(result: dict) -> dict:
+    """
+    Strip a probe result down to what gets stored, ffprobe reports are mostly noise.
+
+    :param result: `probe`/`ffprobe` output
+    :return:
+    """
+    streams = [
+        {key: stream[key] for key in STREAM_KEYS if key in stream}
+        for stream in result.get("streams", [])
+        if stream.get("codec_type", "audio") == "audio"
+    ]
+    fmt = result.get("format", {})
+    return {
+        "streams": streams,
+        "format": {key: fmt[key] for key in FORMAT_KEYS if key in fmt},
+    }
+
+
+def encode(result: dict) -> bytes:
+    return zlib.compress(orjson.dumps(result), 1)
+
+
+def decode(blob: bytes) -> dict:
+    return orjson.loads(zlib.decompress(blob))
+
+
+class ProbeCache:
+    """
+    Read through cache in front of `probe`/`aprobe`
+    """
+
+    path: pathlib.Path
+    max_bytes: int
+    hits: int
+    misses: int
+
+    def __init__(self, path: pathlib.Path | str, max_bytes: int = DEFAULT_MAX_BYTES):
+        """
+
+        :param path: sidecar SQLite file, created if missing
+        :param max_bytes: upper bound on the stored results
+        """
+        self.path = pathlib.Path(path)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+        self.__conn = sqlite3.connect(self.path, timeout=30)
+        self.__conn.execute("PRAGMA journal_mode=WAL")
+        self.__conn.execute("PRAGMA synchronous=NORMAL")
+        self.__conn.executescript(SCHEMA)
+
+        self.__used: list[tuple[int, str]] = []
+        self.__writes = 0
+        # Running estimate, other processes share the file so eviction re-reads the real size
+        self.__bytes = self.__stored_bytes()
+
+    def __enter__(self) -> T.Self:
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __stored_bytes(self) -> int:
+        return self.__conn.execute(
+            "SELECT COALESCE(SUM(LENGTH(result)), 0) FROM probe"
+        ).fetchone()[0]
+
+    def get(self, state: FileState) -> dict | None:
+        """
+        Look up the result of a file, a file edited since it was cached is a miss.
+
+        :param state:
+        :return: the cached result or None
+        """
+        row = self.__conn.execute(
+            "SELECT result FROM probe WHERE path = ? AND size = ? AND mtime_ns = ?",
+            (state.path, state.size, state.mtime_ns),
+        ).fetchone()
+
+        if row is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.__used.append((time.time_ns(), state.path))
+        self.__wrote()
+        return decode(row[0])
+
+    def put(self, state: FileState, result: dict) -> dict:
+        """
+        Store a result, replacing whatever was cached for the path.
+
+        :param state:
+        :param result: `probe`/`ffprobe` output
+        :return: the compacted result as it will come back from `get`
+        """
+        result = compact(result)
+        blob = encode(result)
+        self.__conn.execute(
+            "INSERT OR REPLACE INTO probe (path, size, mtime_ns, result, used)"
+            " VALUES (?, ?, ?, ?, ?)",
+            (state.path, state.size, state.mtime_ns, blob, time.time_ns()),
+        )
+        self.__bytes += len(blob)
+        self.__wrote()
+
+        if self.__bytes > self.max_bytes:
+            self.evict()
+
+        return result
+
+    def probe(self, state: FileState, container: str | None = None) -> dict:
+        """
+        `probe` a file unless its result is cached, hit or miss the result is compacted
+
+        :param state:
+        :param container: sniffed container passed on to `probe`
+        :return:
+        """
+        result = self.get(state)
+        if result is None:
+            result = self.put(state, probe(state.path, container))
+        return result
+
+    async def aprobe(self, state: FileState, container: str | None = None) -> dict:
+        """
+        `aprobe` a file unless its result is cached
+
+        :param state:
+        :param container:
+        :return:
+        """
+        result = self.get(state)
+        if result is None:
+            result = self.put(state, await aprobe(state.path, container))
+        return result
+
+    def __wrote(self):
+        self.__writes += 1
+        if self.__writes >= COMMIT_EVERY:
+            self.flush()
+
+    def flush(self):
+        """
+        Commit buffered entries and recency updates
+        """
+        if self.__used:
+            self.__conn.executemany(
+                "UPDATE probe SET used = ? WHERE path = ?", self.__used
+            )
+            self.__used.clear()
+        self.__conn.commit()
+        self.__writes = 0
+
+    def evict(self) -> int:
+        """
+        Drop least recently used entries until the cache is back under its bound.
+
+        :return: entries removed
+        """
+        self.flush()
+        stored = self.__stored_bytes()
+        target = int(self.max_bytes * EVICT_TO)
+        if stored <= self.max_bytes:
+            self.__bytes = stored
+            return 0
+
+        freed = 0
+        doomed = []
+        oldest = self.__conn.execute(
+            "SELECT path, LENGTH(result) FROM probe ORDER BY used"
+        )
+        for path, length in oldest:
+            if stored - freed <= target:
+                break
+            doomed.append((path,))
+            freed += length
+        oldest.close()
+
+        self.__conn.executemany("DELETE FROM probe WHERE path = ?", doomed)
+        self.__conn.commit()
+        self.__bytes = stored - freed
+
+        LOG.debug("Evicted %d probe results, %d bytes", len(doomed), freed)
+        return len(doomed)
+
+    def stats(self) -> CacheStats:
+        entries, stored = self.__conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(result)), 0) FROM probe"
+        ).fetchone()
+        return CacheStats(self.hits, self.misses, entries, stored)
+
+    def close(self):
+        self.flush()
+        self.__conn.close()
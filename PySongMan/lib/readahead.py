@@ -0,0 +1,90 @@
+"""
+Page cache hints for reading a library off slow storage.
+
+On a spinning disk or a streaming cloud mount the cost of probing is waiting for each file's
+first blocks to arrive. `willneed` asks the kernel to start fetching the parts of a file the
+sniffer and the tag parsers read, the head and the last few bytes, so a few files ahead of the
+one being read are already on their way when it is done.
+
+`evict` drops files from the page cache again so benchmarks can measure a cold library
+without root. Both are no-ops where `os.posix_fadvise` does not exist (Windows, macOS).
+"""
+
+import logging
+import os
+import pathlib
+import typing as T
+
+from .walker import FileState
+
+LOG = logging.getLogger(__name__)
+
+HAVE_FADVISE = hasattr(os, "posix_fadvise")
+
+# Files prefetched ahead of the one being sniffed
+READAHEAD_FILES = 4
+
+# Covers the tags, cover art included, and the first frames of nearly every file
+HEAD_BYTES = 256 * 1024
+
+# The ID3v1 tag, see `tag_reader.sniff`
+TAIL_BYTES = 128
+
+
+def willneed(states: T.Iterable[FileState]):
+    """
+    Start reading the head and tail of every file in the background
+
+    :param states:
+    """
+    if not HAVE_FADVISE:
+        return
+
+    for state in states:
+        try:
+            handle = os.open(state.path, os.O_RDONLY)
+        except OSError:
+            # The sniffer reports it
+            continue
+
+        try:
+            os.posix_fadvise(handle, 0, HEAD_BYTES, os.POSIX_FADV_WILLNEED)
+            if state.size > HEAD_BYTES:
+                os.posix_fadvise(
+                    handle,
+                    state.size - TAIL_BYTES,
+                    TAIL_BYTES,
+                    os.POSIX_FADV_WILLNEED,
+                )
+        except OSError as exc:
+            LOG.debug("Unable to prefetch %s: %s", state.path, exc)
+        finally:
+            os.close(handle)
+
+
+def evict(paths: T.Iterable[pathlib.Path | str]) -> int:
+    """
+    Drop whatever the page cache holds of the files
+
+    :param paths:
+    :return: files evicted
+    """
+    if not HAVE_FADVISE:
+        return 0
+
+    evicted = 0
+    for path in paths:
+        try:
+            handle = os.open(path, os.O_RDONLY)
+        except OSError:
+            continue
+
+        try:
+            os.posix_fadvise(handle, 0, 0, os.POSIX_FADV_DONTNEED)
+            evicted += 1
+        except OSError as exc:
+            LOG.debug("Unable to evict %s: %s", path, exc)
+        finally:
+            os.close(handle)
+
+    return evicted
@@ -0,0 +1,215 @@
+"""
+Sharded writing, a way around SQLite's single writer.
+
+Instead of funnelling every record to one writer, a "write" stage of several workers each owns
+a throwaway SQLite shard with the full `Base.metadata` schema and writes its records there with
+the usual `BatchWriter`. Once the pipeline is drained `merge` folds the shards into the main
+database one at a time with `ATTACH DATABASE` and `INSERT ... SELECT`, mapping every shard's
+tag ids onto the main database's by (name, value).
+
+Shards are only merged once the whole import is through, so an interrupted sharded import
+leaves the main database untouched.
+"""
+
+import logging
+import os
+import pathlib
+import tempfile
+import time
+
+from sqlalchemy import MetaData, Table, create_engine, delete, event, func, select, true
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from .models import Base, DeadLetter, Song, Song_Tag, Tag, refresh_search
+from .writer import DEFAULT_BATCH, BatchWriter
+
+LOG = logging.getLogger(__name__)
+
+SHARD_GLOB = "shard-*.sqlite3"
+
+# Schema name the shard being merged is attached as
+ATTACHED = "shard"
+
+
+def shard_pragmas(dbapi_connection, _record):
+    # A shard is rebuilt from scratch if anything goes wrong, durability buys nothing
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=OFF")
+    cursor.execute("PRAGMA synchronous=OFF")
+    cursor.close()
+
+
+class ShardWriter:
+    """
+    Write stage handler, every worker writes the song records of its units into its own shard.
+
+    Units leave the stage with only their skipped and failed files, the sink still dead letters
+    those and counts the rest.
+    """
+
+    path: pathlib.Path
+    writer: BatchWriter
+
+    def __init__(self, directory: pathlib.Path | str, batch_size: int = DEFAULT_BATCH):
+        """
+
+        :param directory: where shards are written, `merge` picks them up from there
+        :param batch_size: records per shard transaction
+        """
+        handle, path = tempfile.mkstemp(
+            prefix="shard-", suffix=".sqlite3", dir=directory
+        )
+        os.close(handle)
+        self.path = pathlib.Path(path)
+        self.engine = create_engine(f"sqlite:///{self.path}")
+        event.listen(self.engine, "connect", shard_pragmas)
+        Base.metadata.create_all(self.engine)
+        with self.engine.begin() as connection:
+            # Nothing searches a shard, `merge_shard` indexes the songs it folds in
+            for (name,) in connection.exec_driver_sql(
+                "SELECT name FROM sqlite_master"
+                " WHERE type = 'trigger' AND name LIKE 'song_search_%'"
+            ).all():
+                connection.exec_driver_sql(f"DROP TRIGGER {name}")
+        self.session = Session(self.engine)
+        self.writer = BatchWriter(self.session, batch_size)
+
+    def __call__(self, unit):
+        rest = []
+        for item in unit.items:
+            # Song records are plain dicts, see `writer.SongRecord`
+            if isinstance(item, dict):
+                self.writer.add(item)
+            else:
+                rest.append(item)
+        return unit._replace(items=rest)
+
+    def close(self):
+        self.writer.flush()
+        self.session.close()
+        self.engine.dispose()
+        stats = self.writer.tags.stats()
+        LOG.info(
+            "Shard %s: %d rows, %.1f rows/sec, tag cache %.1f%%",
+            self.path.name,
+            self.writer.rows,
+            self.writer.rate,
+            stats.hit_rate * 100,
+        )
+
+
+def attached(table: Table) -> Table:
+    """
+    `table` as it appears in the attached shard
+    """
+    return table.to_metadata(MetaData(), schema=ATTACHED)
+
+
+def merge_shard(connection: Connection) -> int:
+    """
+    Fold the attached shard into the main database, the caller owns the transaction.
+
+    Songs are upserted on path and their tag links replaced, same as `Song.BulkInsert`, and
+    their search documents rewritten.
+
+    :param connection:
+    :return: songs merged
+    """
+    song, tag = Song.__table__, Tag.__table__
+    shard_song, shard_tag = attached(song), attached(tag)
+    shard_link = attached(Song_Tag)
+
+    tag_columns = [column.name for column in tag.columns if column.name != "id"]
+    connection.execute(
+        sqlite_insert(tag)
+        .from_select(
+            tag_columns,
+            # WHERE keeps SQLite from reading ON CONFLICT as a join constraint
+            select(*(shard_tag.c[name] for name in tag_columns)).where(true()),
+        )
+        .on_conflict_do_nothing(index_elements=["name", "value"])
+    )
+
+    song_columns = [column.name for column in song.columns if column.name != "id"]
+    stmt = sqlite_insert(song).from_select(
+        song_columns,
+        select(*(shard_song.c[name] for name in song_columns)).where(true()),
+    )
+    connection.execute(
+        stmt.on_conflict_do_update(
+            index_elements=["path"],
+            set_={
+                name: stmt.excluded[name]
+                for name in song_columns
+                if name not in ("path", "created_on")
+            }
+            | {"updated_on": func.now()},
+        )
+    )
+
+    merged = select(song.c.id).join(shard_song, shard_song.c.path == song.c.path)
+    connection.execute(delete(Song_Tag).where(Song_Tag.c.song_id.in_(merged)))
+    connection.execute(
+        sqlite_insert(Song_Tag)
+        .from_select(
+            ["song_id", "tag_id"],
+            select(song.c.id, tag.c.id)
+            .select_from(shard_link)
+            .join(shard_song, shard_song.c.id == shard_link.c.song_id)
+            .join(song, song.c.path == shard_song.c.path)
+            .join(shard_tag, shard_tag.c.id == shard_link.c.tag_id)
+            .join(
+                tag,
+                (tag.c.name == shard_tag.c.name) & (tag.c.value == shard_tag.c.value),
+            )
+            .where(true()),
+        )
+        .on_conflict_do_nothing()
+    )
+
+    connection.execute(
+        delete(DeadLetter).where(DeadLetter.path.in_(select(shard_song.c.path)))
+    )
+    refresh_search(connection)
+    return connection.execute(select(func.count()).select_from(shard_song)).scalar_one()
+
+
+def merge(session: Session, directory: pathlib.Path | str) -> int:
+    """
+    Merge and delete every shard in `directory`, each in its own transaction.
+
+    Runs on a connection of its own: ATTACH has to happen outside a transaction and the shard
+    stays attached to that one connection only.
+
+    :param session: main database session, only its engine is used
+    :param directory:
+    :return: songs merged
+    """
+    engine = session.get_bind()
+    rows = 0
+    with engine.connect() as connection:
+        for path in sorted(pathlib.Path(directory).glob(SHARD_GLOB)):
+            start = time.monotonic()
+            connection.exec_driver_sql(f"ATTACH DATABASE ? AS {ATTACHED}", (str(path),))
+            try:
+                merged = merge_shard(connection)
+                connection.commit()
+            except BaseException:
+                connection.rollback()
+                raise
+            finally:
+                connection.exec_driver_sql(f"DETACH DATABASE {ATTACHED}")
+                connection.commit()
+
+            rows += merged
+            path.unlink()
+            LOG.info(
+                "Merged %d rows from %s in %.1fs",
+                merged,
+                path.name,
+                time.monotonic() - start,
+            )
+
+    return rows
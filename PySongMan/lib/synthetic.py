@@ -0,0 +1,381 @@
+"""
+Synthetic music libraries for tests and benchmarks.
+
+The builders produce tiny but structurally valid MP3, Ogg Vorbis/Opus, FLAC and MP4 files,
+small enough that a library of thousands fits in a few megabytes yet complete enough for the
+tag reader and ffprobe alike. `generate_library` lays them out the way a real library looks,
+<root>/<artist>/<album>/## title, with believable and repeating tags, so imports of it exercise
+tag sharing and directory batching like the real thing without needing any music on hand.
+"""
+
+import pathlib
+import random
+import struct
+import typing as T
+
+# MPEG1 layer III, 128kbps, 44.1khz, joint stereo, no padding -> 417 byte frames
+MP3_FRAME_HEADER = b"\xff\xfb\x90\x44"
+MP3_FRAME_SIZE = 417
+
+# Ogg page checksum: CRC-32, polynomial 0x04C11DB7, no reflection, zero initial value
+OGG_CRC_POLY = 0x04C11DB7
+
+
+def _ogg_crc_table() -> list[int]:
+    table = []
+    for idx in range(256):
+        crc = idx << 24
+        for _ in range(8):
+            crc = (crc << 1) ^ OGG_CRC_POLY if crc & 0x80000000 else crc << 1
+        table.append(crc & 0xFFFFFFFF)
+    return table
+
+
+OGG_CRC_TABLE = _ogg_crc_table()
+
+
+def ogg_crc(data: bytes) -> int:
+    crc = 0
+    for byte in data:
+        crc = ((crc << 8) & 0xFFFFFFFF) ^ OGG_CRC_TABLE[(crc >> 24) ^ byte]
+    return crc
+
+
+def id3v2_frame(frame_id: str, payload: bytes) -> bytes:
+    return frame_id.encode() + struct.pack(">IH", len(payload), 0) + payload
+
+
+def id3v2_text(frame_id: str, value: str) -> bytes:
+    return id3v2_frame(frame_id, b"\x03" + value.encode("utf-8"))
+
+
+def syncsafe(value: int) -> bytes:
+    return bytes((value >> shift) & 0x7F for shift in (21, 14, 7, 0))
+
+
+def id3v2_tag(*frames: bytes) -> bytes:
+    body = b"".join(frames)
+    return b"ID3\x03\x00\x00" + syncsafe(len(body)) + body
+
+
+def id3v1_tag(title="", artist="", album="", year="", track=0, genre=255) -> bytes:
+    def field(value, size):
+        return value.encode("latin-1", "replace")[:size].ljust(size, b"\x00")
+
+    return (
+        b"TAG"
+        + field(title, 30)
+        + field(artist, 30)
+        + field(album, 30)
+        + field(year, 4)
+        + field("", 28)
+        + bytes((0, track, genre))
+    )
+
+
+def mp3_file(frames=100, id3v2=b"", id3v1=b"") -> bytes:
+    frame = MP3_FRAME_HEADER + bytes(MP3_FRAME_SIZE - 4)
+    return id3v2 + frame * frames + id3v1
+
+
+def ogg_page(packets: list[bytes], serial=1, sequence=0, granule=0, flags=0) -> bytes:
+    lacing = bytearray()
+    for packet in packets:
+        lacing += b"\xff" * (len(packet) // 255) + bytes((len(packet) % 255,))
+    header = b"OggS" + struct.pack(
+        "<BBqIIIB", 0, flags, granule, serial, sequence, 0, len(lacing)
+    )
+    page = header + bytes(lacing) + b"".join(packets)
+    # The checksum covers the whole page with its own field zeroed
+    return page[:22] + struct.pack("<I", ogg_crc(page)) + page[26:]
+
+
+def vorbis_comment(tags: dict[str, str], vendor="test vendor") -> bytes:
+    entries = [f"{key}={value}".encode() for key, value in tags.items()]
+    return (
+        struct.pack("<I", len(vendor))
+        + vendor.encode()
+        + struct.pack("<I", len(entries))
+        + b"".join(struct.pack("<I", len(entry)) + entry for entry in entries)
+    )
+
+
+def ogg_vorbis_file(
+    tags: dict[str, str], seconds=3, rate=44100, vendor="test vendor"
+) -> bytes:
+    ident = b"\x01vorbis" + struct.pack("<IBIiiiBB", 0, 2, rate, 0, 128000, 0, 0xB8, 1)
+    comment = b"\x03vorbis" + vorbis_comment(tags, vendor) + b"\x01"
+    setup = b"\x05vorbis" + bytes(32)
+    # Laid out like libvorbis: the comment and setup headers share the second page
+    return (
+        ogg_page([ident], flags=0x02)
+        + ogg_page([comment, setup], sequence=1)
+        + ogg_page([bytes(64)], sequence=2, granule=seconds * rate, flags=0x04)
+    )
+
+
+def ogg_opus_file(tags: dict[str, str], seconds=3, vendor="test vendor") -> bytes:
+    head = b"OpusHead" + struct.pack("<BBHIhB", 1, 2, 312, 48000, 0, 0)
+    comment = b"OpusTags" + vorbis_comment(tags, vendor)
+    return (
+        ogg_page([head], flags=0x02)
+        + ogg_page([comment], sequence=1)
+        # Opus granules always count 48khz samples, pre-skip included
+        + ogg_page([bytes(64)], sequence=2, granule=seconds * 48000 + 312, flags=0x04)
+    )
+
+
+def flac_file(
+    tags: dict[str, str], seconds=3, rate=44100, vendor="test vendor"
+) -> bytes:
+    # min/max block size, min/max frame size, then rate, channels, bits and sample count
+    packed = rate << 44 | (2 - 1) << 41 | (16 - 1) << 36 | seconds * rate
+    streaminfo = struct.pack(">HH", 4096, 4096) + bytes(6) + packed.to_bytes(8, "big")
+    streaminfo += bytes(16)  # md5 of the decoded audio
+    comment = vorbis_comment(tags, vendor)
+
+    def block(kind, body, last=False):
+        return (
+            bytes((kind | (0x80 if last else 0),)) + len(body).to_bytes(3, "big") + body
+        )
+
+    return b"fLaC" + block(0, streaminfo) + block(4, comment, last=True) + bytes(64)
+
+
+def atom(kind: bytes, *children: bytes) -> bytes:
+    body = b"".join(children)
+    return struct.pack(">I", len(body) + 8) + kind + body
+
+
+def mp4_text(kind: bytes, value: str) -> bytes:
+    return atom(kind, atom(b"data", struct.pack(">II", 1, 0), value.encode()))
+
+
+def mp4_file(tags: dict[bytes, str], seconds=3, timescale=1000, track=None) -> bytes:
+    mvhd = atom(b"mvhd", struct.pack(">IIIII", 0, 0, 0, timescale, seconds * timescale))
+    hdlr = atom(b"hdlr", struct.pack(">II4s", 0, 0, b"soun"), bytes(12))
+    sample_entry = atom(
+        b"mp4a",
+        bytes(6),
+        struct.pack(">HHHIHHHHI", 1, 0, 0, 0, 2, 16, 0, 0, 44100 << 16),
+    )
+    stsd = atom(b"stsd", struct.pack(">II", 0, 1), sample_entry)
+    trak = atom(b"trak", atom(b"mdia", hdlr, atom(b"minf", atom(b"stbl", stsd))))
+
+    items = [mp4_text(kind, value) for kind, value in tags.items()]
+    if track is not None:
+        items.append(
+            atom(
+                b"trkn",
+                atom(
+                    b"data",
+                    struct.pack(">II", 0, 0),
+                    struct.pack(">HHHH", 0, *track, 0),
+                ),
+            )
+        )
+    meta = atom(
+        b"meta",
+        bytes(4),
+        atom(b"hdlr", struct.pack(">II4s", 0, 0, b"mdir"), bytes(12)),
+        atom(b"ilst", *items),
+    )
+
+    return (
+        atom(b"ftyp", b"M4A ", struct.pack(">I", 0), b"M4A isom")
+        + atom(b"moov", mvhd, trak, atom(b"udta", meta))
+        + atom(b"mdat", bytes(128))
+    )
+
+
+# Library generation
+
+ADJECTIVES = [
+    "Electric", "Silent", "Golden", "Broken", "Midnight", "Crimson", "Wandering", "Hollow",
+    "Velvet", "Northern", "Paper", "Burning", "Lonely", "Neon", "Wild", "Distant",
+]  # fmt: skip
+NOUNS = [
+    "Harbor", "Engines", "Foxes", "Lanterns", "Rivers", "Satellites", "Orchard", "Wolves",
+    "Static", "Horizon", "Cathedral", "Machines", "Tides", "Echoes", "Ghosts", "Atlas",
+]  # fmt: skip
+WORDS = [
+    "love", "night", "road", "fire", "light", "home", "rain", "dream", "heart", "city",
+    "summer", "gold", "shadow", "water", "stars", "time", "ocean", "dust", "glass", "wire",
+]  # fmt: skip
+GENRES = ["Rock", "Jazz", "Pop", "Metal", "Ambient", "Classical", "Hip-Hop", "Folk"]
+ENCODERS = {
+    "mp3": ["LAME3.100", "LAME3.99r", "Lavf58.76.100"],
+    "ogg": ["Xiph.Org libVorbis I 20200704", "Lavf60.3.100"],
+    "opus": ["libopus 1.4", "Lavf60.3.100"],
+    "flac": ["reference libFLAC 1.4.3 20230623", "reference libFLAC 1.3.2 20170101"],
+    "mp4": ["iTunes 12.9.0.167", "Lavf58.76.100", "qaac 2.72"],
+    "m4a": ["iTunes 12.9.0.167", "qaac 2.72"],
+}
+
+SUFFIX = {
+    "mp3": ".mp3",
+    "ogg": ".ogg",
+    "opus": ".opus",
+    "flac": ".flac",
+    "mp4": ".mp4",
+    "m4a": ".m4a",
+}
+
+# Shares of each format in a generated library
+DEFAULT_MIX = {"mp3": 6, "ogg": 2, "mp4": 2}
+
+
+class Track(T.NamedTuple):
+    artist: str
+    album: str
+    title: str
+    genre: str
+    year: int
+    number: int
+    total: int
+    encoder: str
+    seconds: int
+
+
+def parse_mix(spec: str) -> dict[str, int]:
+    """
+    Parse a format mix as used on the command line
+
+    :param spec: eg "mp3=6,ogg=2,mp4=2", a bare format counts once
+    :return:
+    """
+    mix = {}
+    for part in spec.split(","):
+        kind, _, share = part.strip().partition("=")
+        if kind not in SUFFIX:
+            raise ValueError(f"Unknown format {kind!r}, expected one of {list(SUFFIX)}")
+        mix[kind] = int(share or 1)
+    return mix
+
+
+def render(kind: str, track: Track) -> bytes:
+    """
+    Build one file of format `kind` tagged with `track`
+    """
+    if kind == "mp3":
+        tag = id3v2_tag(
+            id3v2_text("TIT2", track.title),
+            id3v2_text("TPE1", track.artist),
+            id3v2_text("TALB", track.album),
+            id3v2_text("TCON", track.genre),
+            id3v2_text("TRCK", f"{track.number}/{track.total}"),
+            id3v2_text("TYER", str(track.year)),
+            id3v2_text("TSSE", track.encoder),
+        )
+        legacy = id3v1_tag(
+            track.title, track.artist, track.album, str(track.year), track.number
+        )
+        # ~26ms a frame, a second of audio keeps files tiny but seekable
+        return mp3_file(frames=38, id3v2=tag, id3v1=legacy)
+
+    if kind in ("ogg", "opus", "flac"):
+        comments = {
+            "TITLE": track.title,
+            "ARTIST": track.artist,
+            "ALBUM": track.album,
+            "GENRE": track.genre,
+            "TRACKNUMBER": str(track.number),
+            "TRACKTOTAL": str(track.total),
+            "DATE": str(track.year),
+        }
+        builder = {"ogg": ogg_vorbis_file, "opus": ogg_opus_file, "flac": flac_file}
+        return builder[kind](comments, seconds=track.seconds, vendor=track.encoder)
+
+    return mp4_file(
+        {
+            b"\xa9nam": track.title,
+            b"\xa9ART": track.artist,
+            b"\xa9alb": track.album,
+            b"\xa9gen": track.genre,
+            b"\xa9day": str(track.year),
+            b"\xa9too": track.encoder,
+        },
+        seconds=track.seconds,
+        track=(track.number, track.total),
+    )
+
+
+def generate_library(
+    root: pathlib.Path | str,
+    files: int = 1000,
+    depth: int = 2,
+    mix: dict[str, int] = None,
+    seed: int = 7,
+) -> list[pathlib.Path]:
+    """
+    Write a synthetic library of `files` songs under `root`.
+
+    Every album is a single format, picked by `mix`, so the format shares hold over libraries
+    of more than a few dozen albums. The same `seed` always writes the same library.
+
+    :param root:
+    :param files: number of songs
+    :param depth: directory levels below `root`, 2 is <artist>/<album>, 1 flattens albums into
+        their artist's directory, 0 puts everything in `root` and anything deeper nests the
+        artists in "Shelf ##" directories
+    :param mix: format to its share of albums, see `DEFAULT_MIX`
+    :param seed:
+    :return: the paths written
+    """
+    root = pathlib.Path(root)
+    rng = random.Random(seed)
+    mix = DEFAULT_MIX if mix is None else mix
+    kinds, weights = list(mix), list(mix.values())
+
+    written = []
+    artists: list[tuple[str, str, list[str]]] = []
+    albums: set[tuple[str, str]] = set()
+
+    while len(written) < files:
+        # Artists come back for more albums, as they tend to
+        if not artists or rng.random() < 0.3:
+            artist = f"The {rng.choice(ADJECTIVES)} {rng.choice(NOUNS)}"
+            shelves = [f"Shelf {rng.randrange(10):02d}" for _ in range(depth - 2)]
+            artists.append((artist, rng.choice(GENRES), shelves))
+        artist, genre, shelves = rng.choice(artists)
+
+        kind = rng.choices(kinds, weights)[0]
+        album = f"{rng.choice(ADJECTIVES)} {rng.choice(WORDS).title()}"
+        if (artist, album) in albums:
+            album = f"{album} Vol. {len(albums)}"
+        albums.add((artist, album))
+        year = rng.randint(1965, 2024)
+        total = min(rng.randint(8, 14), files - len(written))
+        encoder = rng.choice(ENCODERS[kind])
+
+        if depth >= 2:
+            directory = root.joinpath(*shelves, artist, album)
+            prefix = ""
+        elif depth == 1:
+            directory = root / artist
+            prefix = f"{album} - "
+        else:
+            directory = root
+            prefix = f"{artist} - {album} - "
+        directory.mkdir(parents=True, exist_ok=True)
+
+        for number in range(1, total + 1):
+            title = " ".join(
+                rng.choice(WORDS) for _ in range(rng.randint(1, 4))
+            ).capitalize()
+            track = Track(
+                artist,
+                album,
+                title,
+                genre,
+                year,
+                number,
+                total,
+                encoder,
+                rng.randint(90, 420),
+            )
+            path = directory / f"{prefix}{number:02d} {title}{SUFFIX[kind]}"
+            path.write_bytes(render(kind, track))
+            written.append(path)
+
+    return written
@@ -0,0 +1,167 @@
+"""
+Tag interning for the writer.
+
+A library repeats a handful of (name, value) pairs endlessly, genre=Rock, encoder=LAME3.100,
+the same artist and album on every track. `TagCache` keeps the ids of recently seen pairs in a
+bounded LRU so `Tag.BulkIds` only asks SQLite about pairs it has not met lately, which past the
+first few albums of an import is very few of them.
+
+Ids are only cached once the writer has them, and tags are never deleted, so a cached id
+stays valid for as long as the import that cached it.
+
+The cache is bounded in bytes as well as pairs: it lives in the writer for the whole import,
+which has to run in bounded memory, and a single lyrics or comment tag can run to kilobytes.
+"""
+
+import collections
+import logging
+import sys
+import typing as T
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from .models import Tag
+
+LOG = logging.getLogger(__name__)
+
+DEFAULT_CAPACITY = 100_000
+
+# About 4k pairs of typical titles and artists, a few batches' worth; the albums, artists and
+# genres that make up the hits are refreshed on every batch and stay resident
+DEFAULT_MAX_BYTES = 1024 * 1024
+
+# Bytes a cached pair costs besides its two strings: the key tuple, the id and the
+# OrderedDict's node, measured with tracemalloc
+ENTRY_OVERHEAD = 150
+
+Pair = tuple[str, str]
+
+
+def entry_size(pair: Pair) -> int:
+    return sys.getsizeof(pair[0]) + sys.getsizeof(pair[1]) + ENTRY_OVERHEAD
+
+
+class TagCacheStats(T.NamedTuple):
+    hits: int
+    misses: int
+    entries: int
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class TagCache:
+    """
+    Bounded least recently used map of (name, value) to tag id
+    """
+
+    capacity: int
+    max_bytes: int
+    size: int
+    hits: int
+    misses: int
+
+    def __init__(
+        self, capacity: int = DEFAULT_CAPACITY, max_bytes: int = DEFAULT_MAX_BYTES
+    ):
+        """
+
+        :param capacity: pairs kept, the least recently used go first
+        :param max_bytes: approximate memory the pairs may take, see `entry_size`
+        """
+        self.capacity = capacity
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.__ids: collections.OrderedDict[Pair, int] = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self.__ids)
+
+    @classmethod
+    def Preload(
+        cls,
+        session: Session,
+        capacity: int = DEFAULT_CAPACITY,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+    ) -> T.Self:
+        """
+        Start warm with the library's oldest tags, the genres, encoders and such that its first
+        albums introduced and every album after has reused.
+
+        Tags are read oldest first until the budget is full, then cached newest first so the
+        oldest are the most recently used and the last to be evicted.
+
+        :param session:
+        :param capacity:
+        :param max_bytes:
+        :return:
+        """
+        cache = cls(capacity, max_bytes)
+        stmt = (
+            select(Tag.id, Tag.name, Tag.value)
+            .order_by(Tag.id)
+            .limit(capacity)
+            .execution_options(yield_per=1000)
+        )
+
+        oldest = []
+        size = 0
+        result = session.execute(stmt)
+        try:
+            for tag_id, name, value in result:
+                size += entry_size((name, value))
+                if size > max_bytes:
+                    break
+                oldest.append(((name, value), tag_id))
+        finally:
+            result.close()
+
+        cache.update(dict(reversed(oldest)))
+        LOG.debug("Preloaded %d tags", len(cache))
+        return cache
+
+    def lookup(self, pairs: T.Iterable[Pair]) -> tuple[dict[Pair, int], list[Pair]]:
+        """
+        Split pairs into the ones with a cached id and the ones SQLite has to resolve.
+
+        :param pairs: distinct pairs
+        :return: (pair to id for hits, misses)
+        """
+        found = {}
+        missing = []
+        for pair in pairs:
+            tag_id = self.__ids.get(pair)
+            if tag_id is None:
+                missing.append(pair)
+            else:
+                self.__ids.move_to_end(pair)
+                found[pair] = tag_id
+
+        self.hits += len(found)
+        self.misses += len(missing)
+        return found, missing
+
+    def update(self, ids: dict[Pair, int]):
+        """
+        Cache ids resolved by SQLite, evicting the least recently used past `capacity` or
+        `max_bytes`
+        """
+        for pair, tag_id in ids.items():
+            if pair in self.__ids:
+                self.__ids.move_to_end(pair)
+            else:
+                self.size += entry_size(pair)
+            self.__ids[pair] = tag_id
+        while self.__ids and (
+            len(self.__ids) > self.capacity or self.size > self.max_bytes
+        ):
+            pair, _ = self.__ids.popitem(last=False)
+            self.size -= entry_size(pair)
+
+    def stats(self) -> TagCacheStats:
+        return TagCacheStats(self.hits, self.misses, len(self.__ids))
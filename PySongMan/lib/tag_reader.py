@@ -0,0 +1,964 @@
+"""
+In-process audio metadata reader.
+
+Memory maps a file and pulls tags, duration and codec straight out of ID3v2/ID3v1 (mp3),
+Vorbis comments (ogg/vorbis, ogg/opus, flac) and MP4 `moov/udta` atoms.
+
+`sniff` tells containers apart from the first few KB of a file, cheap enough to run on every
+file before deciding whether it is worth parsing at all.
+
+The returned dictionary mirrors the JSON produced by
+`ffprobe -print_format json -show_format -show_streams` closely enough that the
+`key_try`/`try_artist`/`try_title` helpers can consume either one.
+"""
+
+import mmap
+import pathlib
+import struct
+import zlib
+
+MP4_FORMAT_NAME = "mov,mp4,m4a,3gp,3g2,mj2"
+
+
+class TagReaderError(ValueError):
+    """
+    The file could not be parsed in process, callers should fall back to ffprobe.
+    """
+
+
+# Bytes read from the head of a file to identify it
+SNIFF_BYTES = 4096
+
+# Containers `read` parses in process
+NATIVE = frozenset(("mp3", "ogg", "flac", "mp4"))
+
+# Audio containers only ffprobe understands
+FFPROBE_ONLY = frozenset(("wav", "aiff", "asf", "aac"))
+
+AUDIO = NATIVE | FFPROBE_ONLY
+
+# Leading bytes of files that turn up in music folders but are not audio
+NOT_AUDIO = (
+    (b"\xff\xd8\xff", "jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"GIF8", "gif"),
+    (b"BM", "bmp"),
+    (b"%PDF", "pdf"),
+    (b"PK\x03\x04", "zip"),
+    (b"Rar!", "rar"),
+    (b"7z\xbc\xaf", "7z"),
+    (b"\x1f\x8b", "gzip"),
+    (b"<", "markup"),
+    (b"\xef\xbb\xbf", "text"),
+)
+
+ASF_GUID = b"\x30\x26\xb2\x75\x8e\x66\xcf\x11"
+
+MP4_LEADING_ATOMS = (b"ftyp", b"moov", b"mdat", b"free", b"skip", b"wide")
+
+
+def detect(head: bytes, tail: bytes = b"") -> str | None:
+    """
+    Identify a container from the first `SNIFF_BYTES` of a file.
+
+    :param head: start of the file
+    :param tail: optional last 128 bytes, catches mp3s that only carry an ID3v1 tag
+    :return: a member of `AUDIO`, the name of a known non audio format or None if unknown
+    """
+    offset = 0
+    if head[:3] == b"ID3" and len(head) >= 10:
+        # Some taggers put ID3v2 in front of flac and raw aac too
+        flags = head[5]
+        offset = 10 + _syncsafe(head[6:10]) + (10 if flags & 0x10 else 0)
+        if offset + 4 > len(head):
+            return "mp3"
+
+    start = head[offset : offset + 12]
+
+    if start[:4] == b"OggS":
+        return "ogg"
+    if start[:4] == b"fLaC":
+        return "flac"
+    if start[4:8] in MP4_LEADING_ATOMS:
+        return "mp4"
+    if start[:4] == b"RIFF" and start[8:12] == b"WAVE":
+        return "wav"
+    if start[:4] == b"FORM" and start[8:12] in (b"AIFF", b"AIFC"):
+        return "aiff"
+    if start[:8] == ASF_GUID:
+        return "asf"
+    if len(start) >= 2 and start[0] == 0xFF and start[1] & 0xF6 == 0xF0:
+        return "aac"
+    if offset or _mpeg_header(start, 0) is not None:
+        return "mp3"
+    if tail[:3] == b"TAG":
+        return "mp3"
+
+    for magic, name in NOT_AUDIO:
+        if start.startswith(magic):
+            return name
+
+    return None
+
+
+def sniff(path: pathlib.Path | str) -> str | None:
+    """
+    Identify a file's container without reading more than a few KB of it.
+
+    :param path:
+    :return: see `detect`
+    :raises OSError: if the file cannot be read
+    """
+    with open(path, "rb") as handle:
+        head = handle.read(SNIFF_BYTES)
+        tail = b""
+        if len(head) == SNIFF_BYTES:
+            handle.seek(-128, 2)
+            tail = handle.read(128)
+    return detect(head, tail)
+
+
+def read(path: pathlib.Path | str, container: str | None = None) -> dict:
+    """
+    Read the metadata of an audio file without spawning a subprocess.
+
+    :param path: Path to the audio file
+    :param container: already sniffed container, skips detecting it again
+    :return: ffprobe shaped dictionary with `format` and `streams` keys
+    :raises TagReaderError: if the container is unknown or malformed
+    """
+    path = pathlib.Path(path)
+
+    with path.open("rb") as handle:
+        try:
+            buffer = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, OSError) as exc:
+            raise TagReaderError(f"Unable to map {path}: {exc}") from exc
+
+        with buffer:
+            try:
+                return parse(buffer, path, container)
+            except (struct.error, IndexError, KeyError, ValueError, zlib.error) as exc:
+                raise TagReaderError(f"Malformed metadata in {path}: {exc}") from exc
+
+
+def parse(
+    buffer: bytes | mmap.mmap, path: pathlib.Path, container: str | None = None
+) -> dict:
+    """
+    Route an in memory/mapped buffer to the matching container parser.
+
+    :param buffer:
+    :param path: Only used to populate `format.filename`
+    :param container: sniffed container, detected from `buffer` when None
+    :return:
+    """
+    if container is None:
+        container = detect(buffer[:SNIFF_BYTES], buffer[-128:])
+
+    parser = PARSERS.get(container)
+    if parser is None:
+        raise TagReaderError(f"Unrecognized container {container} for {path}")
+
+    return parser(buffer, path)
+
+
+def build_result(
+    path: pathlib.Path,
+    size: int,
+    format_name: str,
+    codec_name: str,
+    duration: float,
+    tags: dict[str, str],
+    sample_rate: int | None = None,
+    channels: int | None = None,
+    bit_rate: int | None = None,
+) -> dict:
+    """
+    Assemble a ffprobe shaped result.
+
+    Tags are published on both the format and first stream as ffprobe is inconsistent
+    about where they end up depending on the container.
+    """
+    stream = {
+        "index": 0,
+        "codec_name": codec_name,
+        "codec_type": "audio",
+        "tags": dict(tags),
+    }
+    if sample_rate:
+        stream["sample_rate"] = str(sample_rate)
+    if channels:
+        stream["channels"] = channels
+
+    file_format = {
+        "filename": str(path),
+        "nb_streams": 1,
+        "format_name": format_name,
+        "duration": f"{duration:.6f}",
+        "size": str(size),
+        "tags": dict(tags),
+    }
+    if bit_rate:
+        file_format["bit_rate"] = str(int(bit_rate))
+
+    return {"streams": [stream], "format": file_format}
+
+
+#
+# ID3 / MPEG audio
+#
+
+ID3V1_GENRES = (
+    "Blues", "Classic Rock", "Country", "Dance", "Disco", "Funk", "Grunge", "Hip-Hop",
+    "Jazz", "Metal", "New Age", "Oldies", "Other", "Pop", "R&B", "Rap", "Reggae", "Rock",
+    "Techno", "Industrial", "Alternative", "Ska", "Death Metal", "Pranks", "Soundtrack",
+    "Euro-Techno", "Ambient", "Trip-Hop", "Vocal", "Jazz+Funk", "Fusion", "Trance",
+    "Classical", "Instrumental", "Acid", "House", "Game", "Sound Clip", "Gospel", "Noise",
+    "AlternRock", "Bass", "Soul", "Punk", "Space", "Meditative", "Instrumental Pop",
+    "Instrumental Rock", "Ethnic", "Gothic", "Darkwave", "Techno-Industrial", "Electronic",
+    "Pop-Folk", "Eurodance", "Dream", "Southern Rock", "Comedy", "Cult", "Gangsta", "Top 40",
+    "Christian Rap", "Pop/Funk", "Jungle", "Native American", "Cabaret", "New Wave",
+    "Psychadelic", "Rave", "Showtunes", "Trailer", "Lo-Fi", "Tribal", "Acid Punk",
+    "Acid Jazz", "Polka", "Retro", "Musical", "Rock & Roll", "Hard Rock",
+)  # fmt: skip
+
+ID3_FRAME_NAMES = {
+    "TIT2": "title",
+    "TPE1": "artist",
+    "TPE2": "album_artist",
+    "TALB": "album",
+    "TCON": "genre",
+    "TRCK": "track",
+    "TPOS": "disc",
+    "TDRC": "date",
+    "TYER": "date",
+    "TCOM": "composer",
+    "TSSE": "encoder",
+    "TENC": "encoded_by",
+    "TCOP": "copyright",
+    "TPUB": "publisher",
+    "TLAN": "language",
+    "TIT1": "grouping",
+    "TIT3": "TIT3",
+    "TT2": "title",
+    "TP1": "artist",
+    "TP2": "album_artist",
+    "TAL": "album",
+    "TCO": "genre",
+    "TRK": "track",
+    "TPA": "disc",
+    "TYE": "date",
+    "TCM": "composer",
+    "TSS": "encoder",
+    "TEN": "encoded_by",
+    "TCR": "copyright",
+    "TPB": "publisher",
+}
+
+TEXT_ENCODINGS = {0: "latin-1", 1: "utf-16", 2: "utf-16-be", 3: "utf-8"}
+
+MPEG_BITRATES = {
+    (3, 3): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (3, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (3, 1): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (2, 3): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (2, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (2, 1): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+
+MPEG_SAMPLE_RATES = {
+    3: (44100, 48000, 32000),
+    2: (22050, 24000, 16000),
+    0: (11025, 12000, 8000),
+}
+
+MPEG_CODECS = {3: "mp1", 2: "mp2", 1: "mp3"}
+
+# How far past the ID3 tag to hunt for the first audio frame
+MPEG_SYNC_WINDOW = 64 * 1024
+
+
+def _syncsafe(data: bytes) -> int:
+    return (data[0] << 21) | (data[1] << 14) | (data[2] << 7) | data[3]
+
+
+def _split_terminated(encoding: int, data: bytes) -> tuple[bytes, bytes]:
+    """
+    Split a null terminated string off the front of `data` honoring 2 byte UTF-16 terminators.
+    """
+    if encoding in (1, 2):
+        idx = 0
+        while True:
+            idx = data.find(b"\x00\x00", idx)
+            if idx == -1:
+                return data, b""
+            if idx % 2 == 0:
+                return data[:idx], data[idx + 2 :]
+            idx += 1
+
+    head, _, tail = data.partition(b"\x00")
+    return head, tail
+
+
+def _decode_text(encoding: int, data: bytes) -> str:
+    text = data.decode(TEXT_ENCODINGS.get(encoding, "latin-1"), errors="replace")
+    values = [value.strip("﻿") for value in text.split("\x00")]
+    return ";".join(value for value in values if value)
+
+
+def _genre_name(value: str) -> str:
+    """
+    Resolve `(17)`, `17` and `(17)Rock` style ID3 genre references to their names.
+    """
+    reference = value
+    if reference.startswith("(") and ")" in reference:
+        reference, _, remainder = reference[1:].partition(")")
+        if remainder:
+            return remainder
+
+    if reference.isdigit() and int(reference) < len(ID3V1_GENRES):
+        return ID3V1_GENRES[int(reference)]
+
+    return value
+
+
+def _read_id3v2_frames(body: bytes, major: int) -> dict[str, str]:
+    tags: dict[str, str] = {}
+    id_size, header_size = (3, 6) if major == 2 else (4, 10)
+    offset = 0
+
+    while offset + header_size <= len(body):
+        frame_id = body[offset : offset + id_size]
+        if not frame_id.strip(b"\x00") or not frame_id.isalnum():
+            break
+
+        if major == 2:
+            size = int.from_bytes(body[offset + 3 : offset + 6], "big")
+            flags = 0
+        elif major == 3:
+            size = struct.unpack_from(">I", body, offset + 4)[0]
+            flags = struct.unpack_from(">H", body, offset + 8)[0]
+        else:
+            size = _syncsafe(body[offset + 4 : offset + 8])
+            flags = struct.unpack_from(">H", body, offset + 8)[0]
+
+        payload = body[offset + header_size : offset + header_size + size]
+        offset += header_size + size
+
+        if major == 3:
+            if flags & 0x0040:
+                continue  # encrypted
+            if flags & 0x0020:
+                payload = payload[1:]
+            if flags & 0x0080:
+                payload = zlib.decompress(payload[4:])
+        elif major == 4:
+            if flags & 0x0004:
+                continue  # encrypted
+            if flags & 0x0040:
+                payload = payload[1:]
+            if flags & 0x0001:
+                payload = payload[4:]
+            if flags & 0x0002:
+                payload = payload.replace(b"\xff\x00", b"\xff")
+            if flags & 0x0008:
+                payload = zlib.decompress(payload)
+
+        if not payload:
+            continue
+
+        name = frame_id.decode("latin-1")
+        encoding = payload[0]
+
+        if name in ("TXXX", "TXX"):
+            description, value = _split_terminated(encoding, payload[1:])
+            key = _decode_text(encoding, description) or name
+            tags[key] = _decode_text(encoding, value)
+        elif name in ("COMM", "COM"):
+            _, text = _split_terminated(encoding, payload[4:])
+            tags.setdefault("comment", _decode_text(encoding, text))
+        elif name[0] == "T":
+            value = _decode_text(encoding, payload[1:])
+            key = ID3_FRAME_NAMES.get(name, name)
+            if key == "genre":
+                value = _genre_name(value)
+            tags.setdefault(key, value)
+
+    return tags
+
+
+def read_id3v2(buffer: bytes | mmap.mmap) -> tuple[dict[str, str], int]:
+    """
+    Parse a leading ID3v2 tag.
+
+    :param buffer:
+    :return: The tags found and the offset of the first byte after the tag
+    """
+    if buffer[:3] != b"ID3":
+        return {}, 0
+
+    major, flags = buffer[3], buffer[5]
+    size = _syncsafe(buffer[6:10])
+    end = 10 + size + (10 if flags & 0x10 else 0)
+
+    if major not in (2, 3, 4):
+        return {}, end
+
+    body = buffer[10 : 10 + size]
+    if flags & 0x80 and major < 4:
+        body = body.replace(b"\xff\x00", b"\xff")
+
+    if flags & 0x40 and major == 3:
+        body = body[4 + struct.unpack_from(">I", body, 0)[0] :]
+    elif flags & 0x40 and major == 4:
+        body = body[_syncsafe(body[:4]) :]
+
+    return _read_id3v2_frames(body, major), end
+
+
+def read_id3v1(buffer: bytes | mmap.mmap) -> dict[str, str]:
+    """
+    Parse the trailing 128 byte ID3v1(.1) tag if there is one.
+    """
+    if len(buffer) < 128 or buffer[-128:-125] != b"TAG":
+        return {}
+
+    block = buffer[-128:]
+
+    def text(start, end):
+        return block[start:end].split(b"\x00")[0].decode("latin-1").strip()
+
+    tags = {
+        "title": text(3, 33),
+        "artist": text(33, 63),
+        "album": text(63, 93),
+        "date": text(93, 97),
+        "comment": text(97, 127),
+    }
+    if block[125] == 0 and block[126] != 0:
+        tags["track"] = str(block[126])
+    if block[127] < len(ID3V1_GENRES):
+        tags["genre"] = ID3V1_GENRES[block[127]]
+
+    return {key: value for key, value in tags.items() if value}
+
+
+def _mpeg_header(buffer, offset) -> tuple | None:
+    """
+    Decode a 4 byte MPEG audio frame header.
+
+    :return: (version, layer, bitrate kbps, sample rate, padding, channel mode) or None
+    """
+    if offset + 4 > len(buffer) or not _is_mpeg_sync(buffer, offset):
+        return None
+
+    b1, b2, b3 = buffer[offset + 1], buffer[offset + 2], buffer[offset + 3]
+    version = (b1 >> 3) & 0x03
+    layer = (b1 >> 1) & 0x03
+    bitrate_idx = b2 >> 4
+    rate_idx = (b2 >> 2) & 0x03
+
+    if version == 1 or layer == 0 or bitrate_idx in (0, 15) or rate_idx == 3:
+        return None
+
+    bitrate = MPEG_BITRATES[(3 if version == 3 else 2, layer)][bitrate_idx]
+    sample_rate = MPEG_SAMPLE_RATES[version][rate_idx]
+
+    return version, layer, bitrate, sample_rate, (b2 >> 1) & 0x01, b3 >> 6
+
+
+def _is_mpeg_sync(buffer, offset) -> bool:
+    return (
+        offset + 1 < len(buffer)
+        and buffer[offset] == 0xFF
+        and buffer[offset + 1] & 0xE0 == 0xE0
+    )
+
+
+def _mpeg_samples_per_frame(version, layer) -> int:
+    if layer == 3:
+        return 384
+    if layer == 1 and version != 3:
+        return 576
+    return 1152
+
+
+def _mpeg_frame_length(header) -> int:
+    version, layer, bitrate, sample_rate, padding, _ = header
+    if layer == 3:
+        return (12 * bitrate * 1000 // sample_rate + padding) * 4
+
+    samples = _mpeg_samples_per_frame(version, layer)
+    return samples // 8 * bitrate * 1000 // sample_rate + padding
+
+
+def _find_mpeg_frame(buffer, start: int) -> tuple[int, tuple] | None:
+    limit = min(len(buffer), start + MPEG_SYNC_WINDOW)
+    offset = start
+
+    while offset < limit:
+        offset = buffer.find(b"\xff", offset, limit)
+        if offset == -1:
+            return None
+
+        header = _mpeg_header(buffer, offset)
+        if header is not None:
+            following = offset + _mpeg_frame_length(header)
+            # A second sync word (or EOF) right behind the frame weeds out false positives
+            if following + 4 > len(buffer) or _is_mpeg_sync(buffer, following):
+                return offset, header
+
+        offset += 1
+
+    return None
+
+
+def _mpeg_vbr_frames(buffer, offset, header) -> int | None:
+    """
+    Frame count from a Xing/Info or VBRI header when the encoder wrote one.
+    """
+    version, _, _, _, _, channel_mode = header
+    mono = channel_mode == 3
+    side_info = (17 if mono else 32) if version == 3 else (9 if mono else 17)
+
+    xing = offset + 4 + side_info
+    if buffer[xing : xing + 4] in (b"Xing", b"Info"):
+        flags = struct.unpack_from(">I", buffer, xing + 4)[0]
+        if flags & 0x01:
+            return struct.unpack_from(">I", buffer, xing + 8)[0]
+
+    vbri = offset + 4 + 32
+    if buffer[vbri : vbri + 4] == b"VBRI":
+        return struct.unpack_from(">I", buffer, vbri + 14)[0]
+
+    return None
+
+
+def read_mp3(buffer: bytes | mmap.mmap, path: pathlib.Path) -> dict:
+    """
+    Parse an MPEG audio stream with optional ID3v2 and ID3v1 tags.
+    """
+    tags, offset = read_id3v2(buffer)
+
+    # Some taggers stack multiple ID3v2 tags back to back
+    while buffer[offset : offset + 3] == b"ID3":
+        extra, consumed = read_id3v2(buffer[offset:])
+        for key, value in extra.items():
+            tags.setdefault(key, value)
+        offset += consumed
+
+    v1_tags = read_id3v1(buffer)
+    for key, value in v1_tags.items():
+        tags.setdefault(key, value)
+
+    audio_end = len(buffer) - (128 if v1_tags else 0)
+
+    found = _find_mpeg_frame(buffer, offset)
+    if found is None:
+        raise TagReaderError(f"No MPEG audio frame found in {path}")
+
+    frame_offset, header = found
+    version, layer, bitrate, sample_rate, _, channel_mode = header
+
+    frames = _mpeg_vbr_frames(buffer, frame_offset, header)
+    if frames:
+        duration = frames * _mpeg_samples_per_frame(version, layer) / sample_rate
+    else:
+        duration = (audio_end - frame_offset) * 8 / (bitrate * 1000)
+
+    audio_bytes = audio_end - frame_offset
+    bit_rate = audio_bytes * 8 / duration if duration else bitrate * 1000
+
+    return build_result(
+        path,
+        len(buffer),
+        "mp3",
+        MPEG_CODECS[layer],
+        duration,
+        tags,
+        sample_rate=sample_rate,
+        channels=1 if channel_mode == 3 else 2,
+        bit_rate=bit_rate,
+    )
+
+
+#
+# Ogg
+#
+
+
+def parse_vorbis_comment(data: bytes, offset: int = 0) -> dict[str, str]:
+    """
+    Decode a Vorbis comment block (shared by Vorbis, Opus and FLAC).
+
+    Repeated fields are joined with `;`, the vendor string is reported as `encoder`.
+    """
+    vendor_length = struct.unpack_from("<I", data, offset)[0]
+    offset += 4
+    vendor = data[offset : offset + vendor_length].decode("utf-8", errors="replace")
+    offset += vendor_length
+
+    count = struct.unpack_from("<I", data, offset)[0]
+    offset += 4
+
+    tags: dict[str, str] = {}
+    for _ in range(count):
+        length = struct.unpack_from("<I", data, offset)[0]
+        offset += 4
+        entry = data[offset : offset + length].decode("utf-8", errors="replace")
+        offset += length
+
+        key, sep, value = entry.partition("=")
+        if not sep:
+            continue
+        tags[key] = f"{tags[key]};{value}" if key in tags else value
+
+    if vendor:
+        tags.setdefault("encoder", vendor)
+
+    return tags
+
+
+def _ogg_packets(buffer, count: int) -> list[bytes]:
+    """
+    Reassemble the first `count` packets of the first logical bitstream.
+    """
+    packets: list[bytes] = []
+    packet = bytearray()
+    serial = None
+    offset = 0
+
+    while len(packets) < count and offset + 27 <= len(buffer):
+        if buffer[offset : offset + 4] != b"OggS":
+            raise TagReaderError("Lost Ogg page sync")
+
+        page_serial = struct.unpack_from("<I", buffer, offset + 14)[0]
+        segments = buffer[offset + 26]
+        lacing = buffer[offset + 27 : offset + 27 + segments]
+        data_offset = offset + 27 + segments
+
+        if serial is None:
+            serial = page_serial
+
+        for lace in lacing:
+            if page_serial == serial:
+                packet += buffer[data_offset : data_offset + lace]
+                if lace < 255:
+                    packets.append(bytes(packet))
+                    packet.clear()
+                    # libvorbis puts the comment and setup headers on one page
+                    if len(packets) == count:
+                        return packets
+            data_offset += lace
+
+        offset = data_offset
+
+    return packets
+
+
+def _ogg_last_granule(buffer, serial_hint: bytes) -> int:
+    """
+    Walk backwards from EOF to the last page of the stream for its granule position.
+    """
+    end = len(buffer)
+    while True:
+        idx = buffer.rfind(b"OggS", 0, end)
+        if idx == -1:
+            return 0
+        granule = struct.unpack_from("<q", buffer, idx + 6)[0]
+        if buffer[idx + 14 : idx + 18] == serial_hint and granule >= 0:
+            return granule
+        end = idx
+
+
+def read_ogg(buffer: bytes | mmap.mmap, path: pathlib.Path) -> dict:
+    """
+    Parse an Ogg container holding Vorbis or Opus.
+    """
+    packets = _ogg_packets(buffer, 2)
+    if len(packets) < 2:
+        raise TagReaderError(f"Truncated Ogg headers in {path}")
+
+    ident, comment = packets
+    serial = buffer[14:18]
+
+    if ident[:7] == b"\x01vorbis":
+        codec = "vorbis"
+        channels = ident[11]
+        sample_rate = struct.unpack_from("<I", ident, 12)[0]
+        pre_skip = 0
+        granule_rate = sample_rate
+        if comment[:7] != b"\x03vorbis":
+            raise TagReaderError(f"Missing vorbis comment header in {path}")
+        tags = parse_vorbis_comment(comment, 7)
+    elif ident[:8] == b"OpusHead":
+        codec = "opus"
+        channels = ident[9]
+        pre_skip = struct.unpack_from("<H", ident, 10)[0]
+        sample_rate = 48000
+        granule_rate = 48000
+        if comment[:8] != b"OpusTags":
+            raise TagReaderError(f"Missing opus tags header in {path}")
+        tags = parse_vorbis_comment(comment, 8)
+    else:
+        raise TagReaderError(f"Unsupported Ogg codec in {path}")
+
+    granule = _ogg_last_granule(buffer, serial)
+    duration = max(granule - pre_skip, 0) / granule_rate if granule_rate else 0.0
+
+    return build_result(
+        path,
+        len(buffer),
+        "ogg",
+        codec,
+        duration,
+        tags,
+        sample_rate=sample_rate,
+        channels=channels,
+        bit_rate=len(buffer) * 8 / duration if duration else None,
+    )
+
+
+#
+# FLAC
+#
+
+FLAC_STREAMINFO = 0
+FLAC_VORBIS_COMMENT = 4
+
+
+def read_flac(buffer: bytes | mmap.mmap, path: pathlib.Path) -> dict:
+    """
+    Parse a native FLAC stream's STREAMINFO and VORBIS_COMMENT metadata blocks.
+    """
+    _, offset = read_id3v2(buffer)
+    if buffer[offset : offset + 4] != b"fLaC":
+        raise TagReaderError(f"Missing flac marker in {path}")
+    offset += 4
+
+    info = None
+    tags: dict[str, str] = {}
+    while offset + 4 <= len(buffer):
+        header = buffer[offset]
+        length = int.from_bytes(buffer[offset + 1 : offset + 4], "big")
+        body = offset + 4
+        kind = header & 0x7F
+
+        if kind == FLAC_STREAMINFO:
+            # 20 bits rate, 3 bits channels - 1, 5 bits bits per sample - 1, 36 bits samples
+            packed = int.from_bytes(buffer[body + 10 : body + 18], "big")
+            info = packed >> 44, ((packed >> 41) & 0x07) + 1, packed & 0xFFFFFFFFF
+        elif kind == FLAC_VORBIS_COMMENT:
+            tags = parse_vorbis_comment(bytes(buffer[body : body + length]))
+
+        offset = body + length
+        if header & 0x80:
+            break
+
+    if info is None:
+        raise TagReaderError(f"Missing flac STREAMINFO in {path}")
+
+    sample_rate, channels, samples = info
+    duration = samples / sample_rate if sample_rate else 0.0
+
+    return build_result(
+        path,
+        len(buffer),
+        "flac",
+        "flac",
+        duration,
+        tags,
+        sample_rate=sample_rate,
+        channels=channels,
+        bit_rate=(len(buffer) - offset) * 8 / duration if duration else None,
+    )
+
+
+#
+# MP4
+#
+
+MP4_ATOM_NAMES = {
+    b"\xa9nam": "title",
+    b"\xa9ART": "artist",
+    b"aART": "album_artist",
+    b"\xa9alb": "album",
+    b"\xa9gen": "genre",
+    b"\xa9day": "date",
+    b"\xa9too": "encoder",
+    b"\xa9cmt": "comment",
+    b"\xa9wrt": "composer",
+    b"\xa9grp": "grouping",
+    b"\xa9lyr": "lyrics",
+    b"cprt": "copyright",
+    b"desc": "description",
+}
+
+MP4_CODECS = {
+    b"mp4a": "aac",
+    b"alac": "alac",
+    b"fLaC": "flac",
+    b"Opus": "opus",
+    b"ac-3": "ac3",
+    b"ec-3": "eac3",
+    b".mp3": "mp3",
+}
+
+
+def _mp4_atoms(buffer, start: int, end: int):
+    """
+    Yield (kind, payload start, payload end) for the atoms between start and end.
+    """
+    offset = start
+    while offset + 8 <= end:
+        size, kind = struct.unpack_from(">I4s", buffer, offset)
+        header = 8
+        if size == 1:
+            size = struct.unpack_from(">Q", buffer, offset + 8)[0]
+            header = 16
+        elif size == 0:
+            size = end - offset
+
+        if size < header:
+            raise TagReaderError(f"Corrupt MP4 atom {kind!r} at {offset}")
+
+        yield kind, offset + header, min(offset + size, end)
+        offset += size
+
+
+def _mp4_child(buffer, start, end, *path: bytes) -> tuple[int, int] | None:
+    for kind, child_start, child_end in _mp4_atoms(buffer, start, end):
+        if kind == path[0]:
+            if len(path) == 1:
+                return child_start, child_end
+            return _mp4_child(buffer, child_start, child_end, *path[1:])
+    return None
+
+
+def _mp4_data(buffer, start, end) -> list[tuple[int, bytes]]:
+    """
+    Collect the (type, value) pairs of an ilst item's `data` atoms.
+    """
+    values = []
+    for kind, child_start, child_end in _mp4_atoms(buffer, start, end):
+        if kind == b"data":
+            data_type = struct.unpack_from(">I", buffer, child_start)[0] & 0xFFFFFF
+            values.append((data_type, bytes(buffer[child_start + 8 : child_end])))
+    return values
+
+
+def _mp4_ilst(buffer, start, end) -> dict[str, str]:
+    tags: dict[str, str] = {}
+
+    for kind, item_start, item_end in _mp4_atoms(buffer, start, end):
+        if kind == b"----":
+            name = None
+            for child, child_start, child_end in _mp4_atoms(
+                buffer, item_start, item_end
+            ):
+                if child == b"name":
+                    name = bytes(buffer[child_start + 4 : child_end]).decode(
+                        "utf-8", errors="replace"
+                    )
+            values = _mp4_data(buffer, item_start, item_end)
+            if name and values:
+                tags[name] = values[0][1].decode("utf-8", errors="replace")
+            continue
+
+        values = _mp4_data(buffer, item_start, item_end)
+        if not values:
+            continue
+        data_type, value = values[0]
+
+        if kind in (b"trkn", b"disk") and len(value) >= 6:
+            number, total = struct.unpack_from(">HH", value, 2)
+            key = "track" if kind == b"trkn" else "disc"
+            tags[key] = f"{number}/{total}" if total else str(number)
+        elif kind == b"gnre" and len(value) >= 2:
+            index = struct.unpack_from(">H", value, 0)[0] - 1
+            if 0 <= index < len(ID3V1_GENRES):
+                tags.setdefault("genre", ID3V1_GENRES[index])
+        elif data_type == 1:
+            key = MP4_ATOM_NAMES.get(kind, kind.decode("latin-1"))
+            tags[key] = value.decode("utf-8", errors="replace")
+
+    return tags
+
+
+def _mp4_sound_track(buffer, moov_start, moov_end) -> tuple[str, int, int]:
+    """
+    Find the first sound track and return (codec, sample rate, channels).
+    """
+    for kind, start, end in _mp4_atoms(buffer, moov_start, moov_end):
+        if kind != b"trak":
+            continue
+
+        hdlr = _mp4_child(buffer, start, end, b"mdia", b"hdlr")
+        if hdlr is None or buffer[hdlr[0] + 8 : hdlr[0] + 12] != b"soun":
+            continue
+
+        stsd = _mp4_child(buffer, start, end, b"mdia", b"minf", b"stbl", b"stsd")
+        if stsd is None:
+            continue
+
+        entry = stsd[0] + 8
+        fourcc = bytes(buffer[entry + 4 : entry + 8])
+        channels = struct.unpack_from(">H", buffer, entry + 8 + 16)[0]
+        sample_rate = struct.unpack_from(">I", buffer, entry + 8 + 24)[0] >> 16
+        codec = MP4_CODECS.get(fourcc, fourcc.decode("latin-1").strip())
+        return codec, sample_rate, channels
+
+    raise TagReaderError("No sound track in MP4")
+
+
+def read_mp4(buffer: bytes | mmap.mmap, path: pathlib.Path) -> dict:
+    """
+    Parse an ISO base media (mp4/m4a) file via its `moov` atom.
+    """
+    moov = _mp4_child(buffer, 0, len(buffer), b"moov")
+    if moov is None:
+        raise TagReaderError(f"No moov atom in {path}")
+
+    mvhd = _mp4_child(buffer, *moov, b"mvhd")
+    if mvhd is None:
+        raise TagReaderError(f"No mvhd atom in {path}")
+
+    if buffer[mvhd[0]] == 1:
+        timescale, length = struct.unpack_from(">IQ", buffer, mvhd[0] + 20)
+    else:
+        timescale, length = struct.unpack_from(">II", buffer, mvhd[0] + 12)
+    duration = length / timescale if timescale else 0.0
+
+    codec, sample_rate, channels = _mp4_sound_track(buffer, *moov)
+
+    tags: dict[str, str] = {}
+    meta = _mp4_child(buffer, *moov, b"udta", b"meta")
+    if meta is not None:
+        meta_start, meta_end = meta
+        # ISO meta is a full box, QuickTime style meta is not
+        if buffer[meta_start + 4 : meta_start + 8] != b"hdlr":
+            meta_start += 4
+        ilst = _mp4_child(buffer, meta_start, meta_end, b"ilst")
+        if ilst is not None:
+            tags = _mp4_ilst(buffer, *ilst)
+
+    return build_result(
+        path,
+        len(buffer),
+        MP4_FORMAT_NAME,
+        codec,
+        duration,
+        tags,
+        sample_rate=sample_rate,
+        channels=channels,
+        bit_rate=len(buffer) * 8 / duration if duration else None,
+    )
+
+
+PARSERS = {
+    "mp3": read_mp3,
+    "ogg": read_ogg,
+    "flac": read_flac,
+    "mp4": read_mp4,
+}
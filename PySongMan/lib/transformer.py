@@ -471,9 +471,12 @@ def process_default_argument(default_op):
     elif isinstance(default_op, ast.Constant):
         match default_op.value:
             case True:
-                return "True"
+                return "true"
             case False:
-                return "False"
+                return "false"
+            case str():
+                # Double quoted, single quotes are stripped from the compiled argument
+                return f'"{default_op.value}"'
             case _:
                 return str(default_op.value)
 
@@ -657,6 +660,9 @@ def process_typeddict(target_cls: ast.ClassDef, bases=None) -> TypedDictionary:
                 and element.annotation.value.id == "list"
             ):
                 fields[name] = f"{element.annotation.slice.id}[]"
+            elif isinstance(element.annotation, ast.BinOp):
+                # `str | None` and the like
+                fields[name] = process_binop(element.annotation)
             else:
                 element_type = (
                     element.annotation.id
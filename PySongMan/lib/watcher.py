@@ -0,0 +1,456 @@
+"""
+Live library updates.
+
+A `Watcher` thread follows the library roots through inotify (Linux) or a polling fallback,
+coalesces the file events it sees and applies them in small transactions: changed files are
+probed and upserted, removed files and directories are deleted.
+"""
+
+import ctypes
+import ctypes.util
+import enum
+import logging
+import os
+import pathlib
+import select
+import struct
+import subprocess
+import threading
+import time
+import typing as T
+
+from sqlalchemy import select as sa_select
+
+from . import tag_reader
+from .manifest import Manifest, delete_songs, scan
+from .models import LOOKUP_CHUNK, Song
+from .normalize import SUFFIXES, to_record
+from .probe import probe
+from .walker import FileState, scan_directory, walk
+from .writer import SongRecord
+
+LOG = logging.getLogger(__name__)
+
+# inotify(7) flags
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+
+WATCH_MASK = (
+    IN_CLOSE_WRITE
+    | IN_ATTRIB
+    | IN_MOVED_FROM
+    | IN_MOVED_TO
+    | IN_CREATE
+    | IN_DELETE
+    | IN_DELETE_SELF
+)
+
+EVENT_HEADER = struct.Struct("iIII")
+
+
+class Event(enum.Enum):
+    UPDATED = "updated"
+    REMOVED = "removed"
+    # A directory went away, everything below it goes too
+    REMOVED_TREE = "removed_tree"
+    # The source lost track (queue overflow), fall back to a manifest rescan
+    RESCAN = "rescan"
+
+
+Events = list[tuple[str, Event]]
+
+
+class Inotify:
+    """
+    Minimal ctypes binding over the inotify syscalls
+    """
+
+    def __init__(self):
+        libc_name = ctypes.util.find_library("c")
+        if libc_name is None:
+            raise OSError("libc not found")
+
+        self.__libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(self.__libc, "inotify_init1"):
+            raise OSError("inotify is not available")
+
+        self.fd = self.__libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+    def add_watch(self, path: str, mask: int = WATCH_MASK) -> int:
+        wd = self.__libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {path}")
+        return wd
+
+    def rm_watch(self, wd: int):
+        # EINVAL when the watch is already gone, nothing left to do then
+        self.__libc.inotify_rm_watch(self.fd, wd)
+
+    def read(self, timeout: float) -> list[tuple[int, int, int, str]]:
+        """
+        Wait up to `timeout` seconds for events.
+
+        :return: (watch descriptor, mask, cookie, name) tuples
+        """
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        events = []
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            wd, mask, cookie, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset : offset + length].rstrip(b"\x00"))
+            offset += length
+            events.append((wd, mask, cookie, name))
+
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class InotifySource:
+    """
+    Recursive inotify watches over a set of roots
+    """
+
+    def __init__(self, roots: T.Iterable[str]):
+        self.__inotify = Inotify()
+        self.__paths: dict[int, str] = {}
+        for root in roots:
+            self.__watch_tree(root)
+
+    def __watch_tree(self, top: str) -> list[str]:
+        """
+        Watch `top` and its sub directories.
+
+        :return: the directories now being watched
+        """
+        watched = []
+        for directory, subdirs, _ in os.walk(top):
+            try:
+                self.__paths[self.__inotify.add_watch(directory)] = directory
+                watched.append(directory)
+            except OSError as exc:
+                LOG.warning("Unable to watch %s: %s", directory, exc)
+                subdirs.clear()
+        return watched
+
+    def __unwatch_tree(self, top: str):
+        """
+        Stop watching `top` and its sub directories.
+
+        A moved directory keeps its watches, they follow the inode, but the paths recorded
+        for them are stale. Left in place they report events from wherever the tree went under
+        its old location. Moved within the roots it is watched again from `IN_MOVED_TO`.
+        """
+        for wd, directory in list(self.__paths.items()):
+            if directory == top or directory.startswith(top + os.sep):
+                self.__inotify.rm_watch(wd)
+                del self.__paths[wd]
+
+    def read(self, timeout: float) -> Events:
+        events = []
+        for wd, mask, _, name in self.__inotify.read(timeout):
+            if mask & IN_Q_OVERFLOW:
+                events.append(("", Event.RESCAN))
+                continue
+
+            if mask & IN_IGNORED:
+                self.__paths.pop(wd, None)
+                continue
+
+            parent = self.__paths.get(wd)
+            if parent is None:
+                continue
+
+            path = os.path.join(parent, name) if name else parent
+
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    # Files may have landed before the watch existed, report them all
+                    for directory in self.__watch_tree(path):
+                        files, _ = scan_directory(directory)
+                        events.extend((state.path, Event.UPDATED) for state in files)
+                elif mask & (IN_DELETE | IN_MOVED_FROM):
+                    self.__unwatch_tree(path)
+                    events.append((path, Event.REMOVED_TREE))
+            elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO | IN_ATTRIB):
+                events.append((path, Event.UPDATED))
+            elif mask & (IN_DELETE | IN_MOVED_FROM):
+                events.append((path, Event.REMOVED))
+
+        return events
+
+    def close(self):
+        self.__inotify.close()
+
+
+class PollingSource:
+    """
+    Periodic walk and compare, for platforms without inotify
+    """
+
+    def __init__(self, roots: T.Iterable[str], interval: float = 5.0):
+        self.roots = list(roots)
+        self.interval = interval
+        self.__snapshot = self.__take()
+        self.__next = time.monotonic() + interval
+
+    def __take(self) -> dict[str, FileState]:
+        return {
+            state.path: state
+            for root in self.roots
+            for batch in walk(root, SUFFIXES)
+            for state in batch
+        }
+
+    def read(self, timeout: float) -> Events:
+        wait = self.__next - time.monotonic()
+        if wait > timeout:
+            time.sleep(timeout)
+            return []
+
+        time.sleep(max(wait, 0))
+        self.__next = time.monotonic() + self.interval
+
+        current = self.__take()
+        events = [
+            (path, Event.UPDATED)
+            for path, state in current.items()
+            if self.__snapshot.get(path) != state
+        ]
+        events.extend(
+            (path, Event.REMOVED) for path in self.__snapshot if path not in current
+        )
+        self.__snapshot = current
+        return events
+
+    def close(self):
+        pass
+
+
+def make_source(roots: T.Iterable[str], poll_interval: float = 5.0):
+    """
+    inotify when the platform has it, polling otherwise
+    """
+    roots = list(roots)
+    try:
+        return InotifySource(roots)
+    except OSError as exc:
+        LOG.info("inotify unavailable (%s), polling every %ss", exc, poll_interval)
+        return PollingSource(roots, poll_interval)
+
+
+def under(tree: str):
+    """
+    Clauses matching the songs below `tree`.
+
+    A path range rather than `startswith`, which SQLite runs as LIKE: `_` and `%` in the
+    directory name are wildcards there and case is ignored, so removing "/music/a_b" would take
+    "/music/aXb" and "/music/A_B" along with it. The range is exact and can use the path index.
+
+    :param tree: directory path
+    :return:
+    """
+    return (
+        Song.path > tree + os.sep,
+        Song.path < tree + chr(ord(os.sep) + 1),
+    )
+
+
+class Watcher(threading.Thread):
+    """
+    Background thread applying file system changes to the library
+
+    """
+
+    debounce: float
+    max_delay: float
+    applied: int
+
+    def __init__(
+        self,
+        get_db: T.Callable[[], T.ContextManager],
+        libraries: dict[str, int],
+        debounce: float = 0.2,
+        max_delay: float = 1.0,
+        source=None,
+    ):
+        """
+
+        :param get_db: context manager factory yielding a session, ie `App.get_db`
+        :param libraries: library root path to library id
+        :param debounce: quiet period before pending changes are applied
+        :param max_delay: upper bound on how long a change can stay pending
+        :param source: event source, defaults to `make_source(libraries)`
+        """
+        super().__init__(name="library-watcher", daemon=True)
+        self.get_db = get_db
+        self.libraries = {
+            str(pathlib.Path(root)): lib for root, lib in libraries.items()
+        }
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.applied = 0
+        self.__source = source
+        self.__stop = threading.Event()
+
+    def stop(self, timeout: float | None = 5.0):
+        self.__stop.set()
+        if self.is_alive():
+            self.join(timeout)
+
+    def run(self):
+        if self.__source is None:
+            self.__source = make_source(self.libraries)
+
+        pending: dict[str, Event] = {}
+        first_seen = None
+
+        try:
+            while not self.__stop.is_set():
+                events = self.__source.read(self.debounce)
+                for path, event in events:
+                    pending[path] = event
+
+                if pending and first_seen is None:
+                    first_seen = time.monotonic()
+
+                quiet = not events
+                overdue = first_seen and time.monotonic() - first_seen >= self.max_delay
+                if pending and (quiet or overdue):
+                    try:
+                        self.apply(pending)
+                    except Exception:
+                        LOG.exception("Failed to apply %d changes", len(pending))
+                    pending = {}
+                    first_seen = None
+        finally:
+            self.__source.close()
+
+    def library_for(self, path: str) -> int | None:
+        for root, library_id in self.libraries.items():
+            if path == root or path.startswith(root + os.sep):
+                return library_id
+        return None
+
+    def apply(self, changes: dict[str, Event]):
+        """
+        Apply one coalesced set of changes in a single transaction
+
+        :param changes: path to the latest event seen for it
+        :return:
+        """
+        if Event.RESCAN in changes.values():
+            self.rescan()
+            changes = {
+                path: event for path, event in changes.items() if event != Event.RESCAN
+            }
+
+        removed = [path for path, event in changes.items() if event == Event.REMOVED]
+        trees = [path for path, event in changes.items() if event == Event.REMOVED_TREE]
+
+        records = []
+        for path, event in changes.items():
+            library_id = self.library_for(path)
+            if (
+                event != Event.UPDATED
+                or library_id is None
+                or not path.lower().endswith(SUFFIXES)
+            ):
+                continue
+
+            try:
+                state = FileState.From(path)
+            except FileNotFoundError:
+                removed.append(path)
+                continue
+            except OSError as exc:
+                LOG.warning("Unable to stat %s: %s", path, exc)
+                continue
+
+            if record := self.to_record(state, library_id):
+                records.append(record)
+
+        with self.get_db() as session:
+            stale = set()
+            for start in range(0, len(removed), LOOKUP_CHUNK):
+                chunk = removed[start : start + LOOKUP_CHUNK]
+                stale.update(
+                    session.execute(sa_select(Song.id).where(Song.path.in_(chunk)))
+                    .scalars()
+                    .all()
+                )
+            for tree in trees:
+                stale.update(
+                    session.execute(sa_select(Song.id).where(*under(tree)))
+                    .scalars()
+                    .all()
+                )
+            delete_songs(session, sorted(stale))
+
+            Song.BulkInsert(session, records)
+            session.commit()
+
+        self.applied += len(changes)
+        LOG.debug(
+            "Applied %d updates, %d removals, %d removed trees",
+            len(records),
+            len(removed),
+            len(trees),
+        )
+
+    @staticmethod
+    def to_record(state: FileState, library_id: int) -> SongRecord | None:
+        try:
+            container = tag_reader.sniff(state.path)
+            if container not in tag_reader.AUDIO:
+                LOG.debug("Skipping %s, sniffed as %s", state.path, container)
+                return None
+            return to_record(probe(state.path, container), library_id, state)
+        except (
+            OSError,
+            KeyError,
+            ValueError,
+            tag_reader.TagReaderError,
+            subprocess.CalledProcessError,
+            subprocess.TimeoutExpired,
+        ) as exc:
+            LOG.warning("Unable to probe %s: %s", state.path, exc)
+        return None
+
+    def rescan(self):
+        """
+        Recover from lost events by diffing each library against its manifest
+        """
+        for root, library_id in self.libraries.items():
+            with self.get_db() as session:
+                plan = scan(Manifest.Load(session, library_id), root, SUFFIXES)
+                delete_songs(session, plan.stale_ids)
+                records = [
+                    record
+                    for state in plan.to_probe
+                    if (record := self.to_record(state, library_id))
+                ]
+                Song.BulkInsert(session, records)
+                session.commit()
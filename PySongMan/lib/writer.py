@@ -0,0 +1,159 @@
+"""
+Single writer side of the import pipeline.
+
+Probe workers never touch the database, the pipeline's sink hands their plain song records to
+exactly one `BatchWriter` which writes them in large transactions. With a single connection
+writing SQLite never has to arbitrate between writers so "database is locked" cannot happen.
+"""
+
+import logging
+import time
+import typing as T
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from . import dead_letter
+from .dead_letter import ProbeFailed
+from .journal import DirectoryDone, Journal
+from .models import Song, DeadLetter
+from .tag_cache import TagCache
+
+LOG = logging.getLogger(__name__)
+
+DEFAULT_BATCH = 2000
+
+
+class SongRecord(T.TypedDict):
+    """
+    A normalized, picklable song ready to be written
+    """
+
+    name: str
+    artist: str
+    size: int
+    length_seconds: int
+    file_name: str
+    path: str
+    codec: str
+    format: str
+    mtime_ns: int
+    inode: int
+    library_id: int
+    tags: list[tuple[str, str]]
+
+
+class BatchWriter:
+    """
+    Accumulates records and writes them one transaction per batch.
+    """
+
+    session: Session
+    batch_size: int
+    rows: int
+    run_id: int | None
+    tags: TagCache
+    # Seconds spent inside writer transactions
+    busy: float
+
+    def __init__(
+        self,
+        session: Session,
+        batch_size: int = DEFAULT_BATCH,
+        run_id: int | None = None,
+        tag_cache: TagCache | None = None,
+    ):
+        """
+
+        :param session:
+        :param batch_size: records per transaction
+        :param run_id: optional `ImportRun` to checkpoint every batch into
+        :param tag_cache: tag ids to reuse across batches, one is preloaded when None
+        """
+        self.session = session
+        self.batch_size = batch_size
+        self.run_id = run_id
+        self.tags = TagCache.Preload(session) if tag_cache is None else tag_cache
+        self.rows = 0
+        self.busy = 0.0
+        self.__pending: list[SongRecord] = []
+        self.__done: list[str] = []
+        self.__parts: dict[str, int] = {}
+        self.__failed: list[ProbeFailed] = []
+        # Only pay for clearing dead letters when there are some
+        self.__letters = (
+            session.execute(select(DeadLetter.id).limit(1)).first() is not None
+        )
+        self.__started = time.monotonic()
+
+    def add(self, record: SongRecord) -> bool:
+        """
+        Queue a record, writing the batch once it is full.
+
+        :param record:
+        :return: True if a batch was written
+        """
+        self.__pending.append(record)
+        if len(self.__pending) >= self.batch_size:
+            self.flush()
+            return True
+        return False
+
+    def mark(self, done: DirectoryDone):
+        """
+        Checkpoint a directory with the next batch once all of its parts are in.
+
+        A unit's records are added ahead of its marker so they are already pending or
+        written.
+        """
+        seen = self.__parts.pop(done.directory, 0) + 1
+        if seen >= done.parts:
+            self.__done.append(done.directory)
+        else:
+            self.__parts[done.directory] = seen
+
+    def fail(self, failure: ProbeFailed):
+        """
+        Dead letter a file with the next batch
+        """
+        self.__failed.append(failure)
+
+    def flush(self):
+        if not self.__pending and not self.__done and not self.__failed:
+            return
+
+        started = time.monotonic()
+        Song.BulkInsert(self.session, self.__pending, self.tags)
+        if self.__letters and self.__pending:
+            dead_letter.clear(
+                self.session, [record["path"] for record in self.__pending]
+            )
+        if self.__failed:
+            dead_letter.record_failures(self.session, self.__failed)
+            self.__letters = True
+        if self.run_id is not None:
+            Journal.Checkpoint(
+                self.session, self.run_id, self.__done, len(self.__pending)
+            )
+        # Songs and their checkpoint land together or not at all
+        self.session.commit()
+        # Nothing written is needed again, keep the identity map from growing with the import
+        self.session.expunge_all()
+        self.busy += time.monotonic() - started
+
+        self.rows += len(self.__pending)
+        self.__pending.clear()
+        self.__done.clear()
+        self.__failed.clear()
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.__started
+
+    @property
+    def rate(self) -> float:
+        """
+        Sustained rows per second since the writer started
+        """
+        elapsed = self.elapsed
+        return self.rows / elapsed if elapsed else 0.0
@@ -174,9 +174,15 @@ def main():
     )
 
     app.main_window = webview.create_window(**window_args)
+    app.start_watcher()
+    # Catch up on whatever changed on disk while the app was closed
+    app.start_verifier()
 
     webview.start(debug=args.debug)
 
+    app.stop_verifier()
+    app.stop_watcher()
+
     if args.debug:
         import signal
 
@@ -0,0 +1,147 @@
+"""
+Benchmark full imports of a generated library across the probe stage executors.
+
+A synthetic library is written to a temporary directory (see `PySongMan.lib.synthetic`) so
+the benchmark runs offline and gives the same numbers on any machine for the same arguments.
+Each backend imports it into a fresh database in its own process, so peak RSS is its own.
+
+    python -m scripts.bench_import --files 20000 --depth 3 --mix mp3=8,mp4=2
+
+`--cold` evicts the library from the page cache before each run so spinning disks and network
+mounts are measured as on a first import, `--readahead 0 4` compares sniffer prefetching.
+"""
+
+import logging
+import multiprocessing as mp
+import os
+import pathlib
+import resource
+import tempfile
+import time
+
+import tap
+
+from PySongMan.lib.importer import STAGES, parse_executor, run_import
+from PySongMan.lib.readahead import READAHEAD_FILES, evict
+from PySongMan.lib.synthetic import generate_library, parse_mix
+from PySongMan.lib.writer import DEFAULT_BATCH
+
+# Backend name to the stage executors it overrides
+BACKENDS = {
+    "process": {"probe": "process:auto"},
+    "thread": {"probe": "thread:8"},
+    "asyncio": {"probe": "asyncio:32"},
+    "serial": {"sniff": "thread:1", "probe": "thread:1", "normalize": "thread:1"},
+}
+
+
+class Arguments(tap.Tap):
+
+    files: int = 5000
+    depth: int = 2  # Directory levels, 2 is <artist>/<album>
+    mix: str = "mp3=6,ogg=2,mp4=2"  # Format shares
+    seed: int = 7
+    backends: list[str] = list(BACKENDS)
+    batch_size: int = DEFAULT_BATCH
+    probe_cache: bool = False  # Read through a (cold) probe cache
+    library: str = ""  # Reuse or keep the generated library here instead of a temp dir
+    cold: bool = False  # Evict the library from the page cache before every backend
+    readahead: list[int] = [READAHEAD_FILES]  # Sniffer prefetch depths to run, 0 is off
+
+
+def run_backend(
+    name: str, seed_path: str, workdir: str, args: Arguments, readahead: int, results
+):
+    logging.basicConfig(level=logging.WARNING)
+    executors = {stage: parse_executor(spec) for stage, spec in BACKENDS[name].items()}
+    cache_path = (
+        str(pathlib.Path(workdir) / f"{name}.cache") if args.probe_cache else None
+    )
+
+    stats = run_import(
+        seed_path,
+        f"sqlite:///{pathlib.Path(workdir) / name}.sqlite3",
+        batch_size=args.batch_size,
+        cache_path=cache_path,
+        executors=executors,
+        readahead=readahead,
+    )
+
+    results.put(
+        (
+            stats.rows,
+            stats.elapsed,
+            stats.write_rate,
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024,
+            # Largest single worker process, if the backend used any
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss // 1024,
+        )
+    )
+
+
+def bench(
+    name: str,
+    seed_path: str,
+    files: list[pathlib.Path],
+    args: Arguments,
+    readahead: int,
+):
+    if args.cold:
+        # Dirty pages stay cached until written back, a freshly generated library is all dirty
+        os.sync()
+        evict(files)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        results = mp.Queue()
+        worker = mp.Process(
+            target=run_backend,
+            args=(name, seed_path, workdir, args, readahead, results),
+        )
+        worker.start()
+        worker.join()
+        if worker.exitcode:
+            print(f"{name:>8}: failed with exit code {worker.exitcode}")
+            return
+
+        rows, elapsed, write_rate, peak, worker_peak = results.get()
+
+    stages = ", ".join(
+        f"{stage}={BACKENDS[name].get(stage, 'default')}" for stage in STAGES
+    )
+    print(
+        f"{name:>8}: {rows}/{len(files)} rows in {elapsed:.2f}s"
+        f" = {len(files) / elapsed:.0f} files/sec, {write_rate:.0f} DB rows/sec,"
+        f" peak RSS {peak} MB (workers {worker_peak} MB)"
+        f" [{stages}, readahead={readahead}{', cold' if args.cold else ''}]"
+    )
+
+
+def main():
+    args = Arguments().parse_args()
+    unknown = set(args.backends) - set(BACKENDS)
+    if unknown:
+        raise ValueError(
+            f"Unknown backends {sorted(unknown)}, expected {list(BACKENDS)}"
+        )
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = pathlib.Path(args.library or tmp)
+        files = [path for path in root.rglob("*.*") if path.is_file()]
+        if files:
+            print(f"Reusing {len(files)} files under {root}")
+        else:
+            start = time.perf_counter()
+            files = generate_library(
+                root, args.files, args.depth, parse_mix(args.mix), args.seed
+            )
+            print(
+                f"Generated {len(files)} files under {root} in {time.perf_counter() - start:.1f}s"
+            )
+
+        for name in args.backends:
+            for readahead in args.readahead:
+                bench(name, str(root), files, args, readahead)
+
+
+if __name__ == "__main__":
+    main()
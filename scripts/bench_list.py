@@ -0,0 +1,164 @@
+"""
+Compare the latency of a `Songs.list` page built from ORM songs against `Song.GetPage`.
+
+The old path loads a page of `Song` instances and calls `to_dict()` on each, lazy loading every
+song's tags with a query of its own. `Song.GetPage` builds the dicts from rows and fetches the
+page's tags in one query. Both walk the same keyset so only building the page differs.
+
+The default library is 1M songs with 10 tags each, building it takes a few minutes, `--db`
+keeps it around for later runs.
+
+    python -m scripts.bench_list --db /tmp/list.sqlite3
+"""
+
+import logging
+import pathlib
+import statistics
+import tempfile
+import time
+
+import tap
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import Session
+
+from PySongMan.lib.models import Base, Cursor, Library, Song, Song_Tag, Tag
+
+# Tags every song gets, name to the number of songs sharing a value, 1 means unique per song
+TAGS = {
+    "title": 1,
+    "album": 12,
+    "artist": 200,
+    "album_artist": 200,
+    "track": 1,
+    "year": 5_000,
+    "genre": 50_000,
+    "encoder": 100_000,
+    "bitrate": 250_000,
+    "disc": 500_000,
+}
+
+
+class Arguments(tap.Tap):
+
+    songs: int = 1_000_000
+    depths: list[int] = [0, 500_000, 900_000]  # Rows skipped before the page
+    limit: int = 100
+    repeat: int = 5
+    db: str = ""  # Reuse this database instead of building one
+
+
+def build(session: Session, count: int):
+    start = time.perf_counter()
+    library = Library(path="/music")
+    session.add(library)
+    session.commit()
+
+    # Tag ids are handed out up front so songs can link to them without lookups
+    offsets, next_id = {}, 1
+    for name, share in TAGS.items():
+        offsets[name] = next_id
+        values = -(-count // share)
+        for first in range(0, values, 10_000):
+            session.execute(
+                insert(Tag),
+                [
+                    dict(id=next_id + idx, name=name, value=f"{name} {idx}")
+                    for idx in range(first, min(first + 10_000, values))
+                ],
+            )
+        next_id += values
+    session.commit()
+
+    for first in range(0, count, 10_000):
+        ids = range(first, min(first + 10_000, count))
+        session.execute(
+            insert(Song),
+            [
+                dict(
+                    id=idx + 1,
+                    name=f"Track {idx}",
+                    artist=f"Artist {idx // 200}",
+                    size=idx,
+                    length_seconds=idx % 600,
+                    file_name=f"{idx}.mp3",
+                    path=f"/music/{idx // 12}/{idx}.mp3",
+                    codec="mp3",
+                    format="mp3",
+                    library_id=library.id,
+                )
+                for idx in ids
+            ],
+        )
+        session.execute(
+            insert(Song_Tag),
+            [
+                dict(song_id=idx + 1, tag_id=offsets[name] + idx // share)
+                for idx in ids
+                for name, share in TAGS.items()
+            ],
+        )
+    session.commit()
+    print(
+        f"Built {count} songs and {count * len(TAGS)} tag links"
+        f" in {time.perf_counter() - start:.1f}s"
+    )
+
+
+def orm_page(session: Session, after: int, limit: int):
+    songs = session.execute(
+        select(Song).where(Song.id > after).order_by(Song.id).limit(limit)
+    ).scalars()
+    return [song.to_dict() for song in songs]
+
+
+def measure(repeat: int, engine, page) -> list[float]:
+    timings = []
+    for _ in range(repeat):
+        # A fresh session every time, the identity map would otherwise keep the tags loaded
+        with Session(engine) as session:
+            start = time.perf_counter()
+            page(session)
+            timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main():
+    logging.basicConfig(level=logging.WARNING)
+    args = Arguments().parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.db or pathlib.Path(tmp) / "list.sqlite3"
+        engine = create_engine(f"sqlite:///{path}")
+        Base.metadata.create_all(engine)
+
+        with Session(engine) as session:
+            if not session.execute(select(Song.id).limit(1)).first():
+                build(session, args.songs)
+
+        for depth in args.depths:
+            cursor = Cursor("id", False, depth, depth).encode() if depth else None
+            before = measure(
+                args.repeat,
+                engine,
+                lambda session: orm_page(session, depth, args.limit),
+            )
+            after = measure(
+                args.repeat,
+                engine,
+                lambda session: Song.GetPage(session, cursor, args.limit),
+            )
+            with Session(engine) as session:
+                assert orm_page(session, depth, args.limit) == (
+                    Song.GetPage(session, cursor, args.limit)["data"]
+                )
+            print(
+                f"depth {depth:>9}: to_dict {statistics.median(before) * 1000:7.1f}ms,"
+                f" GetPage {statistics.median(after) * 1000:6.1f}ms"
+                f" ({statistics.median(before) / statistics.median(after):.0f}x)"
+            )
+
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Compare rows/sec of the per result `to_record` key_try chain against the batch normalizers.
+
+The compiled batch is only measured once built, `cythonize -i PySongMan/lib/fast_normalize.pyx`
+"""
+
+import os
+import random
+import time
+
+import tap
+
+from PySongMan.lib.normalize import py_normalize_batch, to_record
+from PySongMan.lib.walker import FileState
+
+GENRES = ["Rock", "Jazz", "Pop", "Metal", "Ambient", "Classical", "Hip-Hop"]
+ENCODERS = ["LAME3.100", "Lavf58.76.100", "iTunes 12.9"]
+
+
+class Arguments(tap.Tap):
+
+    results: int = 200_000
+    batch_size: int = 100  # Results per normalize call, the importer's unit size
+    repeat: int = 3  # Best of
+
+
+def make_results(count: int) -> list[tuple[FileState, dict]]:
+    rng = random.Random(7)
+    items = []
+    for idx in range(count):
+        artist = f"Artist {idx // 200}"
+        album = f"Album {idx // 12}"
+        tags = {
+            "album": album,
+            "genre": rng.choice(GENRES),
+            "encoder": rng.choice(ENCODERS),
+            "track": f"{idx % 12 + 1}/12",
+        }
+        # Vorbis style upper case keys, ID3 style lower case keys and untagged files
+        style = idx % 3
+        if style == 0:
+            tags |= {"TITLE": f"Track {idx}", "ARTIST": artist}
+        elif style == 1:
+            tags |= {"title": f"Track {idx}", "album_artist": artist}
+
+        path = os.path.join(os.sep, "music", artist, album, f"{idx % 12:02d} {idx}.mp3")
+        result = {
+            "streams": [{"index": 0, "codec_name": "mp3", "tags": tags}],
+            "format": {
+                "filename": path,
+                "format_name": "mp3",
+                "size": str(rng.randint(2_000_000, 9_000_000)),
+                "duration": f"{rng.uniform(90, 600):.6f}",
+                "tags": tags,
+            },
+        }
+        items.append((FileState(path, 0, idx, idx), result))
+    return items
+
+
+def per_result(items, library_id):
+    return [to_record(result, library_id, state) for state, result in items]
+
+
+def bench(label, func, items, args: Arguments) -> float:
+    best = float("inf")
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        for idx in range(0, len(items), args.batch_size):
+            func(items[idx : idx + args.batch_size], 1)
+        best = min(best, time.perf_counter() - start)
+
+    print(
+        f"{label:>10}: {len(items)} rows in {best:.3f}s = {len(items) / best:.0f} rows/sec"
+    )
+    return best
+
+
+def main():
+    args = Arguments().parse_args()
+    items = make_results(args.results)
+
+    baseline = bench("key_try", per_result, items, args)
+    python = bench("py batch", py_normalize_batch, items, args)
+    print(f"py batch speedup: {baseline / python:.1f}x")
+
+    try:
+        from PySongMan.lib.fast_normalize import normalize_batch
+    except ImportError:
+        print("fast_normalize is not built, skipping the compiled batch")
+        return
+
+    compiled = bench("cython", normalize_batch, items, args)
+    print(f"cython speedup: {baseline / compiled:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Measure how long `Song.GetPage` takes at increasing depths into a large library.
+
+The old LIMIT/OFFSET query and its COUNT(*) are timed next to `Song.GetPage`, which walks a
+keyset and reads the maintained `SongCount`. Cursors at depth are built straight from the row before the page, which is what
+a client that scrolled that far would hold.
+
+    python -m scripts.bench_pages --songs 1000000 --depths 0 100000 900000
+"""
+
+import logging
+import pathlib
+import tempfile
+import time
+
+import tap
+from sqlalchemy import create_engine, func, insert, select
+from sqlalchemy.orm import Session
+
+from PySongMan.lib.models import Base, Cursor, Library, Song
+from scripts.bench_writer import make_records
+
+
+class Arguments(tap.Tap):
+
+    songs: int = 1_000_000
+    depths: list[int] = [0, 10_000, 100_000, 900_000]  # Rows skipped before the page
+    limit: int = 100
+    repeat: int = 5  # Best of
+    sort: str = "id"
+    db: str = ""  # Reuse this database instead of building one
+
+
+def build(session: Session, count: int):
+    start = time.perf_counter()
+    library = Library(path="/music")
+    session.add(library)
+    session.commit()
+
+    rows = []
+    for record in make_records(library.id, count):
+        del record["tags"]
+        rows.append(record)
+        if len(rows) >= 10_000:
+            session.execute(insert(Song), rows)
+            rows = []
+    if rows:
+        session.execute(insert(Song), rows)
+    session.commit()
+    print(f"Built {count} songs in {time.perf_counter() - start:.1f}s")
+
+
+def best(repeat: int, func_) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func_()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def offset_page(session: Session, depth: int, limit: int, sort: str):
+    column = getattr(Song, sort)
+    session.execute(select(func.count(Song.id))).scalar_one()
+    stmt = select(Song).order_by(column, Song.id).limit(limit).offset(depth)
+    return session.execute(stmt).scalars().all()
+
+
+def cursor_at(session: Session, depth: int, sort: str) -> str | None:
+    if depth == 0:
+        return None
+    column = getattr(Song, sort)
+    value, song_id = session.execute(
+        select(column, Song.id).order_by(column, Song.id).limit(1).offset(depth - 1)
+    ).one()
+    return Cursor(sort, False, value, song_id).encode()
+
+
+def main():
+    logging.basicConfig(level=logging.WARNING)
+    args = Arguments().parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.db or pathlib.Path(tmp) / "pages.sqlite3"
+        engine = create_engine(f"sqlite:///{path}")
+        Base.metadata.create_all(engine)
+
+        with Session(engine) as session:
+            if not session.execute(select(Song.id).limit(1)).first():
+                build(session, args.songs)
+
+            for depth in args.depths:
+                cursor = cursor_at(session, depth, args.sort)
+                offset = best(
+                    args.repeat,
+                    lambda: offset_page(session, depth, args.limit, args.sort),
+                )
+                keyset = best(
+                    args.repeat,
+                    lambda: Song.GetPage(session, cursor, args.limit, sort=args.sort),
+                )
+                # Both must land on the same rows
+                assert [
+                    song.id
+                    for song in offset_page(session, depth, args.limit, args.sort)
+                ] == [
+                    song["id"]
+                    for song in Song.GetPage(
+                        session, cursor, args.limit, sort=args.sort
+                    )["data"]
+                ]
+                print(
+                    f"depth {depth:>9}: offset {offset * 1000:8.1f}ms,"
+                    f" keyset {keyset * 1000:8.1f}ms"
+                )
+
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Compare files/sec of the in process tag reader against the ffprobe subprocess path.
+"""
+
+import os
+import pathlib
+import subprocess
+import time
+
+import tap
+
+from PySongMan.lib import tag_reader
+from PySongMan.lib.probe import ffprobe, probe
+
+
+class Arguments(tap.Tap):
+
+    seed_path: str
+    limit: int = 500  # Maximum number of files to probe per strategy
+
+
+def collect(seed: pathlib.Path, limit: int) -> list[pathlib.Path]:
+    found = []
+    for root, _, files in os.walk(seed):
+        for name in files:
+            if pathlib.Path(name).suffix.lower() in (".mp3", ".mp4", ".m4a", ".ogg"):
+                found.append(pathlib.Path(root) / name)
+                if len(found) >= limit:
+                    return found
+    return found
+
+
+def bench(label, func, files):
+    failures = 0
+    start = time.perf_counter()
+    for element in files:
+        try:
+            func(element)
+        except (tag_reader.TagReaderError, subprocess.CalledProcessError, OSError):
+            failures += 1
+    elapsed = time.perf_counter() - start
+
+    print(
+        f"{label:>12}: {len(files)} files in {elapsed:.3f}s"
+        f" = {len(files) / elapsed:.1f} files/sec ({failures} failures)"
+    )
+    return elapsed
+
+
+def main():
+    args = Arguments().parse_args()
+    files = collect(pathlib.Path(args.seed_path), args.limit)
+    if not files:
+        raise RuntimeError(f"No audio files found under {args.seed_path}")
+
+    native = bench("tag_reader", tag_reader.read, files)
+    fallback = bench("probe", probe, files)
+    subproc = bench("ffprobe", ffprobe, files)
+
+    print(
+        f"tag_reader speedup: {subproc / native:.1f}x, probe speedup: {subproc / fallback:.1f}x"
+    )
+
+
+if __name__ == "__main__":
+    main()
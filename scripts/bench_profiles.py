@@ -0,0 +1,106 @@
+"""
+Measure how long a page of songs takes to load while an import is writing.
+
+A writer process bulk inserts songs batch after batch while the main process keeps loading
+pages the way `api.Songs.list` does. "legacy" is the old single engine setup, rollback journal
+and default pragmas on both sides, "profiles" is the bulk-import writer against the read-only
+UI pool.
+
+    python -m scripts.bench_profiles --songs 200000
+"""
+
+import logging
+import multiprocessing as mp
+import pathlib
+import statistics
+import tempfile
+import time
+
+import tap
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from PySongMan.lib.models import BULK_IMPORT, READ_ONLY, Base, Library, Song, connect
+from PySongMan.lib.writer import DEFAULT_BATCH, BatchWriter
+from scripts.bench_writer import make_records
+
+
+class Arguments(tap.Tap):
+
+    songs: int = 100_000
+    batch_size: int = DEFAULT_BATCH
+    limit: int = 100  # Songs per page
+
+
+def engine_for(url: str, mode: str, profile):
+    if mode == "legacy":
+        return create_engine(url, connect_args={"timeout": 15})
+    engine, _ = connect(url, profile=profile)
+    return engine
+
+
+def write(url: str, mode: str, library_id: int, args: Arguments, started):
+    engine = engine_for(url, mode, BULK_IMPORT)
+    with Session(engine) as session:
+        writer = BatchWriter(session, args.batch_size)
+        for record in make_records(library_id, args.songs):
+            if writer.add(record):
+                started.set()
+        writer.flush()
+    engine.dispose()
+
+
+def bench(mode: str, args: Arguments):
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{pathlib.Path(tmp) / 'bench.sqlite3'}"
+        setup = engine_for(url, mode, BULK_IMPORT)
+        Base.metadata.create_all(setup)
+        with Session(setup) as session:
+            library = Library(path="/music")
+            session.add(library)
+            session.commit()
+            library_id = library.id
+        setup.dispose()
+
+        ctx = mp.get_context("spawn")
+        started = ctx.Event()
+        writer = ctx.Process(target=write, args=(url, mode, library_id, args, started))
+        writer.start()
+        started.wait()
+
+        reader = engine_for(url, mode, READ_ONLY)
+        latencies, locked = [], 0
+        while writer.is_alive():
+            start = time.perf_counter()
+            try:
+                with Session(reader) as session:
+                    Song.GetPage(session, limit=args.limit)
+            except OperationalError:
+                locked += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+
+        writer.join()
+        reader.dispose()
+
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99)] if latencies else 0.0
+    print(
+        f"{mode:>9}: {len(latencies)} pages during the import,"
+        f" median {statistics.median(latencies or [0]) * 1000:.1f}ms,"
+        f" p99 {p99 * 1000:.1f}ms, max {max(latencies or [0]) * 1000:.1f}ms,"
+        f" {locked} failed on a lock"
+    )
+
+
+def main():
+    logging.basicConfig(level=logging.WARNING)
+    args = Arguments().parse_args()
+
+    for mode in ["legacy", "profiles"]:
+        bench(mode, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+Measure search-as-you-type latency of `Song.Search` on a large library.
+
+Titles, artists and albums are drawn from a made up vocabulary with a Zipf like spread, a few
+words are in a great many titles like "love" is in real libraries. Every query is a random
+title typed out one letter at a time, each prefix is timed as its own search.
+
+Songs are written with `Song.BulkInsert` so the build rate includes keeping the index up to
+date. `--db` keeps the library around for later runs.
+
+    python -m scripts.bench_search --songs 1000000 --db /tmp/search.sqlite3
+"""
+
+import itertools
+import logging
+import pathlib
+import random
+import statistics
+import tempfile
+import time
+
+import tap
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+
+from PySongMan.lib.models import Base, Library, Song
+
+SYLLABLES = [
+    a + b
+    for a, b in itertools.product(
+        "bcdfghklmnprstvz", ["a", "e", "i", "o", "u", "ou", "ai"]
+    )
+]
+GENRES = ["Rock", "Jazz", "Pop", "Metal", "Ambient", "Classical", "Hip-Hop", "Folk"]
+
+
+class Arguments(tap.Tap):
+
+    songs: int = 1_000_000
+    queries: int = 200  # Titles typed out
+    limit: int = 50  # Results per search
+    batch_size: int = 2000
+    db: str = ""  # Reuse this database instead of building one
+
+
+def vocabulary(rng: random.Random, size: int) -> tuple[list[str], list[float]]:
+    words = {
+        "".join(rng.choices(SYLLABLES, k=rng.randint(1, 3))) for _ in range(size * 2)
+    }
+    words = sorted(words)[:size]
+    rng.shuffle(words)
+    # Cumulative, `random.choices` would add up plain weights again on every call
+    return words, list(
+        itertools.accumulate(1 / (rank + 1) for rank in range(len(words)))
+    )
+
+
+def phrase(rng: random.Random, words, cum_weights, low: int, high: int) -> str:
+    picked = rng.choices(words, cum_weights=cum_weights, k=rng.randint(low, high))
+    return " ".join(picked).title()
+
+
+def build(
+    session: Session, count: int, batch_size: int, rng: random.Random
+) -> list[str]:
+    library = Library(path="/music")
+    session.add(library)
+    session.commit()
+
+    words, weights = vocabulary(rng, 20_000)
+    artists = [phrase(rng, words, None, 1, 3) for _ in range(count // 20 + 1)]
+    titles = []
+
+    start = time.perf_counter()
+    batch = []
+    for idx in range(count):
+        title = phrase(rng, words, weights, 1, 4)
+        artist = artists[idx // 20]
+        album = phrase(rng, words, weights, 1, 3)
+        titles.append(title)
+        batch.append(
+            dict(
+                name=title,
+                artist=artist,
+                size=idx,
+                length_seconds=idx % 600,
+                file_name=f"{idx}.mp3",
+                path=f"/music/{idx // 12}/{idx}.mp3",
+                codec="mp3",
+                format="mp3",
+                mtime_ns=idx,
+                inode=idx,
+                library_id=library.id,
+                tags=[
+                    ("title", title),
+                    ("artist", artist),
+                    ("album", album),
+                    ("genre", rng.choice(GENRES)),
+                    ("year", str(1960 + idx % 60)),
+                ],
+            )
+        )
+        if len(batch) >= batch_size:
+            Song.BulkInsert(session, batch)
+            session.commit()
+            batch = []
+    if batch:
+        Song.BulkInsert(session, batch)
+        session.commit()
+
+    elapsed = time.perf_counter() - start
+    print(f"Built {count} songs in {elapsed:.1f}s = {count / elapsed:.0f} rows/sec")
+    return titles
+
+
+def main():
+    logging.basicConfig(level=logging.WARNING)
+    args = Arguments().parse_args()
+    rng = random.Random(11)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.db or pathlib.Path(tmp) / "search.sqlite3"
+        engine = create_engine(f"sqlite:///{path}")
+        Base.metadata.create_all(engine)
+
+        with Session(engine) as session:
+            titles = session.execute(select(Song.name)).scalars().all()
+            if not titles:
+                titles = build(session, args.songs, args.batch_size, rng)
+
+            by_length: dict[int, list[float]] = {}
+            hits = []
+            for title in rng.sample(titles, args.queries):
+                for end in range(1, len(title) + 1):
+                    start = time.perf_counter()
+                    page = Song.Search(session, title[:end], limit=args.limit)
+                    by_length.setdefault(min(end, 8), []).append(
+                        time.perf_counter() - start
+                    )
+                hits.append(title in [song["name"] for song in page["data"]])
+
+        engine.dispose()
+
+    everything = sorted(timing for timings in by_length.values() for timing in timings)
+    print(
+        f"{len(everything)} searches: median {statistics.median(everything) * 1000:.1f}ms,"
+        f" p95 {everything[int(len(everything) * 0.95)] * 1000:.1f}ms,"
+        f" p99 {everything[int(len(everything) * 0.99)] * 1000:.1f}ms,"
+        f" max {everything[-1] * 1000:.1f}ms"
+    )
+    for length, timings in sorted(by_length.items()):
+        timings.sort()
+        label = f"{length}+" if length == 8 else str(length)
+        print(
+            f"  {label:>2} letters: median {statistics.median(timings) * 1000:6.1f}ms,"
+            f" p95 {timings[int(len(timings) * 0.95)] * 1000:6.1f}ms"
+        )
+    print(f"Full title found on the first page {sum(hits) / len(hits):.0%} of the time")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Compare write rows/sec of the single writer against sharded writing plus the ATTACH merge.
+
+Records are generated up front and fed straight to the writers, probing and normalizing are
+left out so only writing is measured. The sharded numbers include the merge.
+
+    python -m scripts.bench_shards --songs 200000 --shards 1 2 4 8
+"""
+
+import logging
+import pathlib
+import tempfile
+import time
+
+import tap
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from PySongMan.lib.importer import UNIT_SIZE, Unit, import_units
+from PySongMan.lib.models import Base, Library
+from PySongMan.lib.pipeline import Executor, Stage
+from PySongMan.lib.shards import ShardWriter
+from PySongMan.lib.writer import DEFAULT_BATCH
+from scripts.bench_writer import make_records
+
+
+class Arguments(tap.Tap):
+
+    songs: int = 100_000
+    shards: list[int] = [2, 4, 8]  # Write stage process counts to try
+    batch_size: int = DEFAULT_BATCH
+
+
+def units(library_id: int, count: int):
+    records = list(make_records(library_id, count))
+    return [
+        Unit(None, 1, records[idx : idx + UNIT_SIZE])
+        for idx in range(0, len(records), UNIT_SIZE)
+    ]
+
+
+def bench(label: str, shards: int, args: Arguments) -> float:
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{pathlib.Path(tmp) / 'bench.sqlite3'}")
+        Base.metadata.create_all(engine)
+
+        with Session(engine) as session:
+            library = Library(path="/music")
+            session.add(library)
+            session.commit()
+            work = units(library.id, args.songs)
+
+            stages, shard_dir = [], None
+            if shards:
+                shard_dir = pathlib.Path(tmp) / "shards"
+                shard_dir.mkdir()
+                stages = [
+                    Stage(
+                        "write",
+                        ShardWriter,
+                        (shard_dir, args.batch_size),
+                        Executor.PROCESS,
+                        shards,
+                    )
+                ]
+
+            start = time.perf_counter()
+            stats = import_units(
+                session,
+                library.id,
+                work,
+                stages,
+                args.batch_size,
+                shard_dir=shard_dir,
+            )
+            elapsed = time.perf_counter() - start
+
+        engine.dispose()
+
+    print(
+        f"{label:>9}: {stats.rows} songs in {elapsed:.2f}s"
+        f" = {stats.rows / elapsed:.0f} rows/sec"
+    )
+    return elapsed
+
+
+def main():
+    logging.basicConfig(level=logging.WARNING)
+    args = Arguments().parse_args()
+
+    single = bench("single", 0, args)
+    for shards in args.shards:
+        sharded = bench(f"shards:{shards}", shards, args)
+        print(f"shards:{shards} speedup: {single / sharded:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
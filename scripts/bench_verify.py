@@ -0,0 +1,122 @@
+"""
+Measure `integrity.verify_library` songs/sec and memory on a large library.
+
+Empty files stand in for songs, a share of them is then deleted or rewritten so the checker
+has work to apply. Building a million files takes a while, `--library` keeps them around.
+
+    python -m scripts.bench_verify --songs 1000000 --library /tmp/verify_bench
+"""
+
+import logging
+import pathlib
+import resource
+import tempfile
+import time
+
+import tap
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import Session
+
+from PySongMan.lib.integrity import CHUNK, DEFAULT_THREADS, verify_library
+from PySongMan.lib.models import Base, Library, Song
+
+# Files per directory
+ALBUM = 100
+
+
+class Arguments(tap.Tap):
+
+    songs: int = 200_000
+    vanished: float = 0.01  # Share of files deleted before verifying
+    changed: float = 0.01  # Share of files rewritten before verifying
+    threads: int = DEFAULT_THREADS
+    chunk: int = CHUNK
+    library: str = ""  # Keep the files here instead of a temp dir
+
+
+def peak_mb() -> int:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024
+
+
+def build(root: pathlib.Path, session: Session, library_id: int, count: int):
+    start = time.perf_counter()
+    rows = []
+    for idx in range(count):
+        album = root / f"album{idx // ALBUM:05d}"
+        if idx % ALBUM == 0:
+            album.mkdir(parents=True, exist_ok=True)
+        path = album / f"{idx % ALBUM:02d}.mp3"
+        path.touch()
+        stat = path.stat()
+        rows.append(
+            dict(
+                name=path.name,
+                artist="artist",
+                size=stat.st_size,
+                length_seconds=0,
+                file_name=path.name,
+                path=str(path),
+                codec="mp3",
+                format="mp3",
+                mtime_ns=stat.st_mtime_ns,
+                inode=stat.st_ino,
+                library_id=library_id,
+            )
+        )
+        if len(rows) >= 5000:
+            session.execute(insert(Song), rows)
+            rows = []
+    if rows:
+        session.execute(insert(Song), rows)
+    session.commit()
+    print(f"Built {count} songs in {time.perf_counter() - start:.1f}s")
+
+
+def damage(root: pathlib.Path, count: int, args: Arguments) -> tuple[int, int]:
+    vanished = changed = 0
+    for idx in range(count):
+        path = root / f"album{idx // ALBUM:05d}" / f"{idx % ALBUM:02d}.mp3"
+        bucket = (idx * 7919) % 10_000 / 10_000
+        if bucket < args.vanished:
+            path.unlink(missing_ok=True)
+            vanished += 1
+        elif bucket < args.vanished + args.changed:
+            path.write_bytes(b"changed")
+            changed += 1
+    return vanished, changed
+
+
+def main():
+    logging.basicConfig(level=logging.WARNING)
+    args = Arguments().parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = pathlib.Path(args.library or tmp) / "music"
+        engine = create_engine(f"sqlite:///{pathlib.Path(tmp) / 'verify.sqlite3'}")
+        Base.metadata.create_all(engine)
+
+        with Session(engine) as session:
+            library = Library(path=str(root))
+            session.add(library)
+            session.commit()
+
+            build(root, session, library.id, args.songs)
+            vanished, changed = damage(root, args.songs, args)
+            print(f"Deleted {vanished} and rewrote {changed} files")
+
+            before = peak_mb()
+            stats = verify_library(
+                session, library.id, str(root), args.chunk, args.threads
+            )
+
+        engine.dispose()
+
+    print(
+        f"Verified {stats.checked} songs in {stats.elapsed:.1f}s = {stats.rate:.0f} songs/sec,"
+        f" {stats.vanished} vanished, {stats.changed} changed"
+    )
+    print(f"Peak RSS {before} MB before verifying, {peak_mb()} MB after")
+
+
+if __name__ == "__main__":
+    main()
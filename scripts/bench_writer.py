@@ -0,0 +1,136 @@
+"""
+Compare rows/sec of per object ORM inserts against the Song.BulkInsert Core path.
+"""
+
+import pathlib
+import random
+import resource
+import tempfile
+import time
+
+import tap
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+
+from PySongMan.lib.models import Base, Library, Song, Tag
+from PySongMan.lib.tag_cache import TagCache
+
+GENRES = ["Rock", "Jazz", "Pop", "Metal", "Ambient", "Classical", "Hip-Hop"]
+ENCODERS = ["LAME3.100", "Lavf58.76.100", "iTunes 12.9"]
+
+
+class Arguments(tap.Tap):
+
+    songs: int = 20_000
+    batch_size: int = 2000
+
+
+def make_records(library_id: int, count: int):
+    rng = random.Random(7)
+    for idx in range(count):
+        artist = f"Artist {idx // 200}"
+        album = f"Album {idx // 12}"
+        yield dict(
+            name=f"Track {idx}",
+            artist=artist,
+            size=rng.randint(2_000_000, 9_000_000),
+            length_seconds=rng.randint(90, 600),
+            file_name=f"{idx}.mp3",
+            path=f"/music/{artist}/{album}/{idx}.mp3",
+            codec="mp3",
+            format="mp3",
+            mtime_ns=idx,
+            inode=idx,
+            library_id=library_id,
+            tags=[
+                ("artist", artist),
+                ("album", album),
+                ("title", f"Track {idx}"),
+                ("genre", rng.choice(GENRES)),
+                ("encoder", rng.choice(ENCODERS)),
+                ("track", str(idx % 12 + 1)),
+            ],
+        )
+
+
+def orm_insert(session: Session, records: list[dict]):
+    """
+    The importers' original per object path, minus the REPLACE churn.
+    """
+    known = {}
+    for record in records:
+        song = Song(**{key: value for key, value in record.items() if key != "tags"})
+        for pair in record["tags"]:
+            tag = known.get(pair)
+            if tag is None:
+                tag = session.execute(
+                    select(Tag).filter_by(name=pair[0], value=pair[1])
+                ).scalar_one_or_none() or Tag(name=pair[0], value=pair[1])
+                known[pair] = tag
+            song.tags.append(tag)
+        session.add(song)
+
+
+def bulk_insert(session: Session, records: list[dict]):
+    Song.BulkInsert(session, records)
+
+
+def cached_insert():
+    cache = TagCache()
+
+    def insert(session: Session, records: list[dict]):
+        Song.BulkInsert(session, records, cache)
+
+    insert.cache = cache
+    return insert
+
+
+def bench(label, func, args: Arguments):
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{pathlib.Path(tmp) / 'bench.sqlite3'}")
+        Base.metadata.create_all(engine)
+
+        with Session(engine) as session:
+            library = Library(path="/music")
+            session.add(library)
+            session.commit()
+            library_id = library.id
+
+            batch = []
+            start = time.perf_counter()
+            for record in make_records(library_id, args.songs):
+                batch.append(record)
+                if len(batch) >= args.batch_size:
+                    func(session, batch)
+                    session.commit()
+                    batch = []
+            if batch:
+                func(session, batch)
+                session.commit()
+            elapsed = time.perf_counter() - start
+
+        engine.dispose()
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024
+    print(
+        f"{label:>6}: {args.songs} songs in {elapsed:.2f}s"
+        f" = {args.songs / elapsed:.0f} rows/sec (peak RSS {peak} MB)"
+    )
+    return elapsed
+
+
+def main():
+    args = Arguments().parse_args()
+
+    bulk = bench("bulk", bulk_insert, args)
+    insert = cached_insert()
+    cached = bench("cached", insert, args)
+    print(f"tag cache hit rate: {insert.cache.stats().hit_rate:.1%}")
+    print(f"cached speedup over bulk: {bulk / cached:.1f}x")
+    orm = bench("orm", orm_insert, args)
+
+    print(f"bulk speedup: {orm / bulk:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
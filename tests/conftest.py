@@ -0,0 +1,102 @@
+import pytest
+from sqlalchemy import create_engine, select, func
+from sqlalchemy.orm import Session
+
+from PySongMan.lib import models
+from PySongMan.lib.models import Base, Library, Song
+from PySongMan.lib.walker import FileState
+from PySongMan.lib.writer import SongRecord
+
+
+@pytest.fixture
+def session():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with Session(engine) as db_session:
+        yield db_session
+    engine.dispose()
+
+
+@pytest.fixture
+def library(session, tmp_path):
+    record = Library(path=str(tmp_path))
+    session.add(record)
+    session.commit()
+    return record
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    # connect() caches its engines, every test gets its own database and pools
+    models.SA_ENGINES.clear()
+    yield f"sqlite:///{tmp_path / 'library.sqlite3'}"
+    for engine in models.SA_ENGINES.values():
+        engine.dispose()
+    models.SA_ENGINES.clear()
+
+
+def new_record(library_id, idx, tags=None) -> SongRecord:
+    return SongRecord(
+        name=f"song {idx}",
+        artist="artist",
+        size=100,
+        length_seconds=10,
+        file_name=f"{idx}.mp3",
+        path=f"/music/{idx}.mp3",
+        codec="mp3",
+        format="mp3",
+        mtime_ns=1,
+        inode=idx,
+        library_id=library_id,
+        tags=[("genre", "rock")] if tags is None else tags,
+    )
+
+
+def count_session_songs(session):
+    return session.execute(select(func.count(Song.id))).scalar_one()
+
+
+def add_session_song(session, library, path, **overrides):
+    state = FileState.From(path) if path.exists() else FileState(str(path), 1, 1, 1)
+    values = dict(
+        name=path.name,
+        artist="artist",
+        size=state.size,
+        length_seconds=1,
+        file_name=path.name,
+        path=str(path),
+        codec="mp3",
+        format="mp3",
+        mtime_ns=state.mtime_ns,
+        inode=state.inode,
+        library_id=library.id,
+    )
+    values.update(overrides)
+    song = Song(**values)
+    session.add(song)
+    session.flush()
+    return song
+
+
+@pytest.fixture
+def make_record():
+    """
+    make_record(library_id, idx, tags=None), a song record tagged genre=rock unless given tags
+    """
+    return new_record
+
+
+@pytest.fixture
+def count_songs():
+    """
+    count_songs(session), the number of songs stored
+    """
+    return count_session_songs
+
+
+@pytest.fixture
+def add_song():
+    """
+    add_song(session, library, path, **overrides), store a song for `path` matching its file
+    """
+    return add_session_song
@@ -0,0 +1,121 @@
+"""
+The import pipeline has to run in bounded memory however large the library is.
+
+A million synthetic entries are pushed through the real pipeline, normalizer and writer in a
+fresh process, only probing is canned. That takes minutes so it only runs with
+PYSONGMAN_SLOW_TESTS=1, PYSONGMAN_MEMORY_ENTRIES changes the number of entries.
+"""
+
+import multiprocessing as mp
+import os
+import resource
+
+import pytest
+
+from PySongMan.lib import models
+from PySongMan.lib.importer import UNIT_SIZE, Unit, import_units, normalizer
+from PySongMan.lib.models import BULK_IMPORT, Library, db_with
+from PySongMan.lib.pipeline import Executor, Stage
+from PySongMan.lib.walker import FileState
+
+ENTRIES = int(os.environ.get("PYSONGMAN_MEMORY_ENTRIES", 1_000_000))
+
+# Peak RSS allowed for the whole import process
+BUDGET_MB = 160
+
+# Growth allowed between a tenth of the way in and the end, the first few thousand rows warm
+# up SQLAlchemy's statement caches and SQLite's page cache
+GROWTH_MB = 16
+
+GENRES = ["Rock", "Jazz", "Pop", "Metal", "Ambient", "Classical", "Hip-Hop"]
+
+
+def peak_mb() -> int:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024
+
+
+def synthetic_units(count: int, marks: list):
+    for start in range(0, count, UNIT_SIZE):
+        if start >= count // 10 and not marks:
+            marks.append(peak_mb())
+
+        yield Unit(
+            None,
+            1,
+            [
+                FileState(
+                    f"/music/Artist {idx // 1000}/Album {idx // 10}/{idx % 10:02d} {idx}.mp3",
+                    4_000_000 + idx,
+                    idx,
+                    idx,
+                )
+                for idx in range(start, min(start + UNIT_SIZE, count))
+            ],
+        )
+
+
+def canned_prober():
+    def probe(unit: Unit) -> Unit:
+        items = []
+        for state in unit.items:
+            idx = state.inode
+            tags = {
+                "title": f"Track {idx}",
+                "artist": f"Artist {idx // 1000}",
+                "album": f"Album {idx // 10}",
+                "genre": GENRES[idx // 1000 % len(GENRES)],
+                "track": str(idx % 10 + 1),
+            }
+            result = {
+                "streams": [{"codec_name": "mp3", "tags": tags}],
+                "format": {
+                    "format_name": "mp3",
+                    "size": str(state.size),
+                    "duration": "215.5",
+                },
+            }
+            items.append((state, result))
+        return unit._replace(items=items)
+
+    return probe
+
+
+def run(db_path: str, count: int, results):
+    models.SA_ENGINES.clear()
+    marks = []
+    # Opened the way run_import opens it
+    with db_with(db_path, create=True, profile=BULK_IMPORT) as session:
+        library = Library(path="/music")
+        session.add(library)
+        session.commit()
+
+        stats = import_units(
+            session,
+            library.id,
+            synthetic_units(count, marks),
+            [
+                Stage("probe", canned_prober, (), Executor.THREAD, 2),
+                Stage("normalize", normalizer, (library.id,), Executor.THREAD, 1),
+            ],
+        )
+
+    results.put((stats.rows, marks[0], peak_mb()))
+
+
+@pytest.mark.skipif(
+    not os.environ.get("PYSONGMAN_SLOW_TESTS"), reason="set PYSONGMAN_SLOW_TESTS=1"
+)
+def test_import_runs_in_bounded_memory(tmp_path):
+    context = mp.get_context("spawn")
+    results = context.Queue()
+    worker = context.Process(
+        target=run,
+        args=(f"sqlite:///{tmp_path / 'library.sqlite3'}", ENTRIES, results),
+    )
+    worker.start()
+    rows, early, peak = results.get()
+    worker.join()
+
+    assert rows == ENTRIES
+    assert peak < BUDGET_MB, f"peak RSS {peak} MB"
+    assert peak - early < GROWTH_MB, f"grew from {early} MB to {peak} MB"
@@ -0,0 +1,58 @@
+"""
+Tests for the Core bulk ingestion path
+"""
+
+from sqlalchemy import select, func
+
+from PySongMan.lib.models import Song, Song_Tag, Tag
+
+
+def count(session, table):
+    return session.execute(select(func.count()).select_from(table)).scalar_one()
+
+
+def test_bulk_insert_links_tags(session, library, make_record):
+    records = [
+        make_record(library.id, 1, [("genre", "rock"), ("album", "one")]),
+        make_record(library.id, 2, [("genre", "rock"), ("album", "two")]),
+        make_record(library.id, 3, []),
+    ]
+
+    song_ids = Song.BulkInsert(session, records)
+
+    assert len(song_ids) == 3
+    assert count(session, Song) == 3
+    assert count(session, Tag) == 3
+    assert count(session, Song_Tag) == 4
+    song = Song.GetById(session, song_ids[1])
+    assert sorted((tag.name, tag.value) for tag in song.tags) == [
+        ("album", "two"),
+        ("genre", "rock"),
+    ]
+
+
+def test_tag_ids_are_stable(session, library, make_record):
+    first = Tag.BulkIds(session, [("genre", "rock")])
+    Song.BulkInsert(session, [make_record(library.id, 1, [("genre", "rock")])])
+    second = Tag.BulkIds(session, [("genre", "rock"), ("genre", "jazz")])
+
+    assert second[("genre", "rock")] == first[("genre", "rock")]
+    assert count(session, Tag) == 2
+
+
+def test_reimport_replaces_in_place(session, library, make_record):
+    [original] = Song.BulkInsert(
+        session, [make_record(library.id, 1, [("genre", "rock")])]
+    )
+    record = make_record(library.id, 1, [("genre", "jazz"), ("genre", "jazz")])
+    record["name"] = "renamed"
+
+    [updated] = Song.BulkInsert(session, [record])
+
+    assert updated == original
+    assert count(session, Song) == 1
+    assert count(session, Song_Tag) == 1
+    session.expire_all()
+    song = Song.GetById(session, updated)
+    assert song.name == "renamed"
+    assert [tag.value for tag in song.tags] == ["jazz"]
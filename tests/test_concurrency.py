@@ -0,0 +1,98 @@
+"""
+Tests for the adaptive concurrency controller
+"""
+
+import asyncio
+import threading
+import time
+
+from PySongMan.lib.concurrency import MIN_WINDOW, AIMDController
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def feed(controller, clock, latency, ok=True):
+    """
+    Complete one window of probes
+    """
+    for _ in range(max(controller.limit, MIN_WINDOW)):
+        clock.now += latency / controller.limit
+        controller.record(latency, ok)
+
+
+def test_grows_while_latency_is_flat():
+    clock = Clock()
+    controller = AIMDController(initial=2, maximum=6, clock=clock)
+
+    for _ in range(10):
+        feed(controller, clock, 0.01)
+
+    assert controller.limit == 6
+    stats = controller.stats()
+    assert stats.latency == 0.01
+    assert stats.throughput > 0
+
+
+def test_backs_off_on_latency_and_errors():
+    clock = Clock()
+    controller = AIMDController(initial=16, clock=clock)
+
+    feed(controller, clock, 0.01)
+    assert controller.limit == 17
+
+    feed(controller, clock, 0.1)
+    assert controller.limit == 8
+
+    feed(controller, clock, 0.01, ok=False)
+    assert controller.limit == 4
+    assert controller.stats().error_rate == 1.0
+
+    for _ in range(5):
+        feed(controller, clock, 0.01, ok=False)
+    assert controller.limit == controller.minimum
+
+
+def test_thread_slots_respect_limit():
+    controller = AIMDController(initial=2, maximum=2)
+    peak = 0
+    lock = threading.Lock()
+
+    def probe():
+        nonlocal peak
+        with controller.slot():
+            with lock:
+                peak = max(peak, controller.in_flight)
+            time.sleep(0.01)
+
+    threads = [threading.Thread(target=probe) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert peak == 2
+    assert controller.in_flight == 0
+
+
+def test_async_slots_respect_limit():
+    controller = AIMDController(initial=3, maximum=3)
+    peak = 0
+
+    async def probe():
+        nonlocal peak
+        async with controller.aslot():
+            peak = max(peak, controller.in_flight)
+            await asyncio.sleep(0.01)
+
+    async def main():
+        await asyncio.gather(*(probe() for _ in range(10)))
+
+    asyncio.run(main())
+    assert peak == 3
+    assert controller.in_flight == 0
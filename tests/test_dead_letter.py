@@ -0,0 +1,176 @@
+"""
+Tests for failed probe retries and dead letters
+"""
+
+import asyncio
+import datetime as DT
+import os
+import time
+
+import pytest
+from sqlalchemy import select
+
+from PySongMan.lib import dead_letter, importer, probe
+from PySongMan.lib.dead_letter import (
+    PERMANENT_AFTER,
+    ProbeFailed,
+    RetryScheduler,
+    backoff,
+)
+from PySongMan.lib.importer import RETRYING, Prober, Unit
+from PySongMan.lib.models import DeadLetter
+from PySongMan.lib.walker import FileState
+from PySongMan.lib.writer import BatchWriter
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_backoff_doubles_up_to_cap():
+    assert [backoff(attempt, 1, 5) for attempt in range(1, 5)] == [1, 2, 4, 5]
+
+
+def test_scheduler_backs_off_and_gives_up():
+    clock = Clock()
+    retries = RetryScheduler(max_attempts=3, base_delay=1, clock=clock)
+    state = FileState("/music/a.mp3", 1, 1, 1)
+
+    assert retries.failed(state, OSError("flaky")) is True
+    assert retries.take() is None
+    assert retries.next_due() == 1
+
+    clock.now = 1
+    assert retries.take() == state
+    assert retries.failed(state, OSError("flaky")) is True
+    clock.now = 2.5
+    assert retries.take() is None
+
+    clock.now = 3
+    assert retries.take() == state
+    assert retries.failed(state, OSError("flaky")) is False
+    assert len(retries) == 0
+
+
+def test_hung_ffprobe_is_retried(tmp_path, monkeypatch):
+    # An ffprobe stuck on a stalled mount
+    fake = tmp_path / "bin" / "ffprobe"
+    fake.parent.mkdir()
+    fake.write_text("#!/bin/sh\nsleep 30\n")
+    fake.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{fake.parent}{os.pathsep}{os.environ['PATH']}")
+    monkeypatch.setattr(probe, "PROBE_TIMEOUT", 0.2)
+
+    song = tmp_path / "song.mp3"
+    song.write_bytes(b"not really audio")
+    prober = Prober(library_id=1)
+
+    start = time.monotonic()
+    assert prober.probe(FileState.From(str(song))) is RETRYING
+    assert time.monotonic() - start < 5
+
+
+def test_timed_out_affprobe_is_killed(tmp_path, monkeypatch):
+    pid_file = tmp_path / "pid"
+    fake = tmp_path / "bin" / "ffprobe"
+    fake.parent.mkdir()
+    fake.write_text(f"#!/bin/sh\necho $$ > {pid_file}\nexec sleep 30\n")
+    fake.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{fake.parent}{os.pathsep}{os.environ['PATH']}")
+
+    async def timed_out():
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(probe.affprobe(tmp_path / "song.mp3"), timeout=0.5)
+
+    asyncio.run(timed_out())
+
+    with pytest.raises(ProcessLookupError):
+        os.kill(int(pid_file.read_text()), 0)
+
+
+def test_unexpected_probe_error_costs_one_file(monkeypatch):
+    flaky = FileState("/music/flaky.mp3", 1, 1, 1)
+    odd = FileState("/music/odd.ogg", 1, 1, 1)
+    failures = {flaky.path: OSError("stalled"), odd.path: ValueError("odd output")}
+
+    def fake_probe(path, container=None):
+        if path in failures:
+            raise failures[path]
+        return {"path": path}
+
+    monkeypatch.setattr(importer, "probe", fake_probe)
+    prober = Prober(library_id=1)
+    prober.retries = RetryScheduler(base_delay=0)
+
+    # The flaky file is held for a retry, the odd one settled for good
+    assert prober(Unit("/music", 1, [(flaky, None), (odd, None)])) is None
+    del failures[flaky.path]
+    [unit] = prober.poll()
+
+    assert unit.items[0] == (flaky, {"path": flaky.path})
+    assert isinstance(unit.items[1], ProbeFailed)
+    assert unit.items[1].permanent
+    assert unit.items[1].error == "ValueError: odd output"
+
+
+def test_scheduler_caps_concurrent_retries():
+    clock = Clock()
+    retries = RetryScheduler(base_delay=1, max_concurrent=2, clock=clock)
+    states = [FileState(f"/music/{idx}.mp3", 1, 1, 1) for idx in range(3)]
+    for state in states:
+        retries.failed(state, OSError("flaky"))
+
+    clock.now = 1
+    first, second = retries.take(), retries.take()
+    assert retries.take() is None
+
+    retries.done(first)
+    assert retries.take() is not None
+    assert len(retries) == 2
+    assert second is not None
+
+
+def test_letters_back_off_between_imports(session, library):
+    now = DT.datetime(2024, 1, 1)
+    failure = ProbeFailed(library.id, "/music/a.mp3", 10, 20, "OSError: flaky")
+
+    dead_letter.record_failures(session, [failure], now=now)
+    letter = session.scalars(select(DeadLetter)).one()
+    assert letter.attempts == 1
+    assert letter.next_attempt == now + dead_letter.IMPORT_BASE_DELAY
+
+    state = FileState(failure.path, failure.size, failure.mtime_ns, 1)
+    assert dead_letter.is_skipped(dead_letter.skipped(session, library.id, now), state)
+    # Edited files are retried right away
+    assert not dead_letter.is_skipped(
+        dead_letter.skipped(session, library.id, now), state._replace(mtime_ns=21)
+    )
+    later = letter.next_attempt + DT.timedelta(seconds=1)
+    assert dead_letter.skipped(session, library.id, later) == {}
+
+    for _ in range(PERMANENT_AFTER - 1):
+        dead_letter.record_failures(session, [failure], now=now)
+    assert letter.permanent is True
+    assert dead_letter.skipped(session, library.id, DT.datetime.max) != {}
+
+    dead_letter.record_failures(session, [failure._replace(mtime_ns=21)], now=now)
+    assert (letter.attempts, letter.permanent) == (1, False)
+
+
+def test_writer_records_and_clears_letters(session, library, make_record):
+    library_id = library.id
+    writer = BatchWriter(session)
+    writer.fail(ProbeFailed(library_id, "/music/1.mp3", 1, 1, "OSError: flaky"))
+    writer.flush()
+
+    assert session.scalars(select(DeadLetter.path)).all() == ["/music/1.mp3"]
+
+    writer = BatchWriter(session)
+    writer.add(make_record(library_id, 1))
+    writer.flush()
+
+    assert session.scalars(select(DeadLetter)).all() == []
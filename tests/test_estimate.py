@@ -0,0 +1,123 @@
+"""
+Tests for import estimates and live progress
+"""
+
+import random
+import time
+
+import pytest
+
+from PySongMan.lib import models
+from PySongMan.lib.estimate import (
+    Estimate,
+    LibraryCount,
+    Progress,
+    count_library,
+    duration,
+)
+from PySongMan.lib.importer import estimate_import
+from PySongMan.lib.normalize import SUFFIXES
+from PySongMan.lib.synthetic import generate_library
+
+
+@pytest.fixture
+def seed(tmp_path):
+    root = tmp_path / "music"
+    generate_library(root, files=60, depth=2, seed=3)
+    (root / "notes.txt").write_text("not music")
+    return root
+
+
+def test_count_library(seed):
+    counted, sample = count_library(
+        seed, SUFFIXES, 4, sample_size=2, rng=random.Random(1)
+    )
+
+    assert counted.files == 60
+    assert counted.bytes == sum(
+        path.stat().st_size for path in seed.rglob("*") if path.suffix in SUFFIXES
+    )
+    assert counted.units >= counted.files // 4
+    # Two whole directories, cut to a unit each
+    assert len({state.path.rsplit("/", 1)[0] for state in sample}) == 2
+    assert len(sample) <= 8
+
+
+def test_count_library_excludes(seed):
+    album = next(path for path in seed.rglob("*.mp3")).parent
+
+    counted, _ = count_library(seed, None, 100, exclude=lambda d: d == str(album))
+
+    assert counted.files == 61 - len(list(album.iterdir()))
+
+
+def test_estimate_projection():
+    estimate = Estimate(
+        LibraryCount(100, 1000, 10**9, 100, 2.0),
+        sampled_directories=10,
+        sampled=100,
+        dropped=0.1,
+        seconds_per_file=0.04,
+        cpu_per_file=0.01,
+        probe_workers=4,
+        cores=8,
+        write_rate=300.0,
+        db_bytes_per_song=2000.0,
+        local_tags=50,
+        shared_tags=20,
+    )
+
+    assert estimate.songs == 900
+    assert estimate.probe_seconds == pytest.approx(10.0)
+    assert estimate.seconds == pytest.approx(10.0)
+    assert estimate.db_bytes == 1_800_000
+    assert estimate.tags == 520
+    # One core runs everything back to back
+    assert estimate._replace(cores=1).seconds == pytest.approx(13.0)
+
+
+def test_estimate_import(seed, tmp_path):
+    models.SA_ENGINES.clear()
+
+    estimate = estimate_import(seed, sample_size=3, rng=random.Random(2))
+
+    assert estimate.count.files == 60
+    assert estimate.sampled_directories == 3
+    assert estimate.songs == 60
+    assert estimate.seconds > 0
+    assert estimate.db_bytes > 0
+    assert estimate.tags >= estimate.shared_tags > 0
+    # Nothing is written next to the library
+    assert not list(tmp_path.glob("*.sqlite3"))
+
+
+def test_progress_eta(monkeypatch):
+    progress = Progress(seconds_per_unit=2.0)
+    assert progress.eta is None
+    assert "counting" in progress.report()
+
+    progress.total = 10
+    assert progress.eta == 20.0
+
+    monkeypatch.setattr(Progress, "elapsed", property(lambda self: 8.0))
+    progress.advance(4)
+    assert progress.eta == 12.0
+    assert progress.report() == "4/10 units (40.0%), ETA 0:00:12"
+
+
+def test_progress_counts_in_background(seed):
+    progress = Progress()
+    progress.count_in_background(seed, SUFFIXES, 100)
+
+    for _ in range(200):
+        if progress.total is not None:
+            break
+        time.sleep(0.01)
+
+    counted, _ = count_library(seed, SUFFIXES, 100)
+    assert progress.total == counted.units
+
+
+def test_duration():
+    assert duration(3725.4) == "1:02:05"
+    assert duration(None) == "?"
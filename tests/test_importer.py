@@ -0,0 +1,199 @@
+"""
+Tests for the pipeline importer
+"""
+
+import asyncio
+
+import pytest
+from sqlalchemy import select, func
+
+from PySongMan.lib import importer
+from PySongMan.lib.importer import Prober, Unit, parse_executor, run_import
+from PySongMan.lib.journal import Journal
+from PySongMan.lib.models import Library, Song, db_with
+from PySongMan.lib.pipeline import Executor
+from PySongMan.lib.walker import FileState
+from PySongMan.lib.synthetic import (
+    flac_file,
+    id3v2_tag,
+    id3v2_text,
+    mp3_file,
+    ogg_vorbis_file,
+)
+
+
+@pytest.fixture
+def seed(tmp_path):
+    root = tmp_path / "music"
+    for artist in range(3):
+        album = root / f"artist{artist}" / "album"
+        album.mkdir(parents=True)
+        for track in range(4):
+            tags = id3v2_tag(
+                id3v2_text("TIT2", f"track {track}"),
+                id3v2_text("TPE1", f"artist {artist}"),
+            )
+            (album / f"{track}.mp3").write_bytes(mp3_file(frames=5, id3v2=tags))
+        (album / "bonus.ogg").write_bytes(ogg_vorbis_file({"TITLE": "bonus"}))
+        (album / "cover.jpg").write_bytes(b"\xff\xd8\xff")
+    return root
+
+
+def count_imported(db_path):
+    with db_with(db_path) as session:
+        return session.execute(select(func.count(Song.id))).scalar_one()
+
+
+def test_parse_executor():
+    assert parse_executor("asyncio:32") == (Executor.ASYNCIO, 32)
+    assert parse_executor("process:auto")[0] is Executor.PROCESS
+    assert parse_executor("thread")[1] >= 1
+
+
+def test_probe_concurrency_is_per_file(monkeypatch):
+    in_flight = peak = 0
+
+    async def aprobe(path, container):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        assert in_flight <= prober.controller.limit
+        # Every file takes as long, however large its unit
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return {"path": path}
+
+    monkeypatch.setattr(importer, "aprobe", aprobe)
+    prober = Prober(library_id=1, concurrency=32)
+    initial = prober.controller.limit
+
+    def unit(size):
+        return Unit(
+            None,
+            1,
+            [(FileState(f"/music/{idx}.mp3", 1, 1, idx), "mp3") for idx in range(size)],
+        )
+
+    async def main():
+        for size in [1, 60, 2, 80, 1, 40]:
+            done = await prober.acall(unit(size))
+            assert len(done.items) == size
+
+    asyncio.run(main())
+    # A unit's files are probed side by side, and large units don't read as congestion
+    assert peak > 1
+    # Sampled per unit, six units would not even fill a window
+    assert prober.controller.limit > initial + 5
+
+
+@pytest.mark.parametrize("probe", ["thread:2", "process:2", "asyncio:8"])
+def test_import(seed, db_path, probe):
+    stats = run_import(
+        seed, db_path, executors={"probe": parse_executor(probe)}, batch_size=4
+    )
+
+    assert stats.rows == 15
+    assert count_imported(db_path) == 15
+    with db_with(db_path) as session:
+        song = session.scalars(
+            select(Song).where(Song.path == str(seed / "artist1" / "album" / "2.mp3"))
+        ).one()
+        assert (song.name, song.artist) == ("track 2", "artist 1")
+
+
+@pytest.mark.parametrize("write", ["thread:2", "process:2"])
+def test_sharded_import(seed, db_path, tmp_path, write):
+    executors = {"probe": parse_executor("thread:2"), "write": parse_executor(write)}
+
+    stats = run_import(seed, db_path, executors=executors, shard_dir=str(tmp_path))
+
+    assert stats.rows == 15
+    assert count_imported(db_path) == 15
+    with db_with(db_path) as session:
+        song = session.scalars(
+            select(Song).where(Song.path == str(seed / "artist1" / "album" / "2.mp3"))
+        ).one()
+        assert (song.name, song.artist) == ("track 2", "artist 1")
+        assert {tag.name for tag in song.tags} >= {"title", "artist"}
+    # The shard directory is cleaned up
+    assert list(tmp_path.glob("pysongman-shards-*")) == []
+
+
+def test_import_sniffs_containers(seed, db_path):
+    album = seed / "artist0" / "album"
+    (album / "lossless.flac").write_bytes(flac_file({"TITLE": "lossless"}))
+    # Named for the wrong container
+    (album / "mislabeled.ogg").write_bytes(mp3_file(frames=5))
+    (album / "folder.mp3").write_bytes(b"\xff\xd8\xff\xe0\x00\x10JFIF")
+    (album / "garbage.mp3").write_bytes(b"not an audio file at all")
+
+    stats = run_import(seed, db_path, executors={"probe": parse_executor("thread:2")})
+
+    assert stats.rows == 17
+    assert (stats.skipped, stats.unknown) == (1, 1)
+    with db_with(db_path) as session:
+        formats = dict(session.execute(select(Song.file_name, Song.format)).all())
+    assert formats["lossless.flac"] == "flac"
+    assert formats["mislabeled.ogg"] == "mp3"
+    assert "garbage.mp3" not in formats
+
+
+def test_incremental_rescan(seed, db_path):
+    threads = {"probe": parse_executor("thread:2")}
+    run_import(seed, db_path, executors=threads)
+
+    (seed / "artist0" / "album" / "0.mp3").unlink()
+    (seed / "artist0" / "album" / "new.mp3").write_bytes(mp3_file(frames=5))
+
+    stats = run_import(seed, db_path, incremental=True, executors=threads)
+
+    assert stats.rows == 1
+    assert count_imported(db_path) == 15
+
+
+def test_relative_seed_is_resolved(seed, db_path, monkeypatch):
+    threads = {"probe": parse_executor("thread:2")}
+    monkeypatch.chdir(seed.parent)
+    run_import("music", db_path, executors=threads)
+    # The same tree by its absolute path is the same library
+    run_import(seed, db_path, incremental=True, executors=threads)
+
+    with db_with(db_path) as session:
+        assert session.scalars(select(Library.path)).all() == [str(seed)]
+        paths = session.scalars(select(Song.path)).all()
+    assert len(paths) == 15
+    assert all(path.startswith(f"{seed}/") for path in paths)
+
+
+def test_incremental_rescan_missing_root(seed, db_path):
+    threads = {"probe": parse_executor("thread:2")}
+    run_import(seed, db_path, executors=threads)
+    before = count_imported(db_path)
+
+    # An unmounted drive
+    seed.rename(seed.with_name("unmounted"))
+    stats = run_import(seed, db_path, incremental=True, executors=threads)
+
+    assert stats.rows == 0
+    assert count_imported(db_path) == before
+
+
+def test_resume_skips_checkpointed_directories(seed, db_path):
+    threads = {"probe": parse_executor("thread:2")}
+    done = str(seed / "artist0" / "album")
+
+    # An import that died after checkpointing one directory
+    with db_with(db_path, create=True) as session:
+        library = Library(path=str(seed))
+        session.add(library)
+        session.commit()
+        journal = Journal.Start(session, library.id)
+        Journal.Checkpoint(session, journal.run_id, [done], 0)
+        session.commit()
+
+    stats = run_import(seed, db_path, resume=True, executors=threads)
+
+    assert stats.rows == 10
+    with db_with(db_path) as session:
+        paths = session.scalars(select(Song.path)).all()
+    assert not any(path.startswith(done) for path in paths)
@@ -0,0 +1,97 @@
+"""
+Tests for the library integrity checker
+"""
+
+import contextlib
+import threading
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+
+from PySongMan.lib.integrity import Status, Verifier, check, verify_library
+from PySongMan.lib.manifest import Change, FileState, Manifest
+from PySongMan.lib.models import Base, Library, Song
+
+
+def make_library(add_song, session, library, root):
+    root.mkdir(exist_ok=True)
+    paths = {}
+    for name in ["same", "gone", "edited", "locked"]:
+        path = root / f"{name}.mp3"
+        path.write_bytes(b"x" * 10)
+        paths[name] = path
+        add_song(session, library, path)
+    session.commit()
+
+    paths["gone"].unlink()
+    paths["edited"].write_bytes(b"x" * 20)
+    return paths
+
+
+def test_check(tmp_path):
+    path = tmp_path / "song.mp3"
+    path.write_bytes(b"x")
+    state = FileState.From(path)
+
+    assert check(*state) is Status.OK
+    assert check(state.path, 2, state.mtime_ns, state.inode) is Status.CHANGED
+    assert check(str(tmp_path / "missing.mp3"), 1, 1, 1) is Status.VANISHED
+    assert check(str(path / "child.mp3"), 1, 1, 1) is Status.VANISHED
+
+
+def test_verify_library(session, library, tmp_path, add_song):
+    paths = make_library(add_song, session, library, tmp_path / "music")
+
+    # Chunks of one exercise the keyset walk
+    stats = verify_library(session, library.id, str(tmp_path / "music"), chunk=1)
+
+    assert (stats.checked, stats.vanished, stats.changed) == (4, 1, 1)
+    remaining = session.execute(select(Song.path, Song.mtime_ns)).all()
+    assert str(paths["gone"]) not in {path for path, _ in remaining}
+    # Flagged for the next rescan
+    manifest = Manifest.Load(session, library.id)
+    edited = FileState.From(paths["edited"])
+    assert manifest.check(edited) is Change.CHANGED
+    assert manifest.check(FileState.From(paths["same"])) is Change.UNCHANGED
+
+
+def test_missing_root_is_left_alone(session, library, tmp_path, add_song):
+    make_library(add_song, session, library, tmp_path / "music")
+
+    stats = verify_library(session, library.id, str(tmp_path / "unmounted"))
+
+    assert stats.checked == 0
+    assert len(Song.GetAll(session)) == 4
+
+
+def test_stop(session, library, tmp_path, add_song):
+    make_library(add_song, session, library, tmp_path / "music")
+    stop = threading.Event()
+    stop.set()
+
+    assert verify_library(session, library.id, stop=stop, chunk=1).checked == 0
+
+
+def test_verifier_thread(tmp_path, add_song):
+    engine = create_engine(f"sqlite:///{tmp_path / 'library.sqlite3'}")
+    Base.metadata.create_all(engine)
+    root = tmp_path / "music"
+    with Session(engine) as session:
+        library = Library(path=str(root))
+        session.add(library)
+        session.commit()
+        make_library(add_song, session, library, root)
+        library_id = library.id
+
+    @contextlib.contextmanager
+    def get_db():
+        with Session(engine) as session:
+            yield session
+
+    verifier = Verifier(get_db, {str(root): library_id})
+    verifier.start()
+    verifier.join(5)
+    engine.dispose()
+
+    [stats] = verifier.results
+    assert (stats.vanished, stats.changed) == (1, 1)
@@ -0,0 +1,60 @@
+"""
+Tests for the import checkpoint journal
+"""
+
+from sqlalchemy import select
+
+from PySongMan.lib.journal import ABANDONED, COMPLETE, DirectoryDone, Journal
+from PySongMan.lib.models import ImportCheckpoint, ImportRun
+from PySongMan.lib.writer import BatchWriter
+
+
+def test_checkpoints_commit_with_their_batch(session, library, make_record):
+    library_id = library.id
+    journal = Journal.Start(session, library_id)
+    writer = BatchWriter(session, batch_size=10, run_id=journal.run_id)
+
+    writer.add(make_record(library_id, 1))
+    writer.mark(DirectoryDone("/music/a"))
+    # Nothing is journaled before the songs it vouches for are committed
+    assert session.scalars(select(ImportCheckpoint)).all() == []
+
+    writer.flush()
+
+    resumed = Journal.Start(session, library_id, resume=True)
+    assert resumed.run_id == journal.run_id
+    assert resumed.is_complete("/music/a")
+    assert session.get(ImportRun, journal.run_id).rows == 1
+
+
+def test_directory_waits_for_every_part(session, library, make_record, count_songs):
+    library_id = library.id
+    journal = Journal.Start(session, library_id)
+
+    writer = BatchWriter(session, batch_size=1, run_id=journal.run_id)
+    writer.add(make_record(library_id, 1))
+    writer.mark(DirectoryDone("/music/a", parts=2))
+    writer.add(make_record(library_id, 2))
+    writer.mark(DirectoryDone("/music/b"))
+    writer.flush()
+
+    resumed = Journal.Start(session, library_id, resume=True)
+    assert not resumed.is_complete("/music/a")
+    assert resumed.is_complete("/music/b")
+    assert count_songs(session) == 2
+
+
+def test_fresh_start_abandons_and_finish_completes(session, library):
+    library_id = library.id
+    first = Journal.Start(session, library_id)
+    second = Journal.Start(session, library_id)
+
+    assert session.get(ImportRun, first.run_id).status == ABANDONED
+
+    Journal.Finish(session, second.run_id)
+    assert session.get(ImportRun, second.run_id).status == COMPLETE
+
+    # Nothing left to resume, a new run is started instead
+    third = Journal.Start(session, library_id, resume=True)
+    assert third.run_id not in (first.run_id, second.run_id)
+    assert len(third) == 0
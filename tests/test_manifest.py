@@ -0,0 +1,103 @@
+"""
+Tests for incremental rescans
+"""
+
+import os
+
+from sqlalchemy import select, func
+
+from PySongMan.lib.manifest import Change, FileState, Manifest, delete_songs, scan
+from PySongMan.lib.models import Song, Song_Tag, Tag
+
+
+def test_check_states(session, library, tmp_path, add_song):
+    same = tmp_path / "same.mp3"
+    same.write_bytes(b"x" * 10)
+    add_song(session, library, same)
+    add_song(session, library, tmp_path / "edited.mp3", size=999)
+
+    manifest = Manifest.Load(session, library.id)
+
+    assert len(manifest) == 2
+    assert manifest.check(FileState.From(same)) is Change.UNCHANGED
+    assert (
+        manifest.check(FileState(str(tmp_path / "edited.mp3"), 1, 1, 1))
+        is Change.CHANGED
+    )
+    assert manifest.check(FileState(str(tmp_path / "new.mp3"), 1, 1, 1)) is Change.NEW
+
+
+def test_legacy_rows_are_changed(session, library, tmp_path, add_song):
+    legacy = tmp_path / "legacy.mp3"
+    legacy.write_bytes(b"x")
+    add_song(session, library, legacy, mtime_ns=0)
+
+    manifest = Manifest.Load(session, library.id)
+
+    assert manifest.check(FileState.From(legacy)) is Change.CHANGED
+
+
+def test_scan_plan(session, library, tmp_path, add_song):
+    (tmp_path / "artist" / "album").mkdir(parents=True)
+    kept = tmp_path / "artist" / "album" / "kept.mp3"
+    kept.write_bytes(b"kept")
+    changed = tmp_path / "artist" / "album" / "changed.ogg"
+    changed.write_bytes(b"changed")
+    added = tmp_path / "artist" / "album" / "added.mp4"
+    added.write_bytes(b"added")
+    (tmp_path / "artist" / "album" / "cover.jpg").write_bytes(b"jpg")
+
+    add_song(session, library, kept)
+    changed_song = add_song(session, library, changed, size=1)
+    gone_song = add_song(session, library, tmp_path / "gone.mp3")
+
+    plan = scan(Manifest.Load(session, library.id), tmp_path, (".mp3", ".mp4", ".ogg"))
+
+    assert sorted(state.path for state in plan.to_probe) == sorted(
+        [str(changed), str(added)]
+    )
+    assert sorted(plan.stale_ids) == sorted([changed_song.id, gone_song.id])
+    assert plan.unchanged == 1
+
+
+def test_scan_keeps_unlisted_directories(
+    session, library, tmp_path, monkeypatch, add_song
+):
+    (tmp_path / "locked").mkdir()
+    (tmp_path / "locked-out").mkdir()
+    locked = add_song(session, library, tmp_path / "locked" / "song.mp3")
+    # Shares a prefix with the unlisted directory but is not under it
+    gone = add_song(session, library, tmp_path / "locked-out" / "song.mp3")
+    scandir = os.scandir
+
+    def refuse(path):
+        if path == str(tmp_path / "locked"):
+            raise PermissionError(path)
+        return scandir(path)
+
+    monkeypatch.setattr(os, "scandir", refuse)
+
+    plan = scan(Manifest.Load(session, library.id), tmp_path, (".mp3",))
+
+    assert plan.stale_ids == [gone.id]
+    assert locked.id not in plan.stale_ids
+
+
+def test_scan_missing_root(session, library, tmp_path, add_song):
+    add_song(session, library, tmp_path / "unmounted" / "song.mp3")
+
+    plan = scan(Manifest.Load(session, library.id), tmp_path / "unmounted", (".mp3",))
+
+    assert plan == ([], [], 0)
+
+
+def test_delete_songs_in_chunks(session, library, tmp_path, add_song):
+    songs = [add_song(session, library, tmp_path / f"{idx}.mp3") for idx in range(7)]
+    songs[0].tags.append(Tag(name="genre", value="rock"))
+    session.flush()
+
+    deleted = delete_songs(session, [song.id for song in songs[:5]], chunk=2)
+
+    assert deleted == 5
+    assert session.execute(select(func.count(Song.id))).scalar_one() == 2
+    assert session.execute(select(func.count()).select_from(Song_Tag)).scalar_one() == 0
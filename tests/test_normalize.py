@@ -0,0 +1,78 @@
+"""
+Tests for probe result normalization, the batch paths must agree with `to_record`
+"""
+
+import os
+
+import pytest
+
+from PySongMan.lib.normalize import (
+    py_normalize_batch,
+    split_path,
+    to_record,
+)
+from PySongMan.lib.walker import FileState
+
+
+def result(tags=None, size="1234", duration="187.533", **stream):
+    first = {"codec_name": "mp3", **stream}
+    if tags is not None:
+        first["tags"] = tags
+    return {
+        "streams": [first],
+        "format": {"format_name": "mp3", "size": size, "duration": duration},
+    }
+
+
+def state(*parts):
+    return FileState(os.sep + os.path.join(*parts), 1234, 99, 7)
+
+
+CASES = [
+    (state("music", "Artist", "Album", "01 song.mp3"), result({"TITLE": "T", "ARTIST": "A"})),
+    (state("music", "Artist", "Album", "02 song.mp3"), result({"title": "t", "album_artist": "B"})),
+    (state("music", "Artist", "Album", "03 song.mp3"), result({"NAME": None})),
+    (state("music", "Artist", "Album", "04 song.mp3"), result()),
+    (state("music", "unsorted", "05 song.mp3"), result({"Genre": "Rock"})),
+    (state("06 song.mp3"), result({}, size="N/A", duration=None)),
+    (state("music", "Artist", "07 song.ogg"), result({"ARTIST": "A"}, duration=12)),
+]  # fmt: skip
+
+
+def batch_impls():
+    impls = [py_normalize_batch]
+    try:
+        from PySongMan.lib.fast_normalize import normalize_batch
+    except ImportError:
+        pass
+    else:
+        impls.append(normalize_batch)
+    return impls
+
+
+@pytest.mark.parametrize("normalize_batch", batch_impls())
+def test_batch_matches_to_record(normalize_batch):
+    expected = [to_record(probed, 3, entry) for entry, probed in CASES]
+
+    assert normalize_batch(CASES, 3) == expected
+
+
+@pytest.mark.parametrize("normalize_batch", batch_impls())
+def test_batch_returns_errors(normalize_batch):
+    entry = state("music", "bad.mp3")
+
+    rows = normalize_batch([(entry, {"streams": []}), CASES[0]], 3)
+
+    assert isinstance(rows[0], IndexError)
+    assert rows[1]["name"] == "T"
+
+
+def test_numbers():
+    [row] = py_normalize_batch([CASES[0]], 3)
+
+    assert (row["size"], row["length_seconds"]) == (1234, 187)
+
+
+def test_split_path():
+    assert split_path(os.path.join("a", "b", "c.mp3")) == ("c.mp3", "b", "a")
+    assert split_path("c.mp3") == ("c.mp3", "", "")
@@ -0,0 +1,137 @@
+"""
+Tests for keyset paging through songs
+"""
+
+import pytest
+from sqlalchemy import event
+
+from PySongMan.lib.models import Cursor, Library, Song
+
+
+@pytest.fixture
+def songs(session, library, make_record):
+    other = Library(path="/elsewhere")
+    session.add(other)
+    session.commit()
+
+    records = []
+    for idx in range(25):
+        record = make_record(library.id if idx % 5 else other.id, idx, [])
+        # Plenty of ties on artist
+        record["artist"] = f"artist {idx % 3}"
+        record["size"] = 1000 - idx
+        records.append(record)
+    Song.BulkInsert(session, records)
+    session.commit()
+    return session.query(Song).order_by(Song.id).all()
+
+
+def dicts(songs):
+    return [song.to_dict() for song in songs]
+
+
+def walk(session, limit=10, **kwargs):
+    pages, cursor = [], None
+    while True:
+        page = Song.GetPage(session, cursor, limit, **kwargs)
+        pages.append(page)
+        cursor = page["cursor"]
+        if cursor is None:
+            return pages
+
+
+def test_walk_by_id(session, songs):
+    pages = walk(session)
+
+    assert [len(page["data"]) for page in pages] == [10, 10, 5]
+    assert [song for page in pages for song in page["data"]] == dicts(songs)
+    assert {page["count"] for page in pages} == {25}
+
+
+def test_exact_last_page(session, songs):
+    pages = walk(session, limit=5)
+
+    # The extra row read ahead means no empty trailing page
+    assert [len(page["data"]) for page in pages] == [5] * 5
+
+
+@pytest.mark.parametrize("sort", ["artist", "size"])
+@pytest.mark.parametrize("descending", [False, True])
+def test_walk_sorted(session, songs, sort, descending):
+    pages = walk(session, limit=4, sort=sort, descending=descending)
+
+    expected = sorted(
+        songs, key=lambda song: (getattr(song, sort), song.id), reverse=descending
+    )
+    assert [song for page in pages for song in page["data"]] == dicts(expected)
+
+
+def test_filters(session, songs, library):
+    pages = walk(
+        session, limit=7, filters=dict(library_id=library.id, artist="artist 1")
+    )
+
+    expected = [
+        song
+        for song in songs
+        if song.library_id == library.id and song.artist == "artist 1"
+    ]
+    assert [song for page in pages for song in page["data"]] == dicts(expected)
+    assert pages[0]["count"] == len(expected)
+
+
+def test_bad_cursors(session, songs):
+    page = Song.GetPage(session, limit=5, sort="artist")
+
+    with pytest.raises(ValueError, match="walk by 'artist'"):
+        Song.GetPage(session, page["cursor"], limit=5)
+    with pytest.raises(ValueError, match="walk by 'artist'"):
+        Song.GetPage(session, page["cursor"], limit=5, sort="artist", descending=True)
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        Song.GetPage(session, "not a cursor", limit=5)
+    with pytest.raises(ValueError, match="Unable to page"):
+        Song.GetPage(session, limit=5, sort="path; drop table Song")
+
+
+def test_cursor_roundtrip():
+    cursor = Cursor("artist", True, "Motörhead", 42)
+
+    assert Cursor.Decode(cursor.encode()) == cursor
+
+
+def test_tags_in_one_query(session, library, make_record):
+    records = [
+        make_record(library.id, idx, [("genre", f"g{idx % 2}"), ("track", str(idx))])
+        for idx in range(30)
+    ]
+    Song.BulkInsert(session, records)
+    session.commit()
+
+    statements = []
+
+    def record(connection, cursor, statement, *args):
+        statements.append(statement)
+
+    engine = session.get_bind()
+    event.listen(engine, "before_cursor_execute", record)
+    page = Song.GetPage(session, limit=25)
+    event.remove(engine, "before_cursor_execute", record)
+
+    # The page, its tags and the count, however many songs
+    assert len(statements) == 3
+
+    by_id = {song.id: song.to_dict() for song in session.query(Song).order_by(Song.id)}
+    for song in page["data"]:
+        expected = by_id[song["id"]]
+        assert song | dict(tags=None) == expected | dict(tags=None)
+        assert sorted(song["tags"], key=lambda tag: tag["id"]) == sorted(
+            expected["tags"], key=lambda tag: tag["id"]
+        )
+
+
+def test_get_dict(session, library, make_record):
+    Song.BulkInsert(session, [make_record(library.id, 1, [("genre", "jazz")])])
+    session.commit()
+    song = session.query(Song).one()
+
+    assert Song.GetDict(session, song.id) == song.to_dict()
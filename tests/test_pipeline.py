@@ -0,0 +1,142 @@
+"""
+Tests for the staged pipeline engine
+"""
+
+import pytest
+
+from PySongMan.lib import pipeline as pipeline_module
+from PySongMan.lib.pipeline import MAX_HELD, Executor, Pipeline, Stage
+
+
+def doubler():
+    return lambda item: item * 2
+
+
+def odd_only():
+    def keep(item):
+        if item == 13:
+            raise ValueError("unlucky")
+        return item if item % 2 else None
+
+    return keep
+
+
+class Holder:
+    """
+    Holds every item back until the next poll
+    """
+
+    def __init__(self):
+        self.held = []
+        self.closed = False
+
+    @property
+    def pending(self):
+        return len(self.held)
+
+    def __call__(self, item):
+        self.held.append(item)
+        return None
+
+    def poll(self):
+        ready, self.held = self.held, []
+        return ready
+
+
+class Trickle(Holder):
+    """
+    Holds every item, letting one go every fourth poll
+    """
+
+    peak = 0
+
+    def __init__(self):
+        super().__init__()
+        self.polls = 0
+
+    def __call__(self, item):
+        self.held.append(item)
+        Trickle.peak = max(Trickle.peak, len(self.held))
+        return None
+
+    def poll(self):
+        self.polls += 1
+        if self.polls % 4 or not self.held:
+            return []
+        return [self.held.pop(0)]
+
+
+class AsyncAdder:
+    async def acall(self, item):
+        return item + 1
+
+    def __call__(self, item):
+        raise AssertionError("acall should be used")
+
+
+@pytest.mark.parametrize("executor", list(Executor))
+def test_items_flow_through_every_executor(executor):
+    pipeline = Pipeline(
+        [
+            Stage("double", doubler, (), executor, 3),
+            Stage("odd", odd_only, (), Executor.THREAD, 2),
+        ],
+        queue_size=4,
+    )
+    results = []
+
+    pipeline.run(range(10), results.append)
+
+    assert results == []
+    assert [stats.processed for stats in pipeline.stats()] == [10, 10]
+    assert pipeline.stats()[1].dropped == 10
+
+
+def test_drops_and_failures_are_counted():
+    pipeline = Pipeline([Stage("odd", odd_only, (), Executor.THREAD, 2)])
+    results = []
+
+    pipeline.run(range(20), results.append)
+
+    assert sorted(results) == [1, 3, 5, 7, 9, 11, 15, 17, 19]
+    stats = pipeline.stats()[0]
+    assert (stats.processed, stats.dropped, stats.failed) == (19, 10, 1)
+
+
+@pytest.mark.parametrize("executor", [Executor.THREAD, Executor.ASYNCIO])
+def test_held_items_are_polled_out(executor):
+    pipeline = Pipeline([Stage("hold", Holder, (), executor, 2)])
+    results = []
+
+    pipeline.run(range(50), results.append)
+
+    assert sorted(results) == list(range(50))
+
+
+def test_held_items_are_bounded(monkeypatch):
+    monkeypatch.setattr(pipeline_module, "POLL_INTERVAL", 0.001)
+    pipeline = Pipeline([Stage("trickle", Trickle, (), Executor.THREAD, 1)])
+    results = []
+
+    pipeline.run(range(200), results.append)
+
+    assert sorted(results) == list(range(200))
+    assert Trickle.peak == MAX_HELD
+
+
+def test_asyncio_prefers_acall():
+    pipeline = Pipeline([Stage("add", AsyncAdder, (), Executor.ASYNCIO, 8)])
+    results = []
+
+    pipeline.run(range(100), results.append)
+
+    assert sorted(results) == list(range(1, 101))
+
+
+def test_process_stage_results():
+    pipeline = Pipeline([Stage("double", doubler, (), Executor.PROCESS, 2)])
+    results = []
+
+    pipeline.run(range(100), results.append)
+
+    assert sorted(results) == [item * 2 for item in range(100)]
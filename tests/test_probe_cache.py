@@ -0,0 +1,80 @@
+"""
+Tests for the sidecar probe cache
+"""
+
+import asyncio
+
+from PySongMan.lib import probe_cache
+from PySongMan.lib.probe_cache import ProbeCache
+from PySongMan.lib.walker import FileState
+
+from PySongMan.lib.synthetic import id3v2_tag, id3v2_text, mp3_file
+
+
+def make_song(tmp_path, name="song.mp3", title="Title"):
+    path = tmp_path / name
+    path.write_bytes(
+        mp3_file(id3v2=id3v2_tag(id3v2_text("TIT2", title), id3v2_text("TPE1", "A")))
+    )
+    return FileState.From(path)
+
+
+def test_read_through(tmp_path):
+    state = make_song(tmp_path)
+
+    with ProbeCache(tmp_path / "cache.sqlite3") as cache:
+        first = cache.probe(state)
+        second = cache.probe(state)
+
+        assert first == second
+        assert first["streams"][0]["tags"]["title"] == "Title"
+        stats = cache.stats()
+        assert (stats.hits, stats.misses, stats.entries) == (1, 1, 1)
+        assert stats.hit_rate == 0.5
+
+
+def test_survives_reopen_and_misses_on_edit(tmp_path, monkeypatch):
+    state = make_song(tmp_path)
+    with ProbeCache(tmp_path / "cache.sqlite3") as cache:
+        cache.probe(state)
+
+    def fail(path):
+        raise AssertionError(f"{path} should have been cached")
+
+    monkeypatch.setattr(probe_cache, "probe", fail)
+    with ProbeCache(tmp_path / "cache.sqlite3") as cache:
+        assert cache.probe(state)["format"]["format_name"] == "mp3"
+        assert cache.get(state._replace(mtime_ns=state.mtime_ns + 1)) is None
+        assert cache.get(state._replace(size=state.size + 1)) is None
+
+
+def test_async_read_through(tmp_path):
+    state = make_song(tmp_path)
+
+    async def run(cache):
+        return [await cache.aprobe(state) for _ in range(3)]
+
+    with ProbeCache(tmp_path / "cache.sqlite3") as cache:
+        results = asyncio.run(run(cache))
+        assert results[0] == results[2]
+        assert (cache.hits, cache.misses) == (2, 1)
+
+
+def test_eviction_drops_least_recently_used(tmp_path):
+    states = [make_song(tmp_path, f"{idx}.mp3", f"title {idx}") for idx in range(10)]
+
+    with ProbeCache(tmp_path / "cache.sqlite3") as cache:
+        cache.put(states[0], cache.probe(states[0]))
+        entry = cache.stats().bytes
+        cache.max_bytes = entry * 5
+
+        for state in states[1:]:
+            cache.probe(state)
+            # Keep the first entry hot
+            cache.get(states[0])
+
+        stats = cache.stats()
+        assert stats.bytes <= cache.max_bytes
+        assert stats.entries < len(states)
+        assert cache.get(states[0]) is not None
+        assert cache.get(states[1]) is None
@@ -0,0 +1,123 @@
+"""
+Tests for the SQLite connection profiles
+"""
+
+import pytest
+from sqlalchemy import create_engine, insert, select, func
+from sqlalchemy.exc import OperationalError
+
+from PySongMan.lib import models
+from PySongMan.lib.api import Songs
+from PySongMan.lib.application import App
+from PySongMan.lib.models import (
+    BULK_IMPORT,
+    INTERACTIVE,
+    PROFILES,
+    READ_ONLY,
+    Library,
+    Song,
+    connect,
+)
+
+
+def pragma(connection, name):
+    return connection.exec_driver_sql(f"PRAGMA {name}").scalar()
+
+
+def song_rows(make_record, library_id, ids):
+    return [
+        {
+            key: value
+            for key, value in make_record(library_id, idx).items()
+            if key != "tags"
+        }
+        for idx in ids
+    ]
+
+
+def add_songs(make_record, db_path, count):
+    engine, scoped = connect(db_path)
+    with scoped() as session:
+        library = Library(path="/music")
+        session.add(library)
+        session.commit()
+        session.execute(insert(Song), song_rows(make_record, library.id, range(count)))
+        session.commit()
+        return library.id
+
+
+@pytest.mark.parametrize("profile", PROFILES.values(), ids=PROFILES.keys())
+def test_pragmas_applied(db_path, profile):
+    connect(db_path)
+    engine, _ = connect(db_path, profile=profile)
+
+    with engine.connect() as connection:
+        assert pragma(connection, "journal_mode") == "wal"
+        assert pragma(connection, "busy_timeout") == profile.pragmas["busy_timeout"]
+        assert pragma(connection, "cache_size") == profile.pragmas["cache_size"]
+        assert pragma(connection, "temp_store") == 2  # MEMORY
+        assert pragma(connection, "query_only") == (profile is READ_ONLY)
+
+
+def test_engines_per_profile(db_path):
+    writer, _ = connect(db_path)
+    reader, _ = connect(db_path, profile=READ_ONLY)
+
+    assert writer is not reader
+    assert connect(db_path)[0] is writer
+    assert connect(db_path, profile=BULK_IMPORT)[0] is not writer
+    assert reader.pool.size() == READ_ONLY.pool_size
+    assert writer.pool.size() == INTERACTIVE.pool_size
+
+
+def test_read_only_refuses_writes(db_path, make_record):
+    add_songs(make_record, db_path, 1)
+    engine, scoped = connect(db_path, profile=READ_ONLY)
+
+    with scoped() as session:
+        with pytest.raises(OperationalError, match="readonly"):
+            session.execute(insert(Library).values(path="/other"))
+
+
+def test_reads_during_write(db_path, make_record):
+    library_id = add_songs(make_record, db_path, 10)
+    writer, _ = connect(db_path, profile=BULK_IMPORT)
+    app = App(db_path=db_path)
+
+    with writer.connect() as connection:
+        # Held for the whole block, in rollback journal mode this locks out every reader
+        connection.exec_driver_sql("BEGIN EXCLUSIVE")
+        connection.execute(
+            insert(Song), song_rows(make_record, library_id, range(10, 20))
+        )
+
+        reader, scoped = connect(db_path, profile=READ_ONLY)
+        with reader.connect() as other:
+            other.exec_driver_sql("PRAGMA busy_timeout=0")
+            count = other.execute(select(func.count(Song.id))).scalar_one()
+        assert count == 10
+
+        page = Songs(app).list(limit=5)
+        assert page["count"] == 10
+
+        connection.commit()
+
+    assert Songs(app).list(limit=5)["count"] == 20
+
+
+def test_rollback_journal_blocks_reads(tmp_path):
+    # What the profiles avoid
+    url = f"sqlite:///{tmp_path / 'legacy.sqlite3'}"
+    engine = create_engine(url, connect_args={"timeout": 0})
+    models.Base.metadata.create_all(engine)
+
+    with engine.connect() as writer, engine.connect() as reader:
+        writer.exec_driver_sql("BEGIN EXCLUSIVE")
+        writer.execute(insert(Library).values(path="/music"))
+
+        with pytest.raises(OperationalError, match="locked"):
+            reader.execute(select(func.count(Library.id))).scalar_one()
+
+        writer.rollback()
+
+    engine.dispose()
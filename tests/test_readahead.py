@@ -0,0 +1,58 @@
+"""
+Tests for the page cache hints
+"""
+
+from PySongMan.lib import readahead
+from PySongMan.lib.importer import Unit, file_units, sniffer
+from PySongMan.lib.synthetic import mp3_file
+from PySongMan.lib.walker import FileState
+
+
+def test_willneed_and_evict(tmp_path):
+    paths = [tmp_path / f"{idx}.mp3" for idx in range(3)]
+    for path in paths:
+        path.write_bytes(mp3_file(frames=5))
+    states = [FileState.From(path) for path in paths]
+    # Files that vanished since the walk are left to the sniffer
+    states.append(FileState(str(tmp_path / "gone.mp3"), 10, 1, 1))
+
+    readahead.willneed(states)
+
+    evicted = readahead.evict(paths + [tmp_path / "gone.mp3"])
+    assert evicted == (3 if readahead.HAVE_FADVISE else 0)
+
+
+def test_sniffer_prefetches(tmp_path, monkeypatch):
+    paths = [tmp_path / f"{idx}.mp3" for idx in range(5)]
+    for path in paths:
+        path.write_bytes(mp3_file(frames=5))
+    states = [FileState.From(path) for path in paths]
+    prefetched = []
+    monkeypatch.setattr(
+        "PySongMan.lib.importer.willneed",
+        lambda batch: prefetched.extend(state.path for state in batch),
+    )
+
+    unit = sniffer(readahead=2)(Unit(None, 1, states))
+
+    assert [container for _, container in unit.items] == ["mp3"] * 5
+    # Every file once, ahead of being sniffed
+    assert prefetched == [str(path) for path in paths]
+
+
+def test_file_units_group_by_directory():
+    states = [
+        FileState("/music/b/2.mp3", 1, 1, 20),
+        FileState("/music/a/1.mp3", 1, 1, 11),
+        FileState("/music/b/1.mp3", 1, 1, 10),
+        FileState("/music/a/2.mp3", 1, 1, 5),
+    ]
+
+    [unit] = file_units(states)
+
+    assert [state.path for state in unit.items] == [
+        "/music/a/2.mp3",
+        "/music/a/1.mp3",
+        "/music/b/1.mp3",
+        "/music/b/2.mp3",
+    ]
@@ -0,0 +1,192 @@
+"""
+Tests for full-text song search
+"""
+
+import pytest
+from sqlalchemy import create_engine, func, insert, select, update
+from sqlalchemy.orm import Session
+
+from PySongMan.lib import models
+from PySongMan.lib.api import Songs
+from PySongMan.lib.application import App
+from PySongMan.lib.manifest import delete_songs
+from PySongMan.lib.models import (
+    Base,
+    Library,
+    SearchPending,
+    Song,
+    SongSearch,
+    connect,
+    refresh_search,
+    search_query,
+)
+
+SONGS = [
+    ("Help", "The Beatles", [("genre", "rock"), ("album", "Help!")]),
+    ("Helter Skelter", "The Beatles", [("genre", "rock")]),
+    ("Hello", "Adele", [("genre", "pop"), ("album", "25")]),
+    ("Unsung", "Helmet", [("genre", "metal")]),
+    ("Café del Mar", "Energy 52", [("genre", "trance")]),
+]
+
+
+def records(make_record, library_id, songs=SONGS):
+    batch = []
+    for idx, (name, artist, tags) in enumerate(songs):
+        record = make_record(library_id, idx, tags)
+        record["name"] = name
+        record["artist"] = artist
+        batch.append(record)
+    return batch
+
+
+@pytest.fixture
+def songs(session, library, make_record):
+    Song.BulkInsert(session, records(make_record, library.id))
+    session.commit()
+
+
+def names(session, query, **kwargs):
+    return [song["name"] for song in Song.Search(session, query, **kwargs)["data"]]
+
+
+def test_search_query():
+    assert search_query("Beatles hel") == '"beatles" "hel"*'
+    # Finished with the last word
+    assert search_query("beatles hel ") == '"beatles" "hel"'
+    assert search_query("the the the") == '"the" "the"*'
+    # FTS5 syntax is taken literally
+    assert search_query('NEAR(ab "cd") OR ef*') == '"near" "ab" "cd" "or" "ef"'
+    # Single letters only match whole words
+    assert search_query("b52 a") == '"b52" "a"'
+    assert search_query("  ?! ") is None
+
+
+def test_prefixes_and_ranking(session, songs):
+    found = names(session, "hel")
+    # Title hits rank above an artist hit
+    assert sorted(found[:3]) == ["Hello", "Help", "Helter Skelter"]
+    assert found[3:] == ["Unsung"]
+    assert names(session, "beatles hel") == ["Help", "Helter Skelter"]
+    assert names(session, "cafe") == ["Café del Mar"]
+    # Tag values are searched too
+    assert names(session, "pop 25") == ["Hello"]
+    assert names(session, "jazz") == []
+    assert names(session, "") == []
+
+
+def test_pages(session, songs):
+    walked, cursor = [], None
+    while True:
+        page = Song.Search(session, "hel", cursor, limit=3)
+        walked += [song["name"] for song in page["data"]]
+        cursor = page["cursor"]
+        if cursor is None:
+            break
+
+    assert walked == names(session, "hel")
+
+    first = Song.GetPage(session, limit=1)
+    with pytest.raises(ValueError, match="walk by 'id'"):
+        Song.Search(session, "hel", first["cursor"])
+
+
+def test_broad_queries_newest_first(session, monkeypatch, songs):
+    monkeypatch.setattr(models, "SEARCH_RANKED", 3)
+
+    # Four matches, too many to rank
+    assert names(session, "hel") == ["Unsung", "Hello", "Helter Skelter", "Help"]
+    walked, cursor = [], None
+    while True:
+        page = Song.Search(session, "hel", cursor, limit=3)
+        walked += [song["name"] for song in page["data"]]
+        cursor = page["cursor"]
+        if cursor is None:
+            break
+    assert walked == names(session, "hel")
+
+    # Narrowed down enough to rank again
+    assert names(session, "beatles hel")[0] in ["Help", "Helter Skelter"]
+    assert names(session, "metal hel") == ["Unsung"]
+
+
+def test_kept_in_sync(session, library, songs, make_record):
+    song_id = session.execute(select(Song.id).where(Song.name == "Hello")).scalar_one()
+
+    # Re-imported with new tags
+    Song.BulkInsert(
+        session, records(make_record, library.id, [("Help", "The Beatles", [])])
+    )
+    session.commit()
+    assert names(session, "rock") == ["Helter Skelter"]
+
+    # Renamed
+    session.execute(update(Song).where(Song.id == song_id).values(name="Goodbye"))
+    refresh_search(session)
+    session.commit()
+    assert names(session, "goodbye") == ["Goodbye"]
+    assert "Hello" not in names(session, "hello")
+
+    delete_songs(session, [song_id])
+    session.commit()
+    assert names(session, "goodbye adele") == []
+    assert (
+        session.execute(select(func.count()).select_from(SearchPending)).scalar_one()
+        == 0
+    )
+
+
+def test_existing_database_is_indexed(tmp_path, make_record):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.sqlite3'}")
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        # A database from before search existed
+        connection.exec_driver_sql("DROP TABLE SongSearch")
+        SearchPending.drop(connection)
+        for name in ["insert", "update", "delete", "link", "unlink"]:
+            connection.exec_driver_sql(f"DROP TRIGGER song_search_{name}")
+
+    with Session(engine) as session:
+        library = Library(path="/music")
+        session.add(library)
+        session.commit()
+        session.execute(
+            insert(Song),
+            [
+                {key: value for key, value in record.items() if key != "tags"}
+                for record in records(make_record, library.id)
+            ],
+        )
+        session.commit()
+
+    Base.metadata.create_all(engine)
+
+    with Session(engine) as session:
+        assert sorted(names(session, "beatles")) == ["Help", "Helter Skelter"]
+        assert (
+            session.execute(select(func.count()).select_from(SongSearch)).scalar_one()
+            == 5
+        )
+
+    engine.dispose()
+
+
+def test_api_search(db_path, make_record):
+    engine, scoped = connect(db_path)
+    with scoped() as session:
+        library = Library(path="/music")
+        session.add(library)
+        session.commit()
+        Song.BulkInsert(session, records(make_record, library.id))
+        session.commit()
+
+    songs = Songs(App(db_path=db_path))
+    page = songs.search("the beat", limit=1)
+    assert page["limit"] == 1
+    assert page["data"][0]["tags"]
+    following = songs.search("the beat", page["cursor"], limit=1)
+    assert [page["data"][0]["name"], following["data"][0]["name"]] in [
+        ["Help", "Helter Skelter"],
+        ["Helter Skelter", "Help"],
+    ]
+    assert following["cursor"] is None
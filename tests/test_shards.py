@@ -0,0 +1,107 @@
+"""
+Tests for sharded writing and the ATTACH merge
+"""
+
+import datetime as DT
+
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+
+from PySongMan.lib.dead_letter import ProbeFailed
+from PySongMan.lib.importer import Skipped, Unit
+from PySongMan.lib.models import Base, DeadLetter, Library, Song, SongCount, Tag
+from PySongMan.lib.shards import SHARD_GLOB, ShardWriter, merge
+
+
+@pytest.fixture
+def main(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'main.sqlite3'}")
+    Base.metadata.create_all(engine)
+    with Session(engine) as db_session:
+        yield db_session
+    engine.dispose()
+
+
+def write_shard(directory, records):
+    writer = ShardWriter(directory)
+    writer(Unit(None, 1, records))
+    writer.close()
+
+
+def tags_of(session, path):
+    song = session.execute(select(Song).where(Song.path == path)).scalar_one()
+    return sorted((tag.name, tag.value) for tag in song.tags)
+
+
+def test_shard_writer_passes_on_the_rest(tmp_path, make_record):
+    skipped = Skipped("/music/a.txt", None)
+    failed = ProbeFailed(1, "/music/bad.mp3", 1, 1, "boom", True)
+    writer = ShardWriter(tmp_path)
+
+    unit = writer(Unit("/music", 1, [make_record(1, 1), skipped, failed]))
+    writer.close()
+
+    assert unit.items == [skipped, failed]
+    assert writer.writer.rows == 1
+    assert list(tmp_path.glob(SHARD_GLOB)) == [writer.path]
+
+
+def test_merge_remaps_tags(main, tmp_path, make_record, count_songs):
+    library = Library(path="/music")
+    main.add(library)
+    main.commit()
+    # Tags already in the main database take the low ids, so shard ids all disagree with them
+    Tag.BulkIds(main, [("genre", "jazz"), ("album", "zero")])
+    Song.BulkInsert(main, [make_record(library.id, 1, [("genre", "jazz")])])
+    main.add(
+        DeadLetter(
+            library_id=library.id,
+            path="/music/2.mp3",
+            size=1,
+            mtime_ns=1,
+            error="boom",
+            next_attempt=DT.datetime.now(),
+        )
+    )
+    main.commit()
+
+    shards = tmp_path / "shards"
+    shards.mkdir()
+    write_shard(
+        shards,
+        [
+            make_record(library.id, 1, [("genre", "rock")]),
+            make_record(library.id, 2, [("genre", "rock"), ("album", "one")]),
+        ],
+    )
+    write_shard(
+        shards, [make_record(library.id, 3, [("album", "one"), ("genre", "jazz")])]
+    )
+
+    assert merge(main, shards) == 3
+
+    assert count_songs(main) == 3
+    # The upserting merge keeps the maintained counts right
+    assert SongCount.Lookup(main) == 3
+    assert SongCount.Lookup(main, dict(library_id=library.id)) == 3
+    # and the search index
+    found = Song.Search(main, "rock")["data"]
+    assert sorted(song["id"] for song in found) == sorted(
+        main.execute(
+            select(Song.id).where(Song.path.in_(["/music/1.mp3", "/music/2.mp3"]))
+        ).scalars()
+    )
+    assert Song.Search(main, "jazz")["data"][0]["name"] == make_record(1, 3)["name"]
+    # Re-imported songs have their tags replaced
+    assert tags_of(main, "/music/1.mp3") == [("genre", "rock")]
+    assert tags_of(main, "/music/2.mp3") == [("album", "one"), ("genre", "rock")]
+    assert tags_of(main, "/music/3.mp3") == [("album", "one"), ("genre", "jazz")]
+    assert len(Tag.GetAll(main)) == 4
+    assert DeadLetter.GetAll(main) == []
+    assert list(shards.glob(SHARD_GLOB)) == []
+
+
+def test_merge_without_shards(main, tmp_path, count_songs):
+    assert merge(main, tmp_path) == 0
+    assert count_songs(main) == 0
@@ -0,0 +1,174 @@
+"""
+Tests for the trigger maintained song counts
+"""
+
+import pytest
+from sqlalchemy import create_engine, func, select, update
+from sqlalchemy.orm import Session
+
+from PySongMan.lib.manifest import delete_songs
+from PySongMan.lib.models import (
+    COUNTED_COLUMNS,
+    Base,
+    Library,
+    Song,
+    SongCount,
+)
+
+
+def exact(session, **filters):
+    return session.execute(
+        select(func.count(Song.id)).filter_by(**filters)
+    ).scalar_one()
+
+
+def assert_counts(session):
+    assert SongCount.Lookup(session) == exact(session)
+    for name in COUNTED_COLUMNS:
+        column = getattr(Song, name)
+        for (value,) in session.execute(select(column).distinct()):
+            assert SongCount.Lookup(session, {name: value}) == exact(
+                session, **{name: value}
+            )
+
+    stored = session.execute(
+        select(func.count(SongCount.id)).where(SongCount.name != "")
+    ).scalar_one()
+    groups = sum(
+        session.execute(select(func.count(getattr(Song, name).distinct()))).scalar_one()
+        for name in COUNTED_COLUMNS
+    )
+    # No rows left behind at zero
+    assert stored == groups
+
+
+def records(make_record, library_id, ids, artist="artist"):
+    batch = []
+    for idx in ids:
+        record = make_record(library_id, idx, [])
+        record["artist"] = f"{artist} {idx % 3}"
+        batch.append(record)
+    return batch
+
+
+def test_empty(session):
+    assert SongCount.Lookup(session) == 0
+    assert SongCount.Lookup(session, dict(artist="nobody")) == 0
+
+
+def test_bulk_insert_and_upsert(session, library, make_record):
+    Song.BulkInsert(session, records(make_record, library.id, range(10)))
+    session.commit()
+
+    assert SongCount.Lookup(session) == 10
+    assert SongCount.Lookup(session, dict(library_id=library.id)) == 10
+    assert SongCount.Lookup(session, dict(library_id=str(library.id))) == 10
+    assert SongCount.Lookup(session, dict(artist="artist 0")) == 4
+    assert_counts(session)
+
+    # Re-importing moves songs between artists without counting them twice
+    Song.BulkInsert(
+        session, records(make_record, library.id, range(5), artist="renamed")
+    )
+    session.commit()
+
+    assert SongCount.Lookup(session) == 10
+    assert SongCount.Lookup(session, dict(artist="renamed 0")) == 2
+    assert_counts(session)
+
+
+def test_update_and_delete(session, library, make_record):
+    other = Library(path="/other")
+    session.add(other)
+    session.commit()
+    Song.BulkInsert(session, records(make_record, library.id, range(9)))
+    session.commit()
+
+    session.execute(
+        update(Song).where(Song.id <= 3).values(library_id=other.id, artist="moved")
+    )
+    session.commit()
+    assert SongCount.Lookup(session, dict(library_id=other.id)) == 3
+    assert_counts(session)
+
+    ids = session.execute(select(Song.id).where(Song.artist == "moved")).scalars().all()
+    assert delete_songs(session, ids) == 3
+    session.commit()
+
+    assert SongCount.Lookup(session) == 6
+    assert SongCount.Lookup(session, dict(library_id=other.id)) == 0
+    assert SongCount.Lookup(session, dict(artist="moved")) == 0
+    assert_counts(session)
+
+
+def test_orm_writes(session, library, make_record):
+    session.add(Song(**records(make_record, library.id, [1])[0]))
+    session.commit()
+
+    assert SongCount.Lookup(session) == 1
+
+    session.delete(session.execute(select(Song)).scalar_one())
+    session.commit()
+
+    assert SongCount.Lookup(session) == 0
+    assert_counts(session)
+
+
+def test_existing_database_is_counted(tmp_path, make_record):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.sqlite3'}")
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        # A database from before the counts existed
+        for name in [
+            "insert",
+            "delete",
+            *(f"update_{name}" for name in COUNTED_COLUMNS),
+        ]:
+            connection.exec_driver_sql(f"DROP TRIGGER song_count_{name}")
+        SongCount.__table__.drop(connection)
+
+    with Session(engine) as session:
+        library = Library(path="/music")
+        session.add(library)
+        session.commit()
+        library_id = library.id
+        Song.BulkInsert(session, records(make_record, library_id, range(7)))
+        session.commit()
+
+    Base.metadata.create_all(engine)
+
+    with Session(engine) as session:
+        assert SongCount.Lookup(session) == 7
+        assert_counts(session)
+        Song.BulkInsert(session, records(make_record, library_id, range(7, 9)))
+        session.commit()
+        assert SongCount.Lookup(session) == 9
+
+    engine.dispose()
+
+
+def test_get_page_reads_counts(session, library, make_record):
+    Song.BulkInsert(session, records(make_record, library.id, range(6)))
+    session.commit()
+    # Prove where the number comes from
+    session.execute(update(SongCount).where(SongCount.name == "").values(songs=1000))
+
+    assert Song.GetPage(session, limit=2)["count"] == 1000
+    assert Song.GetPage(session, limit=2, exact=True)["count"] == 6
+    assert Song.GetPage(session, limit=2, filters=dict(artist="artist 1"))["count"] == 2
+
+    # No maintained count covers two filters at once
+    filters = dict(artist="artist 1", library_id=library.id)
+    assert Song.GetPage(session, limit=2, filters=filters)["count"] == 2
+
+
+@pytest.mark.parametrize("name", ["", *COUNTED_COLUMNS])
+def test_rebuild(session, library, name, make_record):
+    Song.BulkInsert(session, records(make_record, library.id, range(5)))
+    session.commit()
+    session.execute(update(SongCount).where(SongCount.name == name).values(songs=-3))
+
+    SongCount.Rebuild(session)
+    session.commit()
+
+    assert_counts(session)
@@ -0,0 +1,71 @@
+"""
+Tests for the synthetic library generator
+"""
+
+import collections
+import struct
+
+import pytest
+
+from PySongMan.lib import tag_reader
+from PySongMan.lib.synthetic import (
+    generate_library,
+    ogg_crc,
+    ogg_page,
+    parse_mix,
+)
+
+
+def test_ogg_crc_known_value():
+    # CRC-32/MPEG-2 style check value with Ogg's zero initial value
+    assert ogg_crc(b"123456789") == 0x89A1897F
+
+
+def test_ogg_page_checksum():
+    page = ogg_page([b"hello"], sequence=3)
+
+    stored = struct.unpack_from("<I", page, 22)[0]
+    zeroed = page[:22] + bytes(4) + page[26:]
+    assert stored == ogg_crc(zeroed) != 0
+
+
+def test_generate_library_layout(tmp_path):
+    written = generate_library(tmp_path, files=120, depth=2, seed=3)
+
+    assert len(set(written)) == 120
+    assert all(len(path.relative_to(tmp_path).parts) == 3 for path in written)
+    assert sorted(written) == sorted(path for path in tmp_path.rglob("*.*"))
+
+
+@pytest.mark.parametrize("depth", [0, 1, 4])
+def test_generate_library_depth(tmp_path, depth):
+    written = generate_library(tmp_path, files=30, depth=depth)
+
+    assert {len(path.relative_to(tmp_path).parts) for path in written} == {depth + 1}
+
+
+def test_generate_library_is_readable(tmp_path):
+    written = generate_library(tmp_path, files=200, mix=parse_mix("mp3,ogg,mp4"))
+
+    suffixes = collections.Counter(path.suffix for path in written)
+    assert set(suffixes) == {".mp3", ".ogg", ".mp4"}
+
+    for path in written:
+        result = tag_reader.read(path)
+        tags = {key.lower(): value for key, value in result["format"]["tags"].items()}
+        assert tags["title"] and tags["artist"] and tags["album"]
+        assert path.parent.name == tags["album"]
+
+
+def test_generate_library_is_repeatable(tmp_path):
+    first = generate_library(tmp_path / "a", files=50, seed=11)
+    second = generate_library(tmp_path / "b", files=50, seed=11)
+
+    assert [path.relative_to(tmp_path / "a") for path in first] == [
+        path.relative_to(tmp_path / "b") for path in second
+    ]
+
+
+def test_parse_mix_rejects_unknown():
+    with pytest.raises(ValueError):
+        parse_mix("mp3=2,wav=1")
@@ -0,0 +1,110 @@
+"""
+Tests for tag id interning
+"""
+
+from PySongMan.lib.models import Song, Tag
+from PySongMan.lib.tag_cache import TagCache, entry_size
+
+
+def test_lru_eviction():
+    cache = TagCache(capacity=2)
+    cache.update({("genre", "rock"): 1, ("genre", "jazz"): 2})
+    cache.lookup([("genre", "rock")])
+    cache.update({("genre", "pop"): 3})
+
+    found, missing = cache.lookup(
+        [("genre", "rock"), ("genre", "jazz"), ("genre", "pop")]
+    )
+
+    assert found == {("genre", "rock"): 1, ("genre", "pop"): 3}
+    assert missing == [("genre", "jazz")]
+    assert len(cache) == 2
+
+
+def test_byte_budget():
+    cache = TagCache(max_bytes=3 * entry_size(("genre", "rock")))
+    cache.update({("genre", "rock"): 1, ("genre", "jazz"): 2})
+    # Lyrics worth a whole budget push everything else out
+    lyrics = ("lyrics", "la " * 1000)
+    cache.update({lyrics: 3})
+    assert len(cache) == 0
+    assert cache.size == 0
+
+    cache.update({("genre", "rock"): 1, ("genre", "jazz"): 2})
+    cache.update({("genre", "rock"): 1})
+    assert cache.size == 2 * entry_size(("genre", "rock"))
+
+
+def test_stats():
+    cache = TagCache()
+    cache.update({("genre", "rock"): 1})
+    cache.lookup([("genre", "rock"), ("genre", "jazz")])
+    cache.lookup([("genre", "rock")])
+
+    stats = cache.stats()
+
+    assert (stats.hits, stats.misses, stats.entries) == (2, 1, 1)
+    assert stats.hit_rate == 2 / 3
+
+
+def test_preload(session):
+    ids = Tag.BulkIds(session, [("genre", "rock"), ("genre", "jazz"), ("album", "one")])
+
+    cache = TagCache.Preload(session, capacity=2)
+    found, missing = cache.lookup(ids)
+
+    # Oldest tags first
+    assert len(found) == 2
+    assert missing == [max(ids, key=ids.get)]
+
+
+def test_preload_byte_budget(session):
+    pairs = [("title", f"song {idx:02d}") for idx in range(20)]
+    ids = Tag.BulkIds(session, pairs)
+
+    cache = TagCache.Preload(session, max_bytes=5 * entry_size(pairs[0]))
+    found, missing = cache.lookup(pairs)
+
+    # The oldest five made it and are still there after the preload
+    assert sorted(found.values()) == sorted(ids.values())[:5]
+    assert len(missing) == 15
+
+    # A new pair pushes out the newest preloaded tag, not the oldest
+    cache = TagCache.Preload(session, max_bytes=5 * entry_size(pairs[0]))
+    cache.update({("title", "song 99"): 99})
+    found, _ = cache.lookup(pairs)
+    assert sorted(found.values()) == sorted(ids.values())[:4]
+
+
+def test_bulk_ids_with_cache(session):
+    cache = TagCache()
+    pairs = [("genre", "rock"), ("album", "one")]
+
+    first = Tag.BulkIds(session, pairs, cache)
+    assert Tag.BulkIds(session, pairs) == first
+    assert Tag.BulkIds(session, pairs, cache) == first
+    assert cache.stats()[:2] == (2, 2)
+
+
+def test_hits_skip_sqlite(session, library):
+    cache = TagCache()
+    # An id SQLite could never have handed out, only the cache knows it
+    cache.update({("genre", "rock"): 999})
+
+    ids = Tag.BulkIds(session, [("genre", "rock"), ("genre", "jazz")], cache)
+
+    assert ids[("genre", "rock")] == 999
+    assert ids[("genre", "jazz")] != 999
+    assert Tag.BulkIds(session, [("genre", "rock")]) != {("genre", "rock"): 999}
+
+
+def test_bulk_insert_with_cache(session, library, make_record):
+    cache = TagCache()
+    Song.BulkInsert(session, [make_record(library.id, 1, [("genre", "rock")])], cache)
+    song_ids = Song.BulkInsert(
+        session, [make_record(library.id, 2, [("genre", "rock")])], cache
+    )
+
+    song = Song.GetById(session, song_ids[0])
+    assert [(tag.name, tag.value) for tag in song.tags] == [("genre", "rock")]
+    assert cache.stats().hit_rate == 0.5
@@ -0,0 +1,194 @@
+"""
+Tests for the in process tag reader
+"""
+
+import pytest
+
+from PySongMan.lib import tag_reader
+from PySongMan.lib.synthetic import (
+    flac_file,
+    id3v1_tag,
+    id3v2_tag,
+    id3v2_text,
+    id3v2_frame,
+    mp3_file,
+    mp4_file,
+    ogg_opus_file,
+    ogg_page,
+    ogg_vorbis_file,
+    vorbis_comment,
+)
+
+
+def write(tmp_path, name, data):
+    target = tmp_path / name
+    target.write_bytes(data)
+    return target
+
+
+def test_mp3_id3v2(tmp_path):
+    tag = id3v2_tag(
+        id3v2_text("TIT2", "Song Title"),
+        id3v2_text("TPE1", "An Artist"),
+        id3v2_text("TALB", "The Album"),
+        id3v2_text("TCON", "(17)"),
+        id3v2_frame("TXXX", b"\x00MOOD\x00Calm"),
+    )
+    path = write(tmp_path, "song.mp3", mp3_file(frames=100, id3v2=tag))
+
+    actual = tag_reader.read(path)
+
+    tags = actual["streams"][0]["tags"]
+    assert tags["title"] == "Song Title"
+    assert tags["artist"] == "An Artist"
+    assert tags["album"] == "The Album"
+    assert tags["genre"] == "Rock"
+    assert tags["MOOD"] == "Calm"
+    assert actual["streams"][0]["codec_name"] == "mp3"
+    assert actual["format"]["format_name"] == "mp3"
+    assert actual["format"]["size"] == str(path.stat().st_size)
+    assert float(actual["format"]["duration"]) == pytest.approx(100 * 417 * 8 / 128000)
+
+
+def test_mp3_id3v1_only(tmp_path):
+    data = mp3_file(
+        frames=10,
+        id3v1=id3v1_tag("Old Title", "Old Artist", "Old Album", "1999", 3, 13),
+    )
+    path = write(tmp_path, "old.mp3", data)
+
+    tags = tag_reader.read(path)["streams"][0]["tags"]
+
+    assert tags["title"] == "Old Title"
+    assert tags["artist"] == "Old Artist"
+    assert tags["date"] == "1999"
+    assert tags["track"] == "3"
+    assert tags["genre"] == "Pop"
+
+
+def test_ogg_vorbis(tmp_path):
+    path = write(
+        tmp_path,
+        "song.ogg",
+        ogg_vorbis_file({"TITLE": "Ogg Title", "ARTIST": "Ogg Artist"}, seconds=3),
+    )
+
+    actual = tag_reader.read(path)
+
+    assert actual["streams"][0]["codec_name"] == "vorbis"
+    assert actual["streams"][0]["tags"]["TITLE"] == "Ogg Title"
+    assert actual["streams"][0]["tags"]["ARTIST"] == "Ogg Artist"
+    assert actual["format"]["format_name"] == "ogg"
+    assert float(actual["format"]["duration"]) == pytest.approx(3.0)
+
+
+def test_ogg_vorbis_shared_header_page(tmp_path):
+    ident = ogg_vorbis_file({})[28:58]
+    comment = b"\x03vorbis" + vorbis_comment({"TITLE": "Shared"}) + b"\x01"
+    setup = b"\x05vorbis" + bytes(300)
+    data = (
+        ogg_page([ident], flags=0x02)
+        # Comment, setup and the first audio packet all on one page
+        + ogg_page([comment, setup, bytes(10)], sequence=1)
+        + ogg_page([bytes(64)], sequence=2, granule=44100, flags=0x04)
+    )
+    path = write(tmp_path, "song.ogg", data)
+
+    actual = tag_reader.read(path)
+
+    assert actual["streams"][0]["tags"]["TITLE"] == "Shared"
+    assert float(actual["format"]["duration"]) == pytest.approx(1.0)
+
+
+def test_ogg_opus(tmp_path):
+    path = write(
+        tmp_path, "song.opus", ogg_opus_file({"TITLE": "Opus Title"}, seconds=4)
+    )
+
+    actual = tag_reader.read(path)
+
+    assert actual["streams"][0]["codec_name"] == "opus"
+    assert actual["streams"][0]["tags"]["TITLE"] == "Opus Title"
+    assert float(actual["format"]["duration"]) == pytest.approx(4.0)
+
+
+def test_flac(tmp_path):
+    tags = {"TITLE": "Flac Title", "ARTIST": "Flac Artist"}
+    path = write(tmp_path, "song.flac", flac_file(tags, seconds=5, rate=48000))
+
+    actual = tag_reader.read(path)
+
+    assert actual["format"]["format_name"] == "flac"
+    assert actual["streams"][0]["tags"]["ARTIST"] == "Flac Artist"
+    assert actual["streams"][0]["sample_rate"] == "48000"
+    assert actual["streams"][0]["channels"] == 2
+    assert float(actual["format"]["duration"]) == pytest.approx(5.0)
+
+
+def test_flac_behind_id3(tmp_path):
+    data = id3v2_tag(id3v2_text("TIT2", "ignored")) + flac_file({"TITLE": "Flac"})
+    path = write(tmp_path, "song.flac", data)
+
+    assert tag_reader.sniff(path) == "flac"
+    assert tag_reader.read(path)["streams"][0]["tags"]["TITLE"] == "Flac"
+
+
+@pytest.mark.parametrize(
+    "data, expected",
+    [
+        (mp3_file(frames=3), "mp3"),
+        (mp3_file(frames=3, id3v2=id3v2_tag(id3v2_text("TIT2", "x"))), "mp3"),
+        (ogg_vorbis_file({}), "ogg"),
+        (flac_file({}), "flac"),
+        (mp4_file({}), "mp4"),
+        (b"RIFF\x24\x00\x00\x00WAVEfmt ", "wav"),
+        (b"FORM\x00\x00\x00\x00AIFFCOMM", "aiff"),
+        (b"\xff\xf1\x50\x80\x00\x1f\xfc", "aac"),
+        (b"\xff\xd8\xff\xe0\x00\x10JFIF", "jpeg"),
+        (b"<html><body>404</body></html>", "markup"),
+        (b"not an audio file at all", None),
+    ],
+)
+def test_sniff(tmp_path, data, expected):
+    path = write(tmp_path, "file.mp3", data)
+
+    assert tag_reader.sniff(path) == expected
+
+
+def test_mp4_ilst(tmp_path):
+    data = mp4_file(
+        {b"\xa9nam": "MP4 Title", b"\xa9ART": "MP4 Artist", b"aART": "Band"},
+        seconds=7,
+        track=(2, 9),
+    )
+    path = write(tmp_path, "song.m4a", data)
+
+    actual = tag_reader.read(path)
+
+    tags = actual["streams"][0]["tags"]
+    assert tags["title"] == "MP4 Title"
+    assert tags["artist"] == "MP4 Artist"
+    assert tags["album_artist"] == "Band"
+    assert tags["track"] == "2/9"
+    assert actual["streams"][0]["codec_name"] == "aac"
+    assert actual["format"]["format_name"] == tag_reader.MP4_FORMAT_NAME
+    assert float(actual["format"]["duration"]) == pytest.approx(7.0)
+
+
+@pytest.mark.parametrize("data", [b"", b"not an audio file at all" * 10])
+def test_unknown_raises(tmp_path, data):
+    path = write(tmp_path, "junk.mp3", data)
+
+    with pytest.raises(tag_reader.TagReaderError):
+        tag_reader.read(path)
+
+
+def test_parser_value_error_raises(tmp_path, monkeypatch):
+    def broken(buffer, path):
+        raise ValueError("not enough values to unpack")
+
+    monkeypatch.setitem(tag_reader.PARSERS, "ogg", broken)
+    path = write(tmp_path, "song.ogg", ogg_vorbis_file({}))
+
+    with pytest.raises(tag_reader.TagReaderError):
+        tag_reader.read(path)
@@ -52,3 +52,14 @@ def test_optional_mixed_type_arg():
     assert len(actual.arg_names) == 1
     assert actual.arg_names[0] == "name"
     assert actual.compiled[0] == "name:number | string"
+
+
+def test_default_args():
+    actual = cycle_st(
+        "def foo(sort:str='id', descending:bool=False, limit:int=100):\n    pass"
+    )
+    assert actual.compiled == [
+        'sort:string = "id"',
+        "descending:boolean = false",
+        "limit:number = 100",
+    ]
@@ -47,6 +47,21 @@ export interface Adams {
 }
 """
 
+OPTIONAL = """
+import typing as t
+
+class Page(t.TypedDict):
+    count: int
+    cursor: str | None
+"""
+
+OPTIONAL_EXPECTED = """export interface Page {
+
+    count: number
+    cursor: string | undefined
+}
+"""
+
 
 def test_basic_test():
 
@@ -60,3 +75,10 @@ def test_child_list():
     actual = process_types_source(LIST, None)
 
     assert actual == LIST_EXPECTED
+
+
+def test_optional_field():
+
+    actual = process_types_source(OPTIONAL, None)
+
+    assert actual == OPTIONAL_EXPECTED
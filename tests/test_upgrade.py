@@ -0,0 +1,112 @@
+"""
+Tests for upgrading databases created before the current schema
+"""
+
+import sqlite3
+
+import pytest
+from sqlalchemy import select
+
+from PySongMan.lib import models
+from PySongMan.lib.models import Song, Tag, connect
+
+# Song, Tag and Song_Tag as created before mtime_ns/inode and the Tag constraint change
+OLD_SCHEMA = [
+    """CREATE TABLE "Tag" (
+        name VARCHAR NOT NULL,
+        value VARCHAR NOT NULL,
+        id INTEGER NOT NULL,
+        created_on DATETIME DEFAULT (CURRENT_TIMESTAMP) NOT NULL,
+        updated_on DATETIME DEFAULT (CURRENT_TIMESTAMP) NOT NULL,
+        PRIMARY KEY (id),
+        CONSTRAINT unique_name_value UNIQUE (name, value) ON CONFLICT REPLACE
+    )""",
+    'CREATE INDEX "ix_Tag_name" ON "Tag" (name)',
+    'CREATE INDEX "ix_Tag_value" ON "Tag" (value)',
+    """CREATE TABLE "Library" (
+        path VARCHAR NOT NULL,
+        id INTEGER NOT NULL,
+        created_on DATETIME DEFAULT (CURRENT_TIMESTAMP) NOT NULL,
+        updated_on DATETIME DEFAULT (CURRENT_TIMESTAMP) NOT NULL,
+        PRIMARY KEY (id)
+    )""",
+    'CREATE UNIQUE INDEX "ix_Library_path" ON "Library" (path)',
+    """CREATE TABLE "Song" (
+        name VARCHAR NOT NULL,
+        artist VARCHAR NOT NULL,
+        size INTEGER NOT NULL,
+        length_seconds INTEGER NOT NULL,
+        file_name VARCHAR NOT NULL,
+        path VARCHAR NOT NULL,
+        codec VARCHAR NOT NULL,
+        format VARCHAR NOT NULL,
+        library_id INTEGER NOT NULL,
+        id INTEGER NOT NULL,
+        created_on DATETIME DEFAULT (CURRENT_TIMESTAMP) NOT NULL,
+        updated_on DATETIME DEFAULT (CURRENT_TIMESTAMP) NOT NULL,
+        PRIMARY KEY (id),
+        CONSTRAINT unique_song UNIQUE (path, name),
+        FOREIGN KEY(library_id) REFERENCES "Library" (id)
+    )""",
+    'CREATE UNIQUE INDEX "ix_Song_path" ON "Song" (path)',
+    """CREATE TABLE "Song_Tag" (
+        song_id INTEGER NOT NULL,
+        tag_id INTEGER NOT NULL,
+        PRIMARY KEY (song_id, tag_id),
+        FOREIGN KEY(song_id) REFERENCES "Song" (id),
+        FOREIGN KEY(tag_id) REFERENCES "Tag" (id)
+    )""",
+    "INSERT INTO Library (id, path) VALUES (1, '/music')",
+    "INSERT INTO Tag (id, name, value) VALUES (7, 'genre', 'rock')",
+    "INSERT INTO Song (id, name, artist, size, length_seconds, file_name, path, codec,"
+    " format, library_id) VALUES (3, 'Help', 'The Beatles', 10, 120, 'help.mp3',"
+    " '/music/help.mp3', 'mp3', 'mp3', 1)",
+    "INSERT INTO Song_Tag (song_id, tag_id) VALUES (3, 7)",
+]
+
+
+@pytest.fixture
+def old_db(db_path):
+    connection = sqlite3.connect(db_path.removeprefix("sqlite:///"))
+    for statement in OLD_SCHEMA:
+        connection.execute(statement)
+    connection.commit()
+    connection.close()
+    return db_path
+
+
+def test_old_database_upgraded(old_db):
+    engine, scoped = connect(old_db)
+
+    with scoped() as session:
+        song = session.execute(select(Song)).scalar_one()
+        # Looks changed to the next incremental rescan
+        assert (song.mtime_ns, song.inode) == (0, 0)
+        assert [(tag.id, tag.value) for tag in song.tags] == [(7, "rock")]
+
+        # Existing tags keep their ids
+        ids = Tag.BulkIds(session, [("genre", "rock"), ("genre", "jazz")])
+        assert ids[("genre", "rock")] == 7
+        session.commit()
+
+        assert Song.Search(session, "beatles")["data"][0]["id"] == 3
+
+    with engine.connect() as connection:
+        tag_sql = connection.exec_driver_sql(
+            "SELECT sql FROM sqlite_master WHERE name = 'Tag'"
+        ).scalar()
+        assert "REPLACE" not in tag_sql.upper()
+        indexes = connection.exec_driver_sql("PRAGMA index_list(Tag)").all()
+        assert {"ix_Tag_name", "ix_Tag_value"} <= {row.name for row in indexes}
+
+
+def test_upgrade_is_idempotent(old_db):
+    connect(old_db)[0].dispose()
+    models.SA_ENGINES.clear()
+    # Starting again on the upgraded database
+    engine, scoped = connect(old_db)
+
+    with engine.begin() as connection:
+        models.upgrade(connection)
+    with scoped() as session:
+        assert session.execute(select(Song.name)).scalars().all() == ["Help"]
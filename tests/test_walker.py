@@ -0,0 +1,89 @@
+"""
+Tests for the parallel directory walker
+"""
+
+import os
+
+from PySongMan.lib.walker import FileState, scan_directory, walk
+
+
+def build_tree(root, depth=3, width=3, files=4):
+    expected = []
+
+    def fill(directory, level):
+        for idx in range(files):
+            target = directory / f"{idx}.mp3"
+            target.write_bytes(b"x" * (idx + 1))
+            expected.append(str(target))
+        (directory / "cover.jpg").write_bytes(b"jpg")
+        if level < depth:
+            for idx in range(width):
+                child = directory / f"dir{idx}"
+                child.mkdir()
+                fill(child, level + 1)
+
+    fill(root, 1)
+    return expected
+
+
+def test_walk_finds_everything(tmp_path):
+    expected = build_tree(tmp_path)
+
+    batches = list(walk(tmp_path, suffixes={".mp3"}, batch_size=7, threads=4))
+
+    found = [state.path for batch in batches for state in batch]
+    assert sorted(found) == sorted(expected)
+    assert all(len(batch) <= 7 for batch in batches)
+
+
+def test_walk_reuses_stat(tmp_path):
+    target = tmp_path / "song.mp3"
+    target.write_bytes(b"12345")
+
+    [[state]] = list(walk(tmp_path))
+
+    assert state == FileState.From(target)
+    assert state.size == 5
+    assert state.inode == os.stat(target).st_ino
+
+
+def test_scan_directory_skips_unreadable(tmp_path):
+    files, subdirs = scan_directory(str(tmp_path / "missing"))
+
+    assert files == []
+    assert subdirs == []
+
+
+def test_walk_reports_unlisted(tmp_path, monkeypatch):
+    (tmp_path / "locked").mkdir()
+    (tmp_path / "locked" / "song.mp3").write_bytes(b"x")
+    (tmp_path / "song.mp3").write_bytes(b"x")
+    scandir = os.scandir
+
+    def refuse(path):
+        if path == str(tmp_path / "locked"):
+            raise PermissionError(path)
+        return scandir(path)
+
+    monkeypatch.setattr(os, "scandir", refuse)
+    unlisted = set()
+
+    [[state]] = list(walk(tmp_path, unlisted=unlisted))
+
+    assert state.path == str(tmp_path / "song.mp3")
+    assert unlisted == {str(tmp_path / "locked")}
+
+
+def test_scan_directory_inode_order(tmp_path):
+    for name in ["c.mp3", "a.mp3", "b.mp3"]:
+        (tmp_path / name).write_bytes(b"x")
+    for name in ["z", "y"]:
+        (tmp_path / name).mkdir()
+
+    files, subdirs = scan_directory(str(tmp_path))
+
+    inodes = [state.inode for state in files]
+    assert inodes == sorted(inodes)
+    assert [os.stat(path).st_ino for path in subdirs] == sorted(
+        os.stat(path).st_ino for path in subdirs
+    )
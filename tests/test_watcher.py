@@ -0,0 +1,213 @@
+"""
+Tests for live library updates
+"""
+
+import contextlib
+import time
+
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+
+from PySongMan.lib import watcher
+from PySongMan.lib.models import Base, Library, Song
+
+from PySongMan.lib.synthetic import id3v2_tag, id3v2_text, mp3_file
+
+
+def mp3(title):
+    return mp3_file(frames=5, id3v2=id3v2_tag(id3v2_text("TIT2", title)))
+
+
+@pytest.fixture
+def library_db(tmp_path):
+    root = tmp_path / "library"
+    root.mkdir()
+    engine = create_engine(f"sqlite:///{tmp_path / 'db.sqlite3'}")
+    Base.metadata.create_all(engine)
+
+    with Session(engine) as session:
+        library = Library(path=str(root))
+        session.add(library)
+        session.commit()
+        library_id = library.id
+
+    @contextlib.contextmanager
+    def get_db():
+        with Session(engine) as session:
+            yield session
+
+    yield root, library_id, get_db
+    engine.dispose()
+
+
+def titles(get_db):
+    with get_db() as session:
+        return sorted(session.execute(select(Song.name)).scalars())
+
+
+def wait_for(predicate, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.05)
+    return predicate()
+
+
+def test_polling_source_diff(tmp_path):
+    kept = tmp_path / "kept.mp3"
+    kept.write_bytes(b"1")
+    gone = tmp_path / "gone.mp3"
+    gone.write_bytes(b"2")
+
+    source = watcher.PollingSource([str(tmp_path)], interval=0)
+    gone.unlink()
+    (tmp_path / "new.mp3").write_bytes(b"3")
+
+    events = source.read(0.1)
+
+    assert sorted(events, key=lambda event: event[0]) == [
+        (str(gone), watcher.Event.REMOVED),
+        (str(tmp_path / "new.mp3"), watcher.Event.UPDATED),
+    ]
+
+
+def test_apply_updates_and_removals(library_db):
+    root, library_id, get_db = library_db
+    (root / "album").mkdir()
+    (root / "album" / "one.mp3").write_bytes(mp3("One"))
+    (root / "album" / "two.mp3").write_bytes(mp3("Two"))
+    (root / "single.mp3").write_bytes(mp3("Single"))
+    subject = watcher.Watcher(get_db, {str(root): library_id}, source=object())
+
+    subject.apply(
+        {
+            str(root / "album" / "one.mp3"): watcher.Event.UPDATED,
+            str(root / "album" / "two.mp3"): watcher.Event.UPDATED,
+            str(root / "single.mp3"): watcher.Event.UPDATED,
+        }
+    )
+    assert titles(get_db) == ["One", "Single", "Two"]
+
+    subject.apply(
+        {
+            str(root / "album"): watcher.Event.REMOVED_TREE,
+            str(root / "missing.mp3"): watcher.Event.UPDATED,
+        }
+    )
+    assert titles(get_db) == ["Single"]
+
+
+def test_removed_tree_is_exact(library_db, monkeypatch):
+    root, library_id, get_db = library_db
+    directories = ["a_b", "aXb", "Rock", "rock", "50%", "50x", "a_b2"]
+    for directory in directories:
+        (root / directory).mkdir()
+        for idx in range(2):
+            (root / directory / f"{idx}.mp3").write_bytes(mp3(f"{directory} {idx}"))
+    subject = watcher.Watcher(get_db, {str(root): library_id}, source=object())
+    subject.apply(
+        {
+            str(root / directory / f"{idx}.mp3"): watcher.Event.UPDATED
+            for directory in directories
+            for idx in range(2)
+        }
+    )
+
+    # LIKE wildcards and ASCII case must not reach the siblings
+    subject.apply(
+        {
+            str(root / "a_b"): watcher.Event.REMOVED_TREE,
+            str(root / "Rock"): watcher.Event.REMOVED_TREE,
+            str(root / "50%"): watcher.Event.REMOVED_TREE,
+        }
+    )
+    assert titles(get_db) == sorted(
+        f"{directory} {idx}"
+        for directory in ["aXb", "rock", "50x", "a_b2"]
+        for idx in range(2)
+    )
+
+    # Removals are looked up in chunks
+    monkeypatch.setattr(watcher, "LOOKUP_CHUNK", 3)
+    subject.apply(
+        {
+            str(root / directory / f"{idx}.mp3"): watcher.Event.REMOVED
+            for directory in ["aXb", "rock", "50x"]
+            for idx in range(2)
+        }
+    )
+    assert titles(get_db) == ["a_b2 0", "a_b2 1"]
+
+
+def test_dropped_album_shows_up(library_db, tmp_path):
+    root, library_id, get_db = library_db
+    try:
+        source = watcher.InotifySource([str(root)])
+    except OSError:
+        pytest.skip("inotify is not available")
+
+    subject = watcher.Watcher(get_db, {str(root): library_id}, source=source)
+    subject.start()
+    try:
+        staging = tmp_path / "staging" / "Album"
+        staging.mkdir(parents=True)
+        for idx in range(3):
+            (staging / f"{idx}.mp3").write_bytes(mp3(f"Track {idx}"))
+
+        staging.rename(root / "Album")
+        assert wait_for(lambda: len(titles(get_db)) == 3, timeout=2.0)
+
+        (root / "Album" / "0.mp3").unlink()
+        assert wait_for(lambda: titles(get_db) == ["Track 1", "Track 2"], timeout=2.0)
+    finally:
+        subject.stop()
+
+
+def drain(source):
+    # Coalesced the way `Watcher.run` does
+    changes = {}
+    while events := source.read(0.2):
+        changes.update(events)
+    return changes
+
+
+def test_moved_directories_follow(library_db, tmp_path):
+    root, library_id, get_db = library_db
+    try:
+        source = watcher.InotifySource([str(root)])
+    except OSError:
+        pytest.skip("inotify is not available")
+
+    for directory, title in [("Album", "Old"), ("Other", "New")]:
+        (root / directory / "Disc").mkdir(parents=True)
+        (root / directory / "Disc" / "0.mp3").write_bytes(mp3(f"{title} 0"))
+    subject = watcher.Watcher(get_db, {str(root): library_id}, source=source)
+    subject.apply(drain(source))
+    assert titles(get_db) == ["New 0", "Old 0"]
+
+    try:
+        # Out of the library, its watches must not keep reporting under the old path
+        outside = tmp_path / "outside"
+        outside.mkdir()
+        (root / "Album").rename(outside / "Album")
+        subject.apply(drain(source))
+        assert titles(get_db) == ["New 0"]
+
+        # Another directory renamed into the old name, then changes on both sides
+        (root / "Other").rename(root / "Album")
+        (outside / "Album" / "Disc" / "0.mp3").unlink()
+        (root / "Album" / "Disc" / "1.mp3").write_bytes(mp3("New 1"))
+        changes = drain(source)
+        assert changes[str(root / "Album" / "Disc" / "0.mp3")] == watcher.Event.UPDATED
+        subject.apply(changes)
+
+        with get_db() as session:
+            songs = sorted(session.execute(select(Song.path, Song.name)).all())
+        assert songs == [
+            (str(root / "Album" / "Disc" / "0.mp3"), "New 0"),
+            (str(root / "Album" / "Disc" / "1.mp3"), "New 1"),
+        ]
+    finally:
+        source.close()
@@ -0,0 +1,22 @@
+"""
+Tests for the single writer
+"""
+
+from PySongMan.lib.writer import BatchWriter
+
+
+def test_batches_are_committed(session, library, make_record, count_songs):
+    library_id = library.id
+    writer = BatchWriter(session, batch_size=3)
+
+    assert writer.add(make_record(library_id, 1)) is False
+    assert writer.add(make_record(library_id, 2)) is False
+    assert writer.add(make_record(library_id, 3)) is True
+    assert writer.rows == 3
+    assert count_songs(session) == 3
+
+    writer.add(make_record(library_id, 4))
+    writer.flush()
+
+    assert writer.rows == 4
+    assert count_songs(session) == 4
@@ -65,13 +65,12 @@ export const Playlist = () => {
     useInfiniteQuery<SongsPageResponse>({
         // eslint-disable-next-line no-sparse-arrays
       queryKey: ['songs', fetchSize],
-      queryFn: async ({ pageParam = 0 }) => {
-        const start = (pageParam as number) * fetchSize
-         //pretend api call
-          return api.songs.list(start, fetchSize)
+      queryFn: async ({ pageParam }) => {
+          //each page hands back the cursor of the next one
+          return api.songs.list(pageParam as string | undefined, fetchSize)
       },
-      initialPageParam: 0,
-      getNextPageParam: (_lastGroup, groups) => groups.length,
+      initialPageParam: undefined,
+      getNextPageParam: lastGroup => lastGroup.cursor,
       refetchOnWindowFocus: false,
       placeholderData: keepPreviousData,
     })
@@ -18,9 +18,14 @@ export interface PlaylistPage {
 
     data: SongType[]
     count: number
-    offset: number
     limit: number
-    page: number
+    cursor: string | undefined
+}
+export interface SearchPage {
+
+    data: SongType[]
+    limit: number
+    cursor: string | undefined
 }
 
 
@@ -79,8 +84,34 @@ class Songs {
     }
 
 
-    list(page:number, limit:number = 100, filters:{[key:string]: string} | undefined = undefined):Promise<PlaylistPage> {
-        return this.boundary.remote('songs.list', page, limit, filters) as Promise<PlaylistPage>
+
+/*
+A page of songs, pass the returned cursor back for the next one
+
+:param cursor: None for the first page
+:param limit:
+:param filters: song column to value
+:param sort: id, artist or size
+:param descending:
+:param exact: count the songs instead of reading the maintained counts
+:return:
+*/
+
+    list(cursor:string | undefined = undefined, limit:number = 100, filters:{[key:string]: string} | undefined = undefined, sort:string = "id", descending:boolean = false, exact:boolean = false):Promise<PlaylistPage> {
+        return this.boundary.remote('songs.list', cursor, limit, filters, sort, descending, exact) as Promise<PlaylistPage>
+    }
+
+/*
+Songs matching what was typed so far, best match first
+
+:param query: words of a title, artist or tag, the last one can be unfinished
+:param cursor: None for the first page
+:param limit:
+:return:
+*/
+
+    search(query:string, cursor:string | undefined = undefined, limit:number = 100):Promise<SearchPage> {
+        return this.boundary.remote('songs.search', query, cursor, limit) as Promise<SearchPage>
     }
     get(song_id:number):Promise<SongType> {
         return this.boundary.remote('songs.get', song_id) as Promise<SongType>
@@ -4,7 +4,7 @@ import { useAppContext } from '@src/contexts/App.context';
 export function HomePage() {
     const { api } = useAppContext()
 
-    api.songs.list(1, 100).then((response) => {
+    api.songs.list(undefined, 100).then((response) => {
         console.log(response)
     })
 